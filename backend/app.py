@@ -3,23 +3,31 @@
 App Watch - Main Application
 """
 import os
+import io
+import sys
+import csv
 import json
+import atexit
+import signal
 import logging
 import threading
 import time
+import zlib
 from datetime import datetime
 from functools import partial
 from pathlib import Path
-from flask import Flask, request, jsonify, send_from_directory, Response
+from flask import Flask, request, jsonify, send_from_directory, send_file, Response
 from flask_cors import CORS
 import requests
-import schedule
 
 from backend.app_store import AppStoreMonitor
 from backend.formatter import DiscordFormatter
-from backend.storage import StorageManager
+from backend.icon_cache import IconCache, sized_icon_url
+from backend.scheduler import Scheduler
+from backend.worker_pool import WorkerPool
+from backend.storage import create_storage_manager
 from backend.version import get_version
-from backend.auth import require_auth
+from backend.auth import require_auth, sessions
 
 # Application version - dynamically fetched
 APP_VERSION = get_version()
@@ -41,15 +49,40 @@ app = Flask(__name__, static_folder=static_folder, static_url_path='')
 CORS(app, resources={r"/api/*": {"origins": "*"}})
 
 # Initialize components
-storage = StorageManager(Path('/data'))
+DATA_DIR = Path(os.getenv('DATA_DIR', '/data'))
+storage = create_storage_manager(DATA_DIR)
 # Load settings for formatter and notification handler
-settings = storage.get_settings()
+monitor_settings_revision, settings = storage.get_settings_snapshot()
+settings = dict(settings)
 formatter = DiscordFormatter(settings)
 monitor = AppStoreMonitor(storage, formatter, settings)
+icon_cache = IconCache(DATA_DIR / 'icon_cache')
+
+# Seconds browsers may reuse a served icon before revalidating it with its ETag
+ICON_MAX_AGE = int(os.getenv('ICON_CACHE_MAX_AGE', '86400'))
+
+# Write buffered storage changes (write-behind) to disk on shutdown
+atexit.register(storage.flush)
 
 # Global scheduler thread
+scheduler = Scheduler()
 scheduler_thread = None
 scheduler_running = False
+scheduled_apps_revision = None
+scheduled_lookup = {}  # App Store results prefetched for the jobs due in this scheduler pass
+
+# Longest the scheduler sleeps between checks for apps changed by other instances sharing the store
+SCHEDULER_SYNC_INTERVAL = 60
+
+# Checks due within this many seconds of the first due one run with it, sharing batched lookups
+SCHEDULE_BATCH_WINDOW = float(os.getenv('SCHEDULE_BATCH_WINDOW', '60'))
+
+# Instances sharing one store (e.g. STORAGE_ENGINE=redis) split the polling:
+# each schedules only the apps whose ID hashes to its SHARD_INDEX
+SHARD_COUNT = max(1, int(os.getenv('SHARD_COUNT', '1')))
+SHARD_INDEX = int(os.getenv('SHARD_INDEX', '0'))
+if not 0 <= SHARD_INDEX < SHARD_COUNT:
+    raise ValueError(f"SHARD_INDEX must be between 0 and {SHARD_COUNT - 1}")
 
 
 def load_apps():
@@ -78,6 +111,14 @@ def get_default_interval():
     return parse_interval(interval_str)
 
 
+def get_app_interval(app, default_interval=None):
+    """Get an app's check interval in seconds (its override or the default interval)"""
+    interval_override = app.get('interval_override')
+    if interval_override:
+        return parse_interval(interval_override)
+    return default_interval or get_default_interval()
+
+
 def parse_interval(interval_str):
     """Parse interval string like '12h', '30m', '1d' to seconds"""
     if not interval_str:
@@ -128,6 +169,13 @@ def format_interval(seconds):
         return f"{seconds}s"
 
 
+# Notification destination fields that must be strings when present
+DESTINATION_TEXT_FIELDS = (
+    'type', 'webhook_url', 'bot_token', 'chat_id', 'email', 'smtp_host',
+    'smtp_user', 'smtp_password', 'smtp_from', 'payload_template'
+)
+
+
 def validate_notification_destination(dest, settings=None):
     """
     Validate a notification destination
@@ -137,6 +185,14 @@ def validate_notification_destination(dest, settings=None):
     if not isinstance(dest, dict):
         return False, 'Each notification destination must be an object'
     
+    for field in DESTINATION_TEXT_FIELDS:
+        if field in dest and not isinstance(dest[field], str):
+            return False, f'Notification destination field {field} must be a string'
+    if 'smtp_port' in dest and not isinstance(dest['smtp_port'], (str, int)):
+        return False, 'Notification destination field smtp_port must be a number'
+    if 'headers' in dest and not isinstance(dest['headers'], dict):
+        return False, 'Notification destination field headers must be an object'
+    
     dest_type = dest.get('type', '').lower().strip()
     if not dest_type:
         return False, 'Each notification destination must have a type'
@@ -212,8 +268,134 @@ def validate_notification_destination(dest, settings=None):
         return False, f'Unknown notification type: {dest_type}'
 
 
-def check_app(app_id):
-    """Check a single app for updates"""
+MAX_STOREFRONTS = 50  # Storefronts watched per app (each adds a lookup per check)
+
+
+def parse_storefronts(value):
+    """
+    Parse a storefront list (an array or comma-separated string of country codes)
+    
+    Returns:
+        List of lowercase two-letter country codes without duplicates (the US store if empty)
+    
+    Raises:
+        ValueError: If a country code is invalid
+    """
+    if value is None or value == '':
+        return [monitor.DEFAULT_STOREFRONT]
+    if isinstance(value, str):
+        value = value.split(',')
+    if not isinstance(value, list):
+        raise ValueError('storefronts must be an array of country codes')
+    
+    storefronts = []
+    for country in value:
+        country = str(country).strip().lower()
+        if not country:
+            continue
+        if len(country) != 2 or not country.isalpha():
+            raise ValueError(f'Invalid storefront country code: {country}')
+        if country not in storefronts:
+            storefronts.append(country)
+    if len(storefronts) > MAX_STOREFRONTS:
+        raise ValueError(f'At most {MAX_STOREFRONTS} storefronts can be watched per app')
+    return storefronts or [monitor.DEFAULT_STOREFRONT]
+
+
+def build_app_data(data, current_settings):
+    """
+    Validate the fields of a new app (from the API or an import row)
+    
+    Returns:
+        App data dict ready for storage
+    
+    Raises:
+        ValueError: If a field is missing or invalid (message is safe to return to the client)
+    """
+    required_fields = ['name', 'app_store_id']
+    for field in required_fields:
+        if field not in data:
+            raise ValueError(f'Missing required field: {field}')
+    
+    # Input validation
+    name = str(data['name']).strip()
+    app_store_id = str(data['app_store_id']).strip()
+    
+    if not name:
+        raise ValueError('App name cannot be empty')
+    if not app_store_id or not app_store_id.isdigit():
+        raise ValueError('App Store ID must be a number')
+    
+    # Validate notification destinations if provided
+    notification_destinations = data.get('notification_destinations') or []
+    if not isinstance(notification_destinations, list):
+        raise ValueError('notification_destinations must be an array')
+    
+    # Validate each destination
+    for dest in notification_destinations:
+        is_valid, error_msg = validate_notification_destination(dest, current_settings)
+        if not is_valid:
+            raise ValueError(error_msg)
+    
+    # Legacy support - if webhook_url is provided but no notification_destinations, convert it
+    if not notification_destinations and 'webhook_url' in data:
+        webhook_url = str(data['webhook_url']).strip()
+        if webhook_url:
+            if not webhook_url.startswith('https://discord.com/api/webhooks/'):
+                raise ValueError('Invalid Discord webhook URL')
+            notification_destinations = [{'type': 'discord', 'webhook_url': webhook_url}]
+    
+    # Validate interval if provided
+    interval_override = str(data['interval_override']).strip() if data.get('interval_override') else None
+    if interval_override:
+        try:
+            parse_interval(interval_override)
+        except (ValueError, AttributeError):
+            raise ValueError('Invalid interval format. Use format like: 6h, 30m, 1d')
+    
+    app_data = {
+        'name': name,
+        'app_store_id': app_store_id,
+        'storefronts': parse_storefronts(data.get('storefronts')),
+        'notification_destinations': notification_destinations,
+        'interval_override': interval_override,
+        'enabled': data.get('enabled', True)
+    }
+    if data.get('icon_url'):
+        if not isinstance(data['icon_url'], str):
+            raise ValueError('icon_url must be a string')
+        app_data['icon_url'] = data['icon_url']
+    
+    return app_data
+
+
+def prefetch_app_infos(apps):
+    """
+    Look up several apps in all their storefronts with batched App Store requests
+    (for checks about to run)
+    """
+    storefront_ids = {}
+    for app in apps:
+        if app and app.get('enabled', True):
+            for country in monitor.get_storefronts(app):
+                storefront_ids.setdefault(country, []).append(app['app_store_id'])
+    if sum(len(app_store_ids) for app_store_ids in storefront_ids.values()) < 2:
+        return {}
+    return monitor.fetch_storefront_infos(storefront_ids)
+
+
+def check_app(app_id, lookup=None, include_preview=True, scheduled_interval=None):
+    """
+    Check a single app for updates
+    
+    Args:
+        app_id: App ID
+        lookup: Optional App Store results from prefetch_app_infos()
+        include_preview: Whether an unchanged result includes the formatted release notes
+        scheduled_interval: The app's interval when the scheduler runs the check; a
+            scheduled check whose lookup data is unchanged writes no history (only
+            the check time is stored)
+    """
     try:
         app = storage.get_app(app_id)
         if not app:
@@ -223,15 +405,30 @@ def check_app(app_id):
             return {'message': 'App is disabled'}, 200
         
         # Ensure monitor has latest settings (in case they changed)
-        global monitor, formatter
-        current_settings = storage.get_settings()
-        if monitor.settings != current_settings:
+        if monitor_settings_revision != storage.get_settings_revision():
             logger.debug("Reloading monitor with updated settings")
-            formatter = DiscordFormatter(current_settings)
-            monitor = AppStoreMonitor(storage, formatter, current_settings)
+            reload_monitor()
         
         app_name = app.get('name', 'Unknown')
-        result = monitor.check_app(app)
+        result = monitor.check_app(app, lookup, include_preview=include_preview)
+        
+        # Back off (and eventually park) apps whose lookups keep failing
+        if result.get('lookup_failed'):
+            result['lookup_failures'] = monitor.record_lookup_failure(app, result, get_app_interval(app))
+        elif result.get('current_version'):
+            monitor.clear_lookup_failures(app)
+        
+        if scheduled_interval is not None:
+            if result.get('unchanged'):
+                return result, 200
+            storage.add_history_entry(
+                event_type='scheduler_run',
+                app_id=app_id,
+                app_name=app_name,
+                status='info',
+                message=f'Scheduled check triggered (interval: {scheduled_interval})',
+                details={'interval': scheduled_interval, 'triggered_by': 'scheduler'}
+            )
         
         # Log check result
         if result.get('success'):
@@ -243,7 +440,11 @@ def check_app(app_id):
                     app_name=app_name,
                     status='success',
                     message=f'New version detected: {result.get("current_version")}',
-                    details={'version': result.get('current_version'), 'previous_version': result.get('last_version')}
+                    details={
+                        'version': result.get('current_version'),
+                        'previous_version': result.get('last_version'),
+                        'storefront_versions': result.get('storefront_versions')
+                    }
                 )
             else:
                 # No update
@@ -253,7 +454,7 @@ def check_app(app_id):
                     app_name=app_name,
                     status='info',
                     message='No new version available',
-                    details={'version': result.get('current_version')}
+                    details={'version': result.get('current_version'), 'storefront_versions': result.get('storefront_versions')}
                 )
         else:
             # Check failed
@@ -328,85 +529,206 @@ def post_to_discord(app_id):
         return {'error': str(e)}, 500
 
 
+def is_local_shard(app_uuid):
+    """Check whether this instance polls the given app"""
+    return zlib.crc32(app_uuid.encode('utf-8')) % SHARD_COUNT == SHARD_INDEX
+
+
+def report_check_timeout(app_uuid, elapsed):
+    """Record a scheduled check that is taking longer than CHECK_TIMEOUT"""
+    app_for_log = storage.get_app(app_uuid)
+    storage.add_history_entry(
+        event_type='scheduler_run',
+        app_id=app_uuid,
+        app_name=app_for_log.get('name', 'Unknown') if app_for_log else 'Unknown',
+        status='error',
+        message=f'Scheduled check still running after {elapsed:.0f}s',
+        details={'triggered_by': 'scheduler', 'timeout': check_pool.timeout}
+    )
+
+
+# Scheduled checks run on a bounded pool of worker threads, one check per app at a time
+check_pool = WorkerPool(on_timeout=report_check_timeout)
+
+# Seconds to wait at shutdown for running checks before storage is flushed
+SHUTDOWN_TIMEOUT = float(os.getenv('SHUTDOWN_TIMEOUT', '8'))
+
+
 def run_scheduler():
-    """Run the scheduler loop"""
-    global scheduler_running
+    """Run the scheduler loop (sleeps until the next check is due or the jobs change)"""
+    global scheduler_running, scheduled_lookup
     scheduler_running = True
     logger.info("Scheduler loop started")
     
     while scheduler_running:
         try:
-            schedule.run_pending()
+            due = scheduler.wait(timeout=SCHEDULER_SYNC_INTERVAL)
+            if not scheduler_running:
+                break
+            
+            # Pick up apps changed by other instances sharing the store
+            if storage.get_apps_revision() != scheduled_apps_revision:
+                logger.info("Apps changed in shared storage, rescheduling")
+                setup_scheduler()
+            
+            # Checks due within the batch window run now, together with the first due one
+            until = time.monotonic() + (SCHEDULE_BATCH_WINDOW if due else 0)
+            
+            # Look up all apps in this batch with shared requests per storefront instead of
+            # one request per app (apps backing off after failed lookups, or still being
+            # checked, are skipped by their jobs)
+            due_app_ids = [job.key for job in scheduler.due_jobs(until)]
+            if len(due_app_ids) > 1:
+                try:
+                    due_apps = [storage.get_app(app_id) for app_id in due_app_ids]
+                    due_apps = [
+                        app for app in due_apps
+                        if app and not monitor.is_backing_off(app) and not check_pool.is_busy(app['id'])
+                    ]
+                    scheduled_lookup = prefetch_app_infos(due_apps)
+                    logger.info(f"Prefetched App Store data for {len(due_apps)} apps due in the next {SCHEDULE_BATCH_WINDOW:g}s")
+                except Exception as e:
+                    logger.error(f"Error prefetching app info for scheduled checks: {e}", exc_info=True)
+            
+            # Hand the due checks to the worker pool, each with the shared lookup results
+            scheduler.run_pending(until)
+            check_pool.reap()
         except Exception as e:
             logger.error(f"Error running scheduled job: {e}", exc_info=True)
-        time.sleep(60)  # Check every minute
+            time.sleep(1)  # Do not spin if the store keeps failing
+        finally:
+            scheduled_lookup = {}
     
     logger.info("Scheduler loop stopped")
 
 
+def stop_scheduler():
+    """
+    Stop the scheduler loop and wait (up to SHUTDOWN_TIMEOUT) for running checks
+    
+    Runs at exit before the final storage flush, so changes made by checks that
+    finish in time are written.
+    """
+    global scheduler_running
+    scheduler_running = False
+    scheduler.wake()
+    if scheduler_thread is not None and scheduler_thread.is_alive() and scheduler_thread is not threading.current_thread():
+        scheduler_thread.join(timeout=5)
+    if not check_pool.shutdown(wait=SHUTDOWN_TIMEOUT):
+        logger.warning(f"Checks still running after {SHUTDOWN_TIMEOUT:g}s at shutdown; their changes may be lost")
+
+
+def make_scheduled_check(app_uuid_to_check, app_name_to_log, interval_str):
+    """
+    Build the scheduled job for one app
+    
+    The job queues the check on the worker pool (with the App Store results
+    prefetched for this scheduler pass), so a slow check does not hold up others.
+    Checks that found something new and errors are logged to the history.
+    """
+    def run_check(lookup):
+        try:
+            app_for_log = storage.get_app(app_uuid_to_check)
+            if app_for_log and monitor.is_backing_off(app_for_log):
+                logger.debug(f"Skipping scheduled check for app {app_uuid_to_check} (backing off after failed lookups)")
+                return
+            logger.debug(f"Running scheduled check for app {app_uuid_to_check}")
+            result, status_code = check_app(
+                app_uuid_to_check, lookup=lookup, include_preview=False, scheduled_interval=interval_str
+            )
+            logger.debug(f"Scheduled check completed for app {app_uuid_to_check}: {result.get('message', 'Unknown')}")
+        except Exception as e:
+            logger.error(f"Error in scheduled check for app {app_uuid_to_check}: {e}", exc_info=True)
+            # Log scheduler error
+            app_for_log = storage.get_app(app_uuid_to_check)
+            app_name = app_for_log.get('name', 'Unknown') if app_for_log else app_name_to_log
+            storage.add_history_entry(
+                event_type='scheduler_run',
+                app_id=app_uuid_to_check,
+                app_name=app_name,
+                status='error',
+                message=f'Scheduled check failed: {str(e)}',
+                details={'interval': interval_str, 'triggered_by': 'scheduler', 'error': str(e)}
+            )
+    
+    def scheduled_check():
+        if not check_pool.submit(app_uuid_to_check, partial(run_check, scheduled_lookup)):
+            logger.info(f"Skipping scheduled check for app {app_uuid_to_check}: previous check still queued or running")
+    return scheduled_check
+
+
+def schedule_app(app, default_interval=None):
+    """
+    Add, update or remove one app's scheduled check
+    
+    Other apps' jobs are not touched. An app whose interval did not change keeps
+    its timer; a new interval is counted from the app's previous check.
+    
+    Args:
+        app: App dict (with its 'id')
+        default_interval: Default interval in seconds (read from settings if omitted)
+    
+    Returns:
+        True if the app is scheduled on this instance
+    """
+    app_uuid = app['id']  # Use the UUID, not app_store_id
+    app_name = app.get('name', 'Unknown')
+    if not app.get('enabled', True) or not is_local_shard(app_uuid):
+        if scheduler.remove(app_uuid):
+            logger.info(f"Unscheduled app {app_name} ({app['app_store_id']})")
+        return False
+    
+    interval_seconds = get_app_interval(app, default_interval)
+    job = scheduler.get(app_uuid)
+    if job is not None and job.interval == interval_seconds:
+        return True
+    
+    scheduled_check = make_scheduled_check(app_uuid, app_name, format_interval(interval_seconds))
+    if job is None:
+        scheduler.add(app_uuid, interval_seconds, scheduled_check)
+        logger.info(f"Scheduled app {app_name} ({app['app_store_id']}) to check every {format_interval(interval_seconds)}")
+    else:
+        scheduler.update(app_uuid, interval_seconds, scheduled_check)
+        logger.info(f"Rescheduled app {app_name} ({app['app_store_id']}) to check every {format_interval(interval_seconds)}")
+    return True
+
+
+def unschedule_app(app_id):
+    """Remove an app's scheduled check"""
+    if scheduler.remove(app_id):
+        logger.info(f"Unscheduled app {app_id}")
+
+
+def apply_default_interval(previous_interval, default_interval):
+    """Reschedule the apps that use the default interval after it changed (apps with an override keep their timers)"""
+    if previous_interval == default_interval:
+        return
+    rescheduled = 0
+    for app in load_apps():
+        if not app.get('interval_override') and schedule_app(app, default_interval):
+            rescheduled += 1
+    logger.info(f"Default interval changed to {format_interval(default_interval)}; rescheduled {rescheduled} apps")
+
+
 def setup_scheduler():
-    """Setup scheduled checks for all apps"""
-    global scheduler_thread
+    """
+    Sync scheduled checks with the stored apps and start the scheduler thread
     
-    # Clear existing jobs
-    schedule.clear()
-    logger.info("Cleared existing scheduled jobs")
+    Jobs are added, updated or removed per app (see schedule_app), so apps that
+    did not change keep their timers.
+    """
+    global scheduler_thread, scheduled_apps_revision
     
+    scheduled_apps_revision = storage.get_apps_revision()
     apps = load_apps()
     default_interval = get_default_interval()
     
-    scheduled_count = 0
-    for app in apps:
-        if not app.get('enabled', True):
-            logger.debug(f"Skipping disabled app: {app.get('name', 'Unknown')}")
-            continue
-        
-        app_id = app['app_store_id']
-        app_uuid = app['id']  # Use the UUID, not app_store_id
-        app_name = app.get('name', 'Unknown')
-        interval_override = app.get('interval_override')
-        interval_seconds = parse_interval(interval_override) if interval_override else default_interval
-        interval_str = format_interval(interval_seconds)
-        
-        # Schedule job - use functools.partial to properly capture app_id
-        # Wrap in a function to handle errors properly
-        def make_scheduled_check(app_uuid_to_check, app_name_to_log, interval_str):
-            def scheduled_check():
-                try:
-                    logger.debug(f"Running scheduled check for app {app_uuid_to_check}")
-                    # Log scheduler run
-                    app_for_log = storage.get_app(app_uuid_to_check)
-                    app_name = app_for_log.get('name', 'Unknown') if app_for_log else app_name_to_log
-                    storage.add_history_entry(
-                        event_type='scheduler_run',
-                        app_id=app_uuid_to_check,
-                        app_name=app_name,
-                        status='info',
-                        message=f'Scheduled check triggered (interval: {interval_str})',
-                        details={'interval': interval_str, 'triggered_by': 'scheduler'}
-                    )
-                    result, status_code = check_app(app_uuid_to_check)
-                    logger.debug(f"Scheduled check completed for app {app_uuid_to_check}: {result.get('message', 'Unknown')}")
-                except Exception as e:
-                    logger.error(f"Error in scheduled check for app {app_uuid_to_check}: {e}", exc_info=True)
-                    # Log scheduler error
-                    app_for_log = storage.get_app(app_uuid_to_check)
-                    app_name = app_for_log.get('name', 'Unknown') if app_for_log else app_name_to_log
-                    storage.add_history_entry(
-                        event_type='scheduler_run',
-                        app_id=app_uuid_to_check,
-                        app_name=app_name,
-                        status='error',
-                        message=f'Scheduled check failed: {str(e)}',
-                        details={'interval': interval_str, 'triggered_by': 'scheduler', 'error': str(e)}
-                    )
-            return scheduled_check
-        
-        schedule.every(interval_seconds).seconds.do(make_scheduled_check(app_uuid, app_name, interval_str))
-        scheduled_count += 1
-        logger.info(f"Scheduled app {app['name']} ({app_id}) to check every {format_interval(interval_seconds)}")
+    scheduled = {app['id'] for app in apps if schedule_app(app, default_interval)}
+    for job in scheduler.jobs:
+        if job.key not in scheduled:
+            unschedule_app(job.key)
     
-    logger.info(f"Total apps scheduled: {scheduled_count}")
+    logger.info(f"Total apps scheduled: {len(scheduled)}")
     
     # Start scheduler thread if not running
     if scheduler_thread is None or not scheduler_thread.is_alive():
@@ -500,10 +822,8 @@ def auth_login():
     if username != auth.get('username') or not storage.verify_password(password):
         return jsonify({'error': 'Invalid username or password'}), 401
     
-    # Generate a simple token (in production, use proper JWT or session management)
-    import base64
-    password_hash = auth.get('password_hash', '')
-    token = base64.b64encode(f"{username}:{password_hash}".encode('utf-8')).decode('utf-8')
+    # Create a server-side session (expires after SESSION_TTL or when the password changes)
+    token = sessions.create(storage, username, auth.get('password_hash', ''))
     
     return jsonify({
         'token': token,
@@ -512,6 +832,15 @@ def auth_login():
     }), 200
 
 
+@app.route('/api/auth/logout', methods=['POST'])
+def auth_logout():
+    """Logout endpoint for Forms authentication (ends the session)"""
+    auth_header = request.headers.get('Authorization', '')
+    if auth_header.startswith('Bearer '):
+        sessions.revoke(storage, auth_header.split(' ', 1)[1])
+    return jsonify({'message': 'Logged out'}), 200
+
+
 @app.route('/api/auth/api-key/regenerate', methods=['POST'])
 @require_auth(storage)
 def regenerate_api_key():
@@ -569,7 +898,14 @@ def status():
         'timestamp': datetime.now().isoformat(),
         'scheduler_running': scheduler_running,
         'scheduler_thread_alive': scheduler_alive,
-        'scheduled_jobs_count': len(schedule.jobs)
+        'scheduled_jobs_count': len(scheduler),
+        'next_scheduled_check_in': scheduler.next_run_in(),
+        'check_pool': check_pool.stats(),
+        'shard': {'index': SHARD_INDEX, 'count': SHARD_COUNT},
+        'lookup_cache': monitor.lookup_cache.stats(),
+        'lookup_single_flight': monitor.single_flight.stats(),
+        'fetch': monitor.fetch_engine.stats(),
+        'icon_cache': icon_cache.stats()
     })
 
 
@@ -590,70 +926,26 @@ def create_app():
     
     data = request.json
     
-    required_fields = ['name', 'app_store_id']
-    for field in required_fields:
-        if field not in data:
-            return jsonify({'error': f'Missing required field: {field}'}), 400
-    
-    # Input validation
-    name = str(data['name']).strip()
-    app_store_id = str(data['app_store_id']).strip()
-    
-    if not name:
-        return jsonify({'error': 'App name cannot be empty'}), 400
-    if not app_store_id or not app_store_id.isdigit():
-        return jsonify({'error': 'App Store ID must be a number'}), 400
-    
-    # Validate notification destinations if provided
-    notification_destinations = data.get('notification_destinations', [])
-    if not isinstance(notification_destinations, list):
-        return jsonify({'error': 'notification_destinations must be an array'}), 400
-    
-    # Validate each destination
-    current_settings = storage.get_settings()
-    for dest in notification_destinations:
-        is_valid, error_msg = validate_notification_destination(dest, current_settings)
-        if not is_valid:
-            return jsonify({'error': error_msg}), 400
-    
-    # Legacy support - if webhook_url is provided but no notification_destinations, convert it
-    if not notification_destinations and 'webhook_url' in data:
-        webhook_url = str(data['webhook_url']).strip()
-        if webhook_url:
-            if not webhook_url.startswith('https://discord.com/api/webhooks/'):
-                return jsonify({'error': 'Invalid Discord webhook URL'}), 400
-            notification_destinations = [{'type': 'discord', 'webhook_url': webhook_url}]
-    
-    # Validate interval if provided
-    interval_override = data.get('interval_override', '').strip() if data.get('interval_override') else None
-    if interval_override:
-        try:
-            parse_interval(interval_override)
-        except (ValueError, AttributeError):
-            return jsonify({'error': 'Invalid interval format. Use format like: 6h, 30m, 1d'}), 400
+    try:
+        app_data = build_app_data(data, storage.get_settings())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    app_data = {
-        'name': name,
-        'app_store_id': app_store_id,
-        'notification_destinations': notification_destinations,
-        'interval_override': interval_override,
-        'enabled': data.get('enabled', True)
-    }
+    name = app_data['name']
+    app_store_id = app_data['app_store_id']
     
     # Try to fetch and save icon URL if not provided
-    if 'icon_url' not in data or not data.get('icon_url'):
+    if not app_data.get('icon_url'):
         try:
-            app_info = monitor.fetch_app_info(app_store_id)
+            app_info = monitor.fetch_app_info(app_store_id, country=app_data['storefronts'][0])
             if app_info and app_info.get('artworkUrl'):
                 app_data['icon_url'] = app_info['artworkUrl']
         except Exception as e:
             logger.warning(f"Could not fetch icon for app {app_store_id}: {e}")
-    else:
-        app_data['icon_url'] = data.get('icon_url')
     
     try:
         app_id = save_app(app_data)
-        setup_scheduler()  # Reschedule
+        schedule_app({**app_data, 'id': app_id})
         # Log app creation
         storage.add_history_entry(
             event_type='app_created',
@@ -735,6 +1027,12 @@ def update_app(app_id):
                 return jsonify({'error': 'Invalid interval format. Use format like: 6h, 30m, 1d'}), 400
         app['interval_override'] = interval_override if interval_override else None
     
+    if 'storefronts' in data:
+        try:
+            app['storefronts'] = parse_storefronts(data['storefronts'])
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+    
     if 'enabled' in data:
         app['enabled'] = bool(data['enabled'])
     
@@ -744,7 +1042,7 @@ def update_app(app_id):
     elif 'app_store_id' in data:
         # If app_store_id changed, try to fetch new icon
         try:
-            app_info = monitor.fetch_app_info(app['app_store_id'])
+            app_info = monitor.fetch_app_info(app['app_store_id'], country=monitor.get_storefronts(app)[0])
             if app_info and app_info.get('artworkUrl'):
                 app['icon_url'] = app_info['artworkUrl']
         except Exception as e:
@@ -753,7 +1051,11 @@ def update_app(app_id):
     try:
         app_name = app.get('name', 'Unknown')
         save_app(app)
-        setup_scheduler()  # Reschedule
+        # An edited app gets a fresh start (unparked, no backoff)
+        if app.get('lookup_failures'):
+            storage.save_lookup_failures(app_id, None)
+            app['lookup_failures'] = {}
+        schedule_app(app)
         # Log app update
         storage.add_history_entry(
             event_type='app_updated',
@@ -786,7 +1088,7 @@ def remove_app(app_id):
     app_name = app.get('name', 'Unknown') if app else 'Unknown'
     
     if delete_app(app_id):
-        setup_scheduler()  # Reschedule
+        unschedule_app(app_id)
         # Log app deletion
         storage.add_history_entry(
             event_type='app_deleted',
@@ -800,11 +1102,275 @@ def remove_app(app_id):
         return jsonify({'error': 'App not found'}), 404
 
 
+# Bulk import/export
+IMPORT_FETCH_CHUNK_SIZE = 500  # App Store IDs looked up per progress step
+EXPORT_CSV_FIELDS = [
+    'id', 'name', 'app_store_id', 'storefronts', 'interval_override', 'enabled', 'icon_url',
+    'notification_destinations', 'current_version', 'last_posted_version', 'last_check'
+]
+
+
+def parse_import_rows(text, import_format):
+    """
+    Parse an NDJSON or CSV upload
+    
+    Yields:
+        (row_number, row) where row is a dict, or an error message string if the row is malformed
+    """
+    if import_format == 'csv':
+        reader = csv.DictReader(io.StringIO(text))
+        row_number = 0
+        while True:
+            row_number += 1
+            try:
+                row = next(reader)
+            except StopIteration:
+                return
+            except csv.Error as e:
+                # e.g. a field over the size limit - the reader continues with the next line
+                yield row_number, f'Invalid CSV: {e}'
+                continue
+            # Empty cells mean "not provided"
+            row = {key: value.strip() for key, value in row.items() if key and value and value.strip()}
+            try:
+                if 'notification_destinations' in row:
+                    row['notification_destinations'] = json.loads(row['notification_destinations'])
+            except json.JSONDecodeError:
+                yield row_number, 'Invalid JSON in notification_destinations'
+                continue
+            if 'enabled' in row:
+                row['enabled'] = row['enabled'].lower() in ('1', 'true', 'yes', 'on')
+            yield row_number, row
+    
+    for row_number, line in enumerate(text.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError:
+            yield row_number, 'Invalid JSON'
+            continue
+        if not isinstance(row, dict):
+            yield row_number, 'Each line must be a JSON object'
+            continue
+        yield row_number, row
+
+
+def fetch_app_icons(storefront_ids):
+    """
+    Fetch artwork URLs for several apps with batched lookups (apps that fail are left out)
+    
+    Args:
+        storefront_ids: Dict of country code -> App Store IDs to look up there
+    
+    Returns:
+        Dict of (country, App Store ID) -> artwork URL
+    """
+    try:
+        infos = monitor.fetch_storefront_infos(storefront_ids, use_cache=True)
+    except Exception as e:
+        logger.warning(f"Could not fetch icons for {sum(map(len, storefront_ids.values()))} apps: {e}")
+        return {}
+    return {key: info['artworkUrl'] for key, info in infos.items() if info and info.get('artworkUrl')}
+
+
+def import_apps_stream(rows, current_settings):
+    """
+    Import parsed rows, yielding one NDJSON progress line per row plus a final summary.
+    Valid rows are saved with a single storage write and the scheduler is rebuilt once.
+    """
+    def line(obj):
+        return json.dumps(obj) + '\n'
+    
+    existing_ids = {app['id'] for app in load_apps()}
+    valid_rows = []
+    errors = 0
+    
+    for row_number, row in rows:
+        try:
+            if isinstance(row, str):
+                raise ValueError(row)
+            app_data = build_app_data(row, current_settings)
+            if row.get('id'):
+                app_data['id'] = str(row['id'])
+        except ValueError as e:
+            errors += 1
+            yield line({'row': row_number, 'status': 'error', 'error': str(e)})
+            continue
+        except Exception as e:
+            # A malformed row must not abort the rest of the import
+            logger.warning(f"Error validating import row {row_number}: {e}")
+            errors += 1
+            yield line({'row': row_number, 'status': 'error', 'error': 'Invalid row'})
+            continue
+        valid_rows.append((row_number, app_data))
+    
+    # Fetch missing icons (from each app's first storefront) in chunks so progress keeps
+    # flowing for large imports
+    missing_icons = sorted({
+        (app_data['storefronts'][0], app_data['app_store_id'])
+        for _, app_data in valid_rows if not app_data.get('icon_url')
+    })
+    icons = {}
+    for start in range(0, len(missing_icons), IMPORT_FETCH_CHUNK_SIZE):
+        storefront_ids = {}
+        for country, app_store_id in missing_icons[start:start + IMPORT_FETCH_CHUNK_SIZE]:
+            storefront_ids.setdefault(country, []).append(app_store_id)
+        icons.update(fetch_app_icons(storefront_ids))
+        yield line({
+            'status': 'fetching_metadata',
+            'done': min(start + IMPORT_FETCH_CHUNK_SIZE, len(missing_icons)),
+            'total': len(missing_icons)
+        })
+    for _, app_data in valid_rows:
+        icon_key = (app_data['storefronts'][0], app_data['app_store_id'])
+        if not app_data.get('icon_url') and icon_key in icons:
+            app_data['icon_url'] = icons[icon_key]
+    
+    created = updated = 0
+    if valid_rows:
+        try:
+            app_ids = storage.save_apps([app_data for _, app_data in valid_rows])
+            default_interval = get_default_interval()
+            for (_, app_data), app_id in zip(valid_rows, app_ids):
+                schedule_app({**app_data, 'id': app_id}, default_interval)
+        except Exception as e:
+            logger.error(f"Error importing apps: {e}", exc_info=True)
+            storage.add_history_entry(
+                event_type='apps_imported',
+                status='error',
+                message=f'Failed to import {len(valid_rows)} apps',
+                details={'error': str(e)}
+            )
+            yield line({'status': 'failed', 'error': 'Failed to save imported apps'})
+            return
+        
+        for (row_number, app_data), app_id in zip(valid_rows, app_ids):
+            row_status = 'updated' if app_id in existing_ids else 'created'
+            if row_status == 'updated':
+                updated += 1
+            else:
+                created += 1
+            yield line({'row': row_number, 'status': row_status, 'id': app_id, 'name': app_data['name']})
+        
+        storage.add_history_entry(
+            event_type='apps_imported',
+            status='success',
+            message=f'Imported {created + updated} apps ({created} created, {updated} updated)',
+            details={'created': created, 'updated': updated, 'errors': errors}
+        )
+    
+    yield line({'status': 'done', 'created': created, 'updated': updated, 'errors': errors})
+
+
+@app.route('/api/apps/import', methods=['POST'])
+@require_auth(storage)
+def import_apps():
+    """
+    Bulk import apps from NDJSON or CSV (request body or multipart "file" upload).
+    Streams NDJSON progress: one line per row, then a summary line.
+    """
+    upload = request.files.get('file')
+    filename = upload.filename if upload else ''
+    raw = upload.read() if upload else request.get_data()
+    
+    import_format = request.args.get('format', '').lower()
+    if not import_format:
+        content_type = (upload.content_type if upload else request.content_type) or ''
+        is_csv = filename.lower().endswith('.csv') or 'csv' in content_type
+        import_format = 'csv' if is_csv else 'ndjson'
+    if import_format not in ('csv', 'ndjson'):
+        return jsonify({'error': 'Invalid format. Use csv or ndjson'}), 400
+    
+    try:
+        text = raw.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        return jsonify({'error': 'Import file must be UTF-8'}), 400
+    if not text.strip():
+        return jsonify({'error': 'Import file is empty'}), 400
+    
+    rows = parse_import_rows(text, import_format)
+    return Response(import_apps_stream(rows, storage.get_settings()), mimetype='application/x-ndjson')
+
+
+@app.route('/api/apps/export', methods=['GET'])
+@require_auth(storage)
+def export_apps():
+    """Stream all apps as NDJSON (default) or CSV"""
+    export_format = request.args.get('format', 'ndjson').lower()
+    if export_format not in ('csv', 'ndjson'):
+        return jsonify({'error': 'Invalid format. Use csv or ndjson'}), 400
+    
+    apps = load_apps()
+    
+    def generate_ndjson():
+        for app_item in apps:
+            yield json.dumps(app_item) + '\n'
+    
+    def generate_csv():
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_CSV_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        for app_item in apps:
+            row = dict(app_item)
+            row['notification_destinations'] = json.dumps(row.get('notification_destinations') or [])
+            row['storefronts'] = ','.join(monitor.get_storefronts(row))
+            writer.writerow(row)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+    
+    if export_format == 'csv':
+        body, mimetype = generate_csv(), 'text/csv'
+    else:
+        body, mimetype = generate_ndjson(), 'application/x-ndjson'
+    return Response(body, mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename=apps.{export_format}'
+    })
+
+
+@app.route('/api/apps/check', methods=['POST'])
+@require_auth(storage)
+def check_apps_endpoint():
+    """Check several apps (all enabled, unparked apps by default) using batched App Store lookups"""
+    data = request.get_json(silent=True) or {}
+    app_ids = data.get('app_ids')
+    if app_ids is not None and not isinstance(app_ids, list):
+        return jsonify({'error': 'app_ids must be an array'}), 400
+    
+    if app_ids is None:
+        # Parked apps are only checked when asked for explicitly
+        apps = [
+            app_item for app_item in load_apps()
+            if app_item.get('enabled', True) and not app_item.get('lookup_failures', {}).get('parked_at')
+        ]
+    else:
+        apps = [storage.get_app(str(app_id)) for app_id in app_ids]
+    
+    lookup = prefetch_app_infos(apps)
+    results = {}
+    for app_id, app_item in zip(app_ids or [app_item['id'] for app_item in apps], apps):
+        if not app_item:
+            results[app_id] = {'error': 'App not found'}
+            continue
+        with check_pool.try_acquire(app_item['id']) as acquired:
+            if not acquired:
+                results[app_id] = {'error': 'A check for this app is already in progress'}
+                continue
+            result, _ = check_app(app_item['id'], lookup=lookup)
+        results[app_id] = result
+    return jsonify({'results': results, 'checked': len(results)})
+
+
 @app.route('/api/apps/<app_id>/check', methods=['POST'])
 @require_auth(storage)
 def check_app_endpoint(app_id):
     """Manually check an app for updates"""
-    result, status_code = check_app(app_id)
+    with check_pool.try_acquire(app_id) as acquired:
+        if not acquired:
+            return jsonify({'error': 'A check for this app is already in progress'}), 409
+        result, status_code = check_app(app_id)
     return jsonify(result), status_code
 
 
@@ -812,31 +1378,43 @@ def check_app_endpoint(app_id):
 @require_auth(storage)
 def post_app_endpoint(app_id):
     """Manually post release notes to all configured notification destinations"""
-    result, status_code = post_to_discord(app_id)
+    # A check of the same app could post the same release at the same time
+    with check_pool.try_acquire(app_id) as acquired:
+        if not acquired:
+            return jsonify({'error': 'A check for this app is already in progress'}), 409
+        result, status_code = post_to_discord(app_id)
     return jsonify(result), status_code
 
 
 @app.route('/api/apps/<app_id>/icon', methods=['GET'])
 @require_auth(storage)
 def get_app_icon(app_id):
-    """Serve app icon from stored icon_url (proxied from server to avoid client using Apple URLs)."""
+    """
+    Serve app icon from stored icon_url (proxied from server to avoid client using Apple URLs).
+    Icons come from the on-disk icon cache; ?size=N serves an N x N thumbnail.
+    """
     app = storage.get_app(app_id)
     if not app:
         return jsonify({'error': 'App not found'}), 404
     icon_url = app.get('icon_url')
     if not icon_url or not icon_url.strip():
         return jsonify({'error': 'No icon'}), 404
+    
+    size = request.args.get('size', type=int)
+    if size is not None and size not in IconCache.SIZES:
+        return jsonify({'error': f'Invalid size. Use one of: {", ".join(map(str, IconCache.SIZES))}'}), 400
+    
     try:
-        resp = requests.get(icon_url, timeout=10, stream=True)
-        resp.raise_for_status()
-        content_type = resp.headers.get('Content-Type', 'image/png')
-        # Restrict to image types
-        if not content_type.startswith('image/'):
-            content_type = 'image/png'
-        return Response(resp.iter_content(chunk_size=8192), mimetype=content_type)
+        image_path, meta = icon_cache.get(sized_icon_url(icon_url.strip(), size))
     except Exception as e:
         logger.warning(f"Could not fetch icon for app {app_id}: {e}")
         return jsonify({'error': 'Could not load icon'}), 404
+    
+    # Strong ETag from the image bytes; If-None-Match requests get a 304
+    response = send_file(image_path, mimetype=meta['content_type'], etag=meta['etag'], max_age=ICON_MAX_AGE)
+    response.cache_control.public = False
+    response.cache_control.private = True
+    return response
 
 
 @app.route('/api/webhooks/list', methods=['GET'])
@@ -975,7 +1553,7 @@ def send_custom_webhook():
                 'failed_count': len(error_messages),
                 'results': results
             }), 500
-            
+    
     except Exception as e:
         logger.error(f"Error sending custom webhook message: {e}", exc_info=True)
         return jsonify({'error': str(e)}), 500
@@ -1059,9 +1637,13 @@ def send_custom_message_to_webhook(destination, message, webhook_type):
 @app.route('/api/apps/metadata/<app_store_id>', methods=['GET'])
 @require_auth(storage)
 def get_app_metadata(app_store_id):
-    """Fetch app metadata from App Store including icon"""
+    """Fetch app metadata from App Store including icon (?country= selects the storefront)"""
+    try:
+        country = parse_storefronts(request.args.get('country'))[0]
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     try:
-        app_info = monitor.fetch_app_info(app_store_id)
+        app_info = monitor.fetch_app_info(app_store_id, country=country)
         if not app_info:
             return jsonify({'error': 'App not found in App Store'}), 404
         
@@ -1088,32 +1670,38 @@ def get_logs():
 @app.route('/api/history', methods=['GET'])
 @require_auth(storage)
 def get_history():
-    """Get activity history with optional filtering"""
+    """Get activity history with optional filtering and cursor pagination"""
     try:
         # Get query parameters
         limit = request.args.get('limit', default=100, type=int)
+        cursor = request.args.get('cursor', default=None, type=str)
         event_type = request.args.get('event_type', default=None, type=str)
         app_id = request.args.get('app_id', default=None, type=str)
         status = request.args.get('status', default=None, type=str)
         start_date = request.args.get('start_date', default=None, type=str)
         end_date = request.args.get('end_date', default=None, type=str)
         
-        # Validate limit
+        # Validate limit (page size - use the cursor to read further)
         if limit < 1 or limit > 1000:
             limit = 100
         
-        history = storage.get_history(
-            limit=limit,
-            event_type=event_type,
-            app_id=app_id,
-            status=status,
-            start_date=start_date,
-            end_date=end_date
-        )
+        try:
+            history, next_cursor = storage.get_history_page(
+                limit=limit,
+                cursor=cursor,
+                event_type=event_type,
+                app_id=app_id,
+                status=status,
+                start_date=start_date,
+                end_date=end_date
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         return jsonify({
             'history': history,
-            'count': len(history)
+            'count': len(history),
+            'next_cursor': next_cursor
         })
     except Exception as e:
         logger.error(f"Error getting history: {e}", exc_info=True)
@@ -1153,21 +1741,17 @@ def update_settings():
     
     try:
         current_settings = storage.get_settings()
+        previous_interval = get_default_interval()
         # Merge with new settings
         current_settings.update(data)
         storage.save_settings(current_settings)
         
-        # Reschedule jobs if interval changed
+        # Reschedule only the apps using the default interval, if it changed
         if 'default_interval' in data:
-            setup_scheduler()
+            apply_default_interval(previous_interval, get_default_interval())
         
         # Reload formatter and monitor with new settings
-        global monitor, formatter
-        formatter = DiscordFormatter(current_settings)
-        monitor = AppStoreMonitor(storage, formatter, current_settings)
-        
-        # If auto_post_on_update setting changed, reschedule to ensure monitor has latest settings
-        setup_scheduler()
+        reload_monitor()
         
         return jsonify(current_settings)
     except Exception as e:
@@ -1182,15 +1766,23 @@ try:
 except Exception as e:
     logger.error(f"Failed to initialize scheduler: {e}", exc_info=True)
 
+# Stop the scheduler before buffered storage changes are flushed (atexit runs in reverse order)
+atexit.register(stop_scheduler)
+
 # Reload monitor when settings change (helper function)
 def reload_monitor():
     """Reload monitor with current settings"""
-    global monitor, formatter
-    current_settings = storage.get_settings()
+    global formatter, monitor_settings_revision
+    revision, current_settings = storage.get_settings_snapshot()
+    current_settings = dict(current_settings)
     formatter = DiscordFormatter(current_settings)
-    monitor = AppStoreMonitor(storage, formatter, current_settings)
+    # Keep the monitor (and its lookup cache), only switch its settings
+    monitor.apply_settings(current_settings, formatter)
+    monitor_settings_revision = revision
 
 if __name__ == '__main__':
+    # Exit cleanly on SIGTERM (docker stop) so atexit handlers flush storage
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
     port = int(os.getenv('PORT', 8192))
     # Use production WSGI server in production (gunicorn recommended)
     # For self-hosted, Flask dev server is acceptable
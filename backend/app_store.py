@@ -1,13 +1,16 @@
 """
 App Store API integration
 """
+import asyncio
+import hashlib
+import json
 import logging
-import requests
-import time
-from datetime import datetime
+import os
+import random
+from datetime import datetime, timedelta
 from pathlib import Path
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+from backend.fetch_engine import FetchError, ThrottledError, get_fetch_engine
+from backend.lookup_cache import LookupCache, SingleFlight
 from backend.notifier import NotificationHandler
 
 logger = logging.getLogger(__name__)
@@ -19,90 +22,443 @@ class AppStoreMonitor:
     ITUNES_LOOKUP_URL = "https://itunes.apple.com/lookup"
     MAX_RETRIES = 3
     RETRY_DELAY = 2  # seconds
+    LOOKUP_BATCH_SIZE = 100  # App Store IDs per lookup request (the API accepts a comma-separated list)
+    DEFAULT_STOREFRONT = 'us'  # Storefront for apps without a storefronts list
     
-    def __init__(self, storage, formatter, settings=None):
+    # Consecutive failed lookups after which an app stops being checked on schedule
+    # (0 never parks); only failures saying the app is gone park it, others only back off
+    PARK_AFTER_FAILURES = int(os.getenv('PARK_AFTER_FAILURES', '6'))
+    # Longest backoff after failed lookups, as a multiple of the check interval
+    FAILURE_BACKOFF_MAX = int(os.getenv('FAILURE_BACKOFF_MAX', '8'))
+    
+    def __init__(self, storage, formatter, settings=None, fetch_engine=None, lookup_cache=None):
         self.storage = storage
         self.formatter = formatter
         self.settings = settings or {}
         self.notifier = NotificationHandler(settings)
         
-        # Setup session with retry strategy
-        self.session = requests.Session()
-        retry_strategy = Retry(
-            total=self.MAX_RETRIES,
-            backoff_factor=self.RETRY_DELAY,
-            status_forcelist=[429, 500, 502, 503, 504],
-            allowed_methods=["GET"]
+        # Lookups run concurrently on the shared asyncio fetch engine
+        self.fetch_engine = fetch_engine or get_fetch_engine()
+        
+        # Recent lookup results by (country, App Store ID)
+        self.lookup_cache = lookup_cache or LookupCache()
+        
+        # Concurrent lookups of the same app share one request
+        self.single_flight = SingleFlight()
+    
+    def apply_settings(self, settings, formatter):
+        """Switch to new settings without dropping the lookup cache"""
+        self.settings = settings or {}
+        self.formatter = formatter
+        self.notifier = NotificationHandler(settings)
+    
+    async def _lookup_async(self, params, description):
+        """
+        Call the iTunes Lookup API with retry logic
+        
+        Returns:
+            List of (App Store ID, app info) for the apps found, parsed on the fetch
+            loop as soon as the response is decoded (see _parse_lookup_response)
+        
+        Retries draw from the host's shared retry budget, so a failing or throttling
+        App Store gets at most a fraction of extra requests instead of a burst of
+        them. The host's rate limiter spaces out all attempts and honors Retry-After;
+        a lookup it holds back too long is not retried (the wait would not be shorter).
+        """
+        limiter = self.fetch_engine.rate_limiter(self.ITUNES_LOOKUP_URL)
+        limiter.record_attempt()
+        attempt = 0
+        while True:
+            try:
+                return await self.fetch_engine.get_json(
+                    self.ITUNES_LOOKUP_URL, params, parse=self._parse_lookup_response
+                )
+            except ThrottledError as e:
+                logger.warning(f"Lookup for {description} not sent: {e}")
+                raise
+            except FetchError as e:
+                if not e.retryable or attempt >= self.MAX_RETRIES:
+                    logger.error(f"Lookup failed for {description} after {attempt + 1} attempt(s): {e}")
+                    raise
+                if not limiter.try_retry():
+                    logger.error(f"Lookup failed for {description}: {e} (retry budget exhausted)")
+                    raise
+                wait_time = self.RETRY_DELAY * (2 ** attempt) * random.uniform(0.5, 1.0)  # Exponential backoff with jitter
+                attempt += 1
+                logger.warning(
+                    f"Attempt {attempt}/{self.MAX_RETRIES + 1} failed for {description}: {e}. "
+                    f"Retrying in {wait_time:.1f}s..."
+                )
+                await asyncio.sleep(wait_time)
+            except Exception as e:
+                logger.error(f"Unexpected error fetching app info for {description}: {e}", exc_info=True)
+                raise
+    
+    def _lookup(self, params, description):
+        """Blocking wrapper around _lookup_async"""
+        return self.fetch_engine.run(self._lookup_async(params, description))
+    
+    def _parse_lookup_response(self, data):
+        """
+        Reduce a decoded lookup response to the fields we use
+        
+        Results carry screenshots, descriptions and localized fields we never read;
+        only the parsed fields are kept so the full document can be freed right away.
+        """
+        return [
+            (str(result['trackId']), self._parse_app_info(result))
+            for result in data.get('results') or ()
+            if result.get('trackId') is not None
+        ]
+    
+    def _parse_app_info(self, app_info):
+        """Extract the fields we use from an iTunes Lookup result"""
+        # Get artwork URL - prefer higher resolution, fallback to lower
+        artwork_url = (
+            app_info.get('artworkUrl512') or 
+            app_info.get('artworkUrl100') or 
+            app_info.get('artworkUrl60') or
+            None
         )
-        adapter = HTTPAdapter(max_retries=retry_strategy)
-        self.session.mount("https://", adapter)
-        self.session.mount("http://", adapter)
+        
+        return {
+            'version': app_info.get('version'),
+            'releaseNotes': app_info.get('releaseNotes', ''),
+            'bundleId': app_info.get('bundleId'),
+            'trackName': app_info.get('trackName'),
+            'artistName': app_info.get('artistName'),
+            'artworkUrl': artwork_url
+        }
+    
+    def fetch_app_info(self, app_store_id, use_cache=True, country=None):
+        """
+        Fetch app information, served from the lookup cache when possible
+        
+        Args:
+            app_store_id: App Store ID
+            use_cache: False to always ask the App Store (the result still refreshes the cache)
+            country: Storefront country code (defaults to the US store)
+        """
+        country = country or self.DEFAULT_STOREFRONT
+        key = (country, str(app_store_id))
+        
+        def load():
+            # A scheduled check, a manual check and a post overlapping on one app
+            # make a single request (with its retries) and share the result or error
+            return self.single_flight.do(key, lambda: self._fetch_app_info(app_store_id, country))
+        
+        if not use_cache:
+            app_info = load()
+            self.lookup_cache.put(key, app_info)
+            return app_info
+        return self.lookup_cache.get(key, load)
     
-    def fetch_app_info(self, app_store_id):
+    def _fetch_app_info(self, app_store_id, country=None):
         """Fetch app information from iTunes Lookup API with retry logic"""
         params = {
             'id': app_store_id,
-            'country': 'us'  # Default to US store
+            'country': country or self.DEFAULT_STOREFRONT
         }
         
-        last_exception = None
-        for attempt in range(self.MAX_RETRIES + 1):
-            try:
-                response = self.session.get(
-                    self.ITUNES_LOOKUP_URL, 
-                    params=params, 
-                    timeout=10
-                )
-                response.raise_for_status()
-                
-                data = response.json()
-                
-                if data.get('resultCount', 0) == 0:
-                    return None
-                
-                app_info = data['results'][0]
-                
-                # Get artwork URL - prefer higher resolution, fallback to lower
-                artwork_url = (
-                    app_info.get('artworkUrl512') or 
-                    app_info.get('artworkUrl100') or 
-                    app_info.get('artworkUrl60') or
-                    None
+        results = self._lookup(params, f'app {app_store_id} ({params["country"]})')
+        
+        if not results:
+            return None
+        
+        return results[0][1]
+    
+    def fetch_app_infos(self, app_store_ids, country=None, use_cache=False):
+        """
+        Fetch app information for many apps in one storefront, LOOKUP_BATCH_SIZE apps per request
+        
+        Returns:
+            Dict of App Store ID -> app info (see fetch_storefront_infos)
+        """
+        country = country or self.DEFAULT_STOREFRONT
+        infos = self.fetch_storefront_infos({country: app_store_ids}, use_cache=use_cache)
+        return {app_store_id: app_info for (_, app_store_id), app_info in infos.items()}
+    
+    def fetch_storefront_infos(self, storefront_ids, use_cache=False):
+        """
+        Fetch app information for many apps across storefronts in one pass
+        
+        Every storefront is looked up with LOOKUP_BATCH_SIZE apps per request and the
+        batches of all storefronts are in flight together on the fetch engine, so a
+        sweep costs about one request per storefront per 100 apps.
+        
+        Args:
+            storefront_ids: Dict of country code -> App Store IDs to look up there
+            use_cache: True to serve fresh cached results and only look up the rest
+                (results always refresh the cache)
+        
+        Returns:
+            Dict of (country, App Store ID) -> app info, or None for apps missing from
+            that storefront. Apps in a batch that failed after all retries are left out,
+            so callers can fall back to fetch_app_info for them.
+        """
+        infos = {}
+        batches = []
+        for country, app_store_ids in storefront_ids.items():
+            app_store_ids = list(dict.fromkeys(str(app_store_id) for app_store_id in app_store_ids))
+            if use_cache:
+                uncached = []
+                for app_store_id in app_store_ids:
+                    found, app_info = self.lookup_cache.get_if_fresh((country, app_store_id))
+                    if found:
+                        infos[(country, app_store_id)] = app_info
+                    else:
+                        uncached.append(app_store_id)
+                app_store_ids = uncached
+            
+            batches.extend(
+                (country, app_store_ids[start:start + self.LOOKUP_BATCH_SIZE])
+                for start in range(0, len(app_store_ids), self.LOOKUP_BATCH_SIZE)
+            )
+        
+        # All batches are in flight at once (bounded by the fetch engine concurrency)
+        async def lookup_all():
+            return await asyncio.gather(*(
+                self._lookup_async(
+                    {'id': ','.join(batch), 'country': country},
+                    f'batch of {len(batch)} apps ({country})'
                 )
-                
-                return {
-                    'version': app_info.get('version'),
-                    'releaseNotes': app_info.get('releaseNotes', ''),
-                    'bundleId': app_info.get('bundleId'),
-                    'trackName': app_info.get('trackName'),
-                    'artistName': app_info.get('artistName'),
-                    'artworkUrl': artwork_url
-                }
-            except (requests.exceptions.ConnectionError, 
-                    requests.exceptions.Timeout,
-                    requests.exceptions.RequestException) as e:
-                last_exception = e
-                if attempt < self.MAX_RETRIES:
-                    wait_time = self.RETRY_DELAY * (2 ** attempt)  # Exponential backoff
-                    logger.warning(
-                        f"Attempt {attempt + 1}/{self.MAX_RETRIES + 1} failed for app {app_store_id}: {e}. "
-                        f"Retrying in {wait_time}s..."
-                    )
-                    time.sleep(wait_time)
-                else:
-                    logger.error(f"All {self.MAX_RETRIES + 1} attempts failed for app {app_store_id}: {e}")
-            except Exception as e:
-                logger.error(f"Unexpected error fetching app info for {app_store_id}: {e}", exc_info=True)
-                raise
+                for country, batch in batches
+            ), return_exceptions=True)
+        
+        for (country, batch), results in zip(batches, self.fetch_engine.run(lookup_all()) if batches else []):
+            if isinstance(results, Exception):
+                logger.error(f"Batch lookup failed for {len(batch)} apps in storefront {country}: {results}")
+                continue
+            
+            # Results are matched by trackId - their order and count may differ from the request
+            found = dict(results)
+            for app_store_id in batch:
+                infos[(country, app_store_id)] = found.get(app_store_id)
+                self.lookup_cache.put((country, app_store_id), infos[(country, app_store_id)])
         
-        # If we exhausted all retries, raise the last exception
-        if last_exception:
-            raise last_exception
+        return infos
     
-    def check_app(self, app):
-        """Check app for new version and post if needed"""
+    def get_storefronts(self, app):
+        """Get the storefront country codes an app is watched in"""
+        return app.get('storefronts') or [self.DEFAULT_STOREFRONT]
+    
+    def fetch_app_storefronts(self, app, lookup=None, use_cache=False):
+        """
+        Fetch an app's information in each of its storefronts
+        
+        Args:
+            app: App dict
+            lookup: Optional results of fetch_storefront_infos(); storefronts not in
+                there are looked up together in one more pass
+            use_cache: Whether those lookups may be served from the lookup cache
+        
+        Returns:
+            Dict of country -> app info (None where the app is not in that storefront),
+            in the app's storefront order
+        
+        Raises:
+            FetchError: If a storefront could not be looked up
+        """
+        app_store_id = str(app['app_store_id'])
+        storefronts = self.get_storefronts(app)
+        lookup = dict(lookup or {})
+        
+        missing = [country for country in storefronts if (country, app_store_id) not in lookup]
+        if len(missing) > 1:
+            lookup.update(self.fetch_storefront_infos(
+                {country: [app_store_id] for country in missing}, use_cache=use_cache
+            ))
+        
+        infos = {}
+        for country in storefronts:
+            if (country, app_store_id) in lookup:
+                infos[country] = lookup[(country, app_store_id)]
+            else:
+                # Not prefetched, or its batch failed - look it up on its own (raises on failure)
+                infos[country] = self.fetch_app_info(app_store_id, use_cache=use_cache, country=country)
+        return infos
+    
+    @staticmethod
+    def version_key(version):
+        """Sort key for version strings ('1.10' sorts after '1.9')"""
+        return tuple(
+            (0, int(part), '') if part.isdigit() else (1, 0, part)
+            for part in str(version or '').split('.')
+        )
+    
+    def newest_release(self, storefront_infos):
+        """
+        Pick the newest version across storefronts
+        
+        Returns:
+            (country, app_info) of the first storefront showing the highest version,
+            or (None, None) if the app is in none of them
+        """
+        found = [(country, app_info) for country, app_info in storefront_infos.items() if app_info]
+        if not found:
+            return None, None
+        return max(found, key=lambda item: self.version_key(item[1].get('version')))
+    
+    def content_hash(self, storefront_infos):
+        """Hash the lookup fields a check acts on (version, release notes and artwork per storefront)"""
+        fields = [
+            [country, info.get('version'), info.get('releaseNotes'), info.get('artworkUrl')] if info else [country]
+            for country, info in storefront_infos.items()
+        ]
+        return hashlib.sha256(json.dumps(fields, separators=(',', ':')).encode('utf-8')).hexdigest()
+    
+    def is_new_version(self, current_version, last_version):
+        """
+        Whether a version should be notified: it differs from the last notified one
+        and is not older than it (e.g. a storefront lagging behind, or an app pulled
+        from the store that had the newer release)
+        """
+        if not last_version:
+            return True
+        return current_version != last_version and self.version_key(current_version) >= self.version_key(last_version)
+    
+    def is_backing_off(self, app, now=None):
+        """Whether scheduled checks of an app are paused after failed lookups (parked or in backoff)"""
+        failures = app.get('lookup_failures') or {}
+        if failures.get('parked_at'):
+            return True
+        retry_at = failures.get('retry_at')
+        return bool(retry_at) and (now or datetime.now()).isoformat() < retry_at
+    
+    def record_lookup_failure(self, app, result, interval_seconds):
+        """
+        Count a failed lookup and back off the app's scheduled checks
+        
+        Every consecutive failure doubles the wait before the next scheduled check
+        (up to FAILURE_BACKOFF_MAX intervals). After PARK_AFTER_FAILURES failures,
+        if the latest one says the app is gone (the lookup did not find it, or
+        Apple answered with a 4xx status a retry would not fix) the app is parked:
+        scheduled checks stop until a check succeeds or the app is updated.
+        Parking notifies the app's destinations and is recorded in the history.
+        
+        Throttled lookups (rate limited by us or by Apple) are not counted, and
+        network errors, server errors and bad responses only back off.
+        
+        Args:
+            app: App dict (with its current lookup_failures)
+            result: Failed check result with 'error' and 'retryable'
+            interval_seconds: The app's check interval
+        
+        Returns:
+            The updated lookup failures dict
+        """
+        app_id = app['id']
+        now = datetime.now()
+        failures = dict(app.get('lookup_failures') or {})
+        if result.get('throttled'):
+            return failures
+        count = failures.get('count', 0) + 1
+        # Retry just before the scheduled run at the backed-off multiple of the interval
+        multiplier = min(2 ** count, self.FAILURE_BACKOFF_MAX)
+        failures.update({
+            'count': count,
+            'last_error': result.get('error'),
+            'last_failed_at': now.isoformat(),
+            'retry_at': (now + timedelta(seconds=interval_seconds * (multiplier - 0.5))).isoformat()
+        })
+        failures.setdefault('first_failed_at', now.isoformat())
+        
+        park = (
+            self.PARK_AFTER_FAILURES > 0 and count >= self.PARK_AFTER_FAILURES
+            and self.is_permanent_failure(result) and not failures.get('parked_at')
+        )
+        if park:
+            failures['parked_at'] = now.isoformat()
+        self.storage.save_lookup_failures(app_id, failures)
+        
+        if park:
+            self._notify_parked(app, failures)
+        else:
+            logger.info(f"Lookup for app {app_id} failed {count} time(s) in a row; next scheduled check after {failures['retry_at']}")
+        return failures
+    
+    @staticmethod
+    def is_permanent_failure(result):
+        """Whether a failed check says the app is gone (not found, or a 4xx a retry would not fix)"""
+        if result.get('not_found'):
+            return True
+        status = result.get('status') or 0
+        return 400 <= status < 500 and not result.get('retryable')
+    
+    def _notify_parked(self, app, failures):
+        """Record and announce that an app was parked"""
+        app_id = app['id']
+        app_name = app.get('name', 'App')
+        message = (
+            f"{app_name} ({app['app_store_id']}) failed {failures['count']} lookups in a row "
+            f"({failures.get('last_error')}). Scheduled checks are paused until a manual check "
+            f"succeeds or the app is updated."
+        )
+        logger.warning(f"Parked app {app_id}: {message}")
+        
+        notification_destinations = app.get('notification_destinations', [])
+        if not notification_destinations and app.get('webhook_url'):
+            notification_destinations = [{'type': 'discord', 'webhook_url': app['webhook_url']}]
+        destination_results = []
+        for dest in notification_destinations:
+            success, error_msg = self.notifier.send_notification(
+                dest, app_name, '', message, message, subject=f'{app_name} - Checks paused'
+            )
+            destination_results.append(
+                {'type': dest.get('type', 'unknown'), 'status': 'success'} if success
+                else {'type': dest.get('type', 'unknown'), 'status': 'error', 'error': error_msg}
+            )
+        
+        self.storage.add_history_entry(
+            event_type='app_parked',
+            app_id=app_id,
+            app_name=app_name,
+            status='error',
+            message=f'Scheduled checks paused after {failures["count"]} failed lookups',
+            details={
+                'error': failures.get('last_error'),
+                'failures': failures['count'],
+                'first_failed_at': failures.get('first_failed_at'),
+                'destinations': destination_results
+            }
+        )
+    
+    def clear_lookup_failures(self, app):
+        """Reset an app's lookup failures after a successful lookup (unparks it)"""
+        failures = app.get('lookup_failures')
+        if not failures:
+            return
+        self.storage.save_lookup_failures(app['id'], None)
+        if failures.get('parked_at'):
+            logger.info(f"App {app['id']} looked up successfully again; scheduled checks resumed")
+            self.storage.add_history_entry(
+                event_type='app_unparked',
+                app_id=app['id'],
+                app_name=app.get('name', 'App'),
+                status='success',
+                message='Scheduled checks resumed after a successful lookup',
+                details={'failures': failures.get('count')}
+            )
+    
+    def check_app(self, app, lookup=None, use_cache=False, include_preview=True):
+        """
+        Check app for new version and post if needed
+        
+        Every storefront of the app is looked up. The newest version seen in any of
+        them is the app's current version, so a release rolling out region by region
+        is notified once, when the first storefront shows it.
+        
+        When the looked-up data hashes the same as in the last check and there is no
+        pending notification, only the check time is written.
+        
+        Args:
+            app: App dict
+            lookup: Optional results of fetch_storefront_infos() for a batch of apps;
+                storefronts not in there are fetched for this app alone
+            use_cache: Whether those fetches may be served from the lookup cache
+            include_preview: Whether an unchanged result includes the formatted release notes
+        """
         app_id = app['id']
-        app_store_id = app['app_store_id']
         
         # Get notification destinations - support both new format and legacy webhook_url
         notification_destinations = app.get('notification_destinations', [])
@@ -114,49 +470,88 @@ class AppStoreMonitor:
             }]
         
         try:
-            # Fetch current app info
-            app_info = self.fetch_app_info(app_store_id)
+            # Fetch current app info in every storefront (unless it was looked up in a batch)
+            storefront_infos = self.fetch_app_storefronts(app, lookup, use_cache=use_cache)
+            country, app_info = self.newest_release(storefront_infos)
             
             if not app_info:
                 return {
                     'success': False,
                     'error': 'App not found in App Store',
-                    'checked_at': datetime.now().isoformat()
+                    'checked_at': datetime.now().isoformat(),
+                    'lookup_failed': True,
+                    'not_found': True,
+                    'retryable': False
                 }
             
             current_version = app_info['version']
             release_notes = app_info.get('releaseNotes', '')
+            storefront_versions = {
+                store: info['version'] for store, info in storefront_infos.items() if info
+            }
             
             # Get last posted version
             last_version = self.storage.get_last_version(app_id)
             
-            # Update last check time and current version
+            # Nothing changed since the last check and nothing is waiting to be posted (a
+            # new version found while auto-post is off stays unposted until a manual post)
+            auto_post_enabled = self.settings.get('auto_post_on_update', False)
+            pending = self.is_new_version(current_version, last_version)
+            content_hash = self.content_hash(storefront_infos)
+            previous_hash = self.storage.get_content_hash(app_id)
+            if content_hash == previous_hash and not (pending and auto_post_enabled):
+                checked_at = datetime.now().isoformat()
+                self.storage.update_last_check(app_id, checked_at)
+                result = {
+                    'success': True,
+                    'message': 'New version detected (auto-post disabled)' if pending else 'No new version',
+                    'current_version': current_version,
+                    'last_version': last_version,
+                    'storefront_versions': storefront_versions,
+                    'checked_at': checked_at,
+                    'unchanged': True
+                }
+                if pending:
+                    result['auto_post_disabled'] = True
+                if include_preview:
+                    result['formatted_preview'] = self.formatter.format_release_notes(current_version, release_notes)
+                return result
+            
+            # Update last check time, current version and the version in each storefront
             self.storage.update_last_check(app_id, datetime.now().isoformat())
             self.storage.save_current_version(app_id, current_version)
+            previous_storefront_versions = self.storage.get_storefront_versions(app_id)
+            if storefront_versions != previous_storefront_versions:
+                self.storage.save_storefront_versions(app_id, storefront_versions)
+                for store, version in storefront_versions.items():
+                    if previous_storefront_versions.get(store) not in (None, version):
+                        logger.info(f"App {app_id} is now at {version} in storefront {store}")
             
-            # Update app icon URL if available
+            # Update app icon URL if available and changed
             artwork_url = app_info.get('artworkUrl')
-            if artwork_url:
+            if artwork_url and artwork_url != app.get('icon_url'):
                 # Update icon URL in app data
                 app_data = self.storage.get_app(app_id)
                 if app_data:
                     app_data['icon_url'] = artwork_url
                     self.storage.save_app(app_data)
             
+            if content_hash != previous_hash:
+                self.storage.save_content_hash(app_id, content_hash)
+            
             # Check if version changed
-            if last_version and current_version == last_version:
+            if not pending:
                 return {
                     'success': True,
                     'message': 'No new version',
                     'current_version': current_version,
                     'last_version': last_version,
+                    'storefront_versions': storefront_versions,
                     'checked_at': datetime.now().isoformat(),
                     'formatted_preview': self.formatter.format_release_notes(current_version, release_notes)
                 }
             
             # New version detected - check if auto-post is enabled
-            auto_post_enabled = self.settings.get('auto_post_on_update', False)
-            
             if not auto_post_enabled:
                 # Auto-post is disabled, just return the new version info without posting
                 logger.info(f"New version {current_version} detected for app {app_id}, but auto-post is disabled")
@@ -165,6 +560,7 @@ class AppStoreMonitor:
                     'message': 'New version detected (auto-post disabled)',
                     'current_version': current_version,
                     'last_version': last_version,
+                    'storefront_versions': storefront_versions,
                     'checked_at': datetime.now().isoformat(),
                     'formatted_preview': self.formatter.format_release_notes(current_version, release_notes),
                     'auto_post_disabled': True
@@ -208,6 +604,7 @@ class AppStoreMonitor:
                     details={
                         'version': current_version,
                         'previous_version': last_version,
+                        'storefront': country,
                         'success_count': success_count,
                         'failed_count': len(error_messages),
                         'destinations': destination_results
@@ -219,6 +616,7 @@ class AppStoreMonitor:
                     'message': message,
                     'current_version': current_version,
                     'last_version': last_version,
+                    'storefront_versions': storefront_versions,
                     'checked_at': datetime.now().isoformat(),
                     'formatted_preview': formatted_notes
                 }
@@ -236,6 +634,7 @@ class AppStoreMonitor:
                     message=f'Failed to post version {current_version}',
                     details={
                         'version': current_version,
+                        'storefront': country,
                         'error': error_msg,
                         'destinations': destination_results
                     }
@@ -245,10 +644,22 @@ class AppStoreMonitor:
                     'success': False,
                     'error': error_msg,
                     'current_version': current_version,
+                    'storefront_versions': storefront_versions,
                     'checked_at': datetime.now().isoformat(),
                     'formatted_preview': formatted_notes
                 }
         
+        except FetchError as e:
+            logger.error(f"Error looking up app {app_id}: {e}")
+            return {
+                'success': False,
+                'error': str(e),
+                'checked_at': datetime.now().isoformat(),
+                'lookup_failed': True,
+                'retryable': e.retryable,
+                'throttled': e.throttled,
+                'status': e.status
+            }
         except Exception as e:
             logger.error(f"Error checking app {app_id}: {e}", exc_info=True)
             return {
@@ -260,7 +671,6 @@ class AppStoreMonitor:
     def post_to_discord(self, app):
         """Manually post current release notes to all configured notification destinations"""
         app_id = app['id']
-        app_store_id = app['app_store_id']
         
         # Get notification destinations - support both new format and legacy webhook_url
         notification_destinations = app.get('notification_destinations', [])
@@ -272,8 +682,8 @@ class AppStoreMonitor:
             }]
         
         try:
-            # Fetch current app info
-            app_info = self.fetch_app_info(app_store_id)
+            # Fetch current app info (the newest release across the app's storefronts)
+            _, app_info = self.newest_release(self.fetch_app_storefronts(app, use_cache=True))
             
             if not app_info:
                 return {
@@ -369,5 +779,5 @@ class AppStoreMonitor:
                 'success': False,
                 'error': str(e)
             }
-    
+
 
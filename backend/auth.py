@@ -3,6 +3,11 @@ Authentication middleware and utilities
 """
 import logging
 import base64
+import hashlib
+import os
+import secrets
+import threading
+import time
 from functools import wraps
 from flask import request, jsonify, Response
 import ipaddress
@@ -10,6 +15,106 @@ import ipaddress
 logger = logging.getLogger(__name__)
 
 
+class SessionStore:
+    """
+    Server-side session tokens with expiry (Forms auth).
+    
+    Sessions are kept in the storage backend, keyed by a hash of the token, so
+    they survive restarts and every instance sharing the storage accepts them.
+    Sessions read from storage are cached in memory for CACHE_SECONDS, so most
+    requests are verified without a storage round trip (a logout on another
+    instance takes effect here within that time).
+    """
+    
+    CACHE_SECONDS = 30
+    
+    def __init__(self, ttl_seconds=None):
+        self.ttl_seconds = ttl_seconds or int(os.getenv('SESSION_TTL', str(7 * 86400)))
+        self._cache = {}  # session ID -> (session, cached_at)
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _session_id(token):
+        """Storage key for a token (the token itself is never stored)"""
+        return hashlib.sha256(token.encode('utf-8')).hexdigest()
+    
+    def create(self, storage, username, password_hash):
+        """Create a session for a user who just logged in and return its token"""
+        token = secrets.token_urlsafe(32)
+        session_id = self._session_id(token)
+        now = time.time()
+        session = {'username': username, 'password_hash': password_hash, 'expires_at': now + self.ttl_seconds}
+        storage.save_session(session_id, session)
+        with self._lock:
+            # Logins are rare - drop expired cache entries here instead of on every request
+            expired = [key for key, (cached, _) in self._cache.items() if cached['expires_at'] < now]
+            for key in expired:
+                del self._cache[key]
+            self._cache[session_id] = (session, time.monotonic())
+        return token
+    
+    def validate(self, storage, token, username, password_hash):
+        """
+        Check a session token against the current credentials.
+        Sessions end when they expire or when the username or password changes.
+        """
+        session_id = self._session_id(token)
+        cached = self._cache.get(session_id)
+        if cached is not None and time.monotonic() - cached[1] < self.CACHE_SECONDS:
+            session = cached[0]
+        else:
+            try:
+                session = storage.get_session(session_id)
+            except Exception as e:
+                logger.error(f"Error loading session: {e}")
+                return False
+            with self._lock:
+                if session is None:
+                    self._cache.pop(session_id, None)
+                else:
+                    self._cache[session_id] = (session, time.monotonic())
+        
+        if session is None:
+            return False
+        if session['expires_at'] < time.time():
+            self.revoke(storage, token)
+            return False
+        return session['username'] == username and session['password_hash'] == password_hash
+    
+    def revoke(self, storage, token):
+        """End a session"""
+        session_id = self._session_id(token)
+        with self._lock:
+            self._cache.pop(session_id, None)
+        try:
+            storage.delete_session(session_id)
+        except Exception as e:
+            logger.error(f"Error deleting session: {e}")
+
+
+class VerifiedCredentialCache:
+    """Basic auth headers that already passed password verification (skips re-hashing)"""
+    
+    MAX_ENTRIES = 256
+    
+    def __init__(self):
+        self._verified = {}  # Authorization header -> (username, password_hash)
+    
+    def is_verified(self, auth_header, username, password_hash):
+        """Check whether this header was verified against the current credentials"""
+        return bool(auth_header) and self._verified.get(auth_header) == (username, password_hash)
+    
+    def remember(self, auth_header, username, password_hash):
+        """Remember a header that passed verification"""
+        if len(self._verified) >= self.MAX_ENTRIES:
+            self._verified.clear()
+        self._verified[auth_header] = (username, password_hash)
+
+
+sessions = SessionStore()
+verified_basic_auth = VerifiedCredentialCache()
+
+
 def is_local_network(ip_address):
     """Check if an IP address is in a local/private network"""
     try:
@@ -47,23 +152,27 @@ def check_basic_auth(storage):
 
 
 def check_session_auth(storage):
-    """Check session-based authentication (for Forms auth)"""
-    # For Forms auth, we'll use a simple session token stored in Authorization header
-    # Format: "Bearer <token>" where token is base64(username:password_hash)
+    """Get the session token from the request (for Forms auth)"""
+    # Format: "Bearer <token>" where token was issued by /api/auth/login
     auth_header = request.headers.get('Authorization', '')
     if not auth_header.startswith('Bearer '):
         return None
+    return auth_header.split(' ', 1)[1] or None
+
+
+def check_basic_credentials(storage, username, password_hash):
+    """Check Basic Authentication against the configured user"""
+    auth_header = request.headers.get('Authorization', '')
+    if verified_basic_auth.is_verified(auth_header, username, password_hash):
+        return True
     
-    try:
-        token = auth_header.split(' ', 1)[1]
-        # In a real implementation, you'd verify a session token
-        # For now, we'll extract username from token and verify
-        # This is a simplified approach - in production, use proper session management
-        decoded = base64.b64decode(token).decode('utf-8')
-        username, stored_hash = decoded.split(':', 1)
-        return username, stored_hash
-    except Exception:
-        return None
+    basic_auth = check_basic_auth(storage)
+    if basic_auth:
+        auth_username, password = basic_auth
+        if auth_username == username and storage.verify_password(password):
+            verified_basic_auth.remember(auth_header, username, password_hash)
+            return True
+    return False
 
 
 def check_api_key_auth(storage):
@@ -109,31 +218,21 @@ def require_auth(storage):
                 # Check authentication based on auth type
                 auth_type = auth_config.get('auth_type', 'forms')
                 username = auth_config.get('username', '')
+                password_hash = auth_config.get('password_hash', '')
                 
                 authenticated = False
                 
                 if auth_type == 'basic':
                     # Check Basic Auth
-                    basic_auth = check_basic_auth(storage)
-                    if basic_auth:
-                        auth_username, password = basic_auth
-                        if auth_username == username and storage.verify_password(password):
-                            authenticated = True
+                    authenticated = check_basic_credentials(storage, username, password_hash)
                 elif auth_type == 'forms':
                     # Check session token (Bearer token)
-                    session_auth = check_session_auth(storage)
-                    if session_auth:
-                        auth_username, token_hash = session_auth
-                        stored_hash = auth_config.get('password_hash', '')
-                        if auth_username == username and token_hash == stored_hash:
-                            authenticated = True
+                    session_token = check_session_auth(storage)
+                    if session_token and sessions.validate(storage, session_token, username, password_hash):
+                        authenticated = True
                     # Also check Basic Auth as fallback (for API calls)
                     if not authenticated:
-                        basic_auth = check_basic_auth(storage)
-                        if basic_auth:
-                            auth_username, password = basic_auth
-                            if auth_username == username and storage.verify_password(password):
-                                authenticated = True
+                        authenticated = check_basic_credentials(storage, username, password_hash)
             
             if not authenticated:
                 if auth_type == 'basic':
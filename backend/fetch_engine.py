@@ -0,0 +1,320 @@
+"""
+Concurrent HTTP fetch engine for App Store lookups (asyncio on a background thread)
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from backend.rate_limiter import HostRateLimiter, RateLimitExceeded
+from backend.version import get_version
+
+try:
+    import orjson
+except ImportError:  # Optional faster decoder
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# JSON decoder for response bodies (orjson when installed)
+JSON_DECODER = 'orjson' if orjson is not None else 'json'
+decode_json = orjson.loads if orjson is not None else json.loads
+
+
+class FetchError(Exception):
+    """
+    A request failed (connection error, timeout, bad response or HTTP error status)
+    
+    `throttled` is set when the request was held back by rate limiting (our own
+    limiter, or the host answering 429/503): it says nothing about the resource.
+    """
+    
+    # HTTP statuses worth retrying (other 4xx responses will not change on a retry)
+    RETRYABLE_STATUSES = (408, 429, 500, 502, 503, 504)
+    
+    def __init__(self, message, status=None, headers=None, retryable=None, throttled=None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+        if retryable is None:
+            retryable = status is None or status in self.RETRYABLE_STATUSES
+        self.retryable = retryable
+        if throttled is None:
+            throttled = status in HostRateLimiter.THROTTLE_STATUSES
+        self.throttled = throttled
+
+
+class ThrottledError(FetchError):
+    """A request was not sent because the host's rate limit would have delayed it too long"""
+    
+    def __init__(self, message):
+        super().__init__(message, retryable=True, throttled=True)
+
+
+class FetchEngine:
+    """
+    Concurrent JSON fetches with per-host rate limiting.
+    
+    Lookups run as coroutines on one event loop in a daemon thread, so callers
+    can batch many of them with asyncio.gather(). The requests themselves are
+    made with a shared requests session on a bounded thread pool (at most
+    max_concurrency in flight), which keeps connections alive, follows
+    redirects and honors the proxy and CA environment variables (HTTP_PROXY /
+    HTTPS_PROXY / NO_PROXY, REQUESTS_CA_BUNDLE / SSL_CERT_FILE). Each upstream
+    host gets its own rate limiter, which also holds the retry budget for
+    requests to it. Blocking code submits coroutines with run().
+    """
+    
+    # Largest response body accepted, after decompression (lookup responses for a
+    # full batch are well below this)
+    MAX_RESPONSE_BYTES = 16 * 1024 * 1024
+    
+    # Redirects followed per request
+    MAX_REDIRECTS = 5
+    
+    # Environment variables naming a CA bundle, in order of precedence
+    CA_BUNDLE_VARIABLES = ('REQUESTS_CA_BUNDLE', 'SSL_CERT_FILE', 'CURL_CA_BUNDLE')
+    
+    # Statuses that never carry a body
+    NO_BODY_STATUSES = (204, 304)
+    
+    def __init__(self, max_concurrency=None, timeout=None):
+        self.max_concurrency = max_concurrency or int(os.getenv('FETCH_CONCURRENCY', '16'))
+        self.timeout = timeout or float(os.getenv('FETCH_TIMEOUT', '10'))
+        self.user_agent = f'AppWatch/{get_version()}'
+        self._session = self._create_session()
+        self._executor = None
+        self._loop = None
+        self._thread = None
+        self._semaphore = None
+        self._start_lock = threading.Lock()
+        self._rate_limiters = {}
+        self._rate_limiters_lock = threading.Lock()
+        
+        # Response parsing instrumentation (bytes as received and after decompression)
+        self.requests_sent = 0
+        self.responses_parsed = 0
+        self.wire_bytes = 0
+        self.body_bytes = 0
+        self.parse_seconds = 0.0
+    
+    def _create_session(self):
+        """requests session with a connection pool sized for the concurrency limit"""
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=self.max_concurrency)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.max_redirects = self.MAX_REDIRECTS
+        session.headers.update({
+            'User-Agent': self.user_agent,
+            'Accept': 'application/json',
+            'Accept-Encoding': 'gzip, deflate'
+        })
+        # requests reads REQUESTS_CA_BUNDLE and CURL_CA_BUNDLE itself, but not SSL_CERT_FILE
+        ca_bundle = next((os.environ[name] for name in self.CA_BUNDLE_VARIABLES if os.environ.get(name)), None)
+        if ca_bundle is not None:
+            logger.info(f"Using CA bundle {ca_bundle} for App Store requests")
+            session.verify = ca_bundle
+        return session
+    
+    def _ensure_loop(self):
+        """Start the event loop thread on first use"""
+        with self._start_lock:
+            if self._loop is not None and self._thread.is_alive():
+                return self._loop
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+            
+            def run_loop():
+                asyncio.set_event_loop(loop)
+                self._semaphore = asyncio.Semaphore(self.max_concurrency)
+                ready.set()
+                loop.run_forever()
+            
+            self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix='fetch')
+            self._thread = threading.Thread(target=run_loop, name='fetch-engine', daemon=True)
+            self._thread.start()
+            ready.wait()
+            self._loop = loop
+            logger.info(f"Fetch engine started (concurrency {self.max_concurrency}, timeout {self.timeout}s)")
+            return loop
+    
+    def run(self, coro):
+        """Run a coroutine on the engine loop and wait for its result (call from other threads only)"""
+        loop = self._ensure_loop()
+        return asyncio.run_coroutine_threadsafe(coro, loop).result()
+    
+    def close(self):
+        """Stop the event loop thread and close pooled connections"""
+        with self._start_lock:
+            if self._loop is not None:
+                self._loop.call_soon_threadsafe(self._loop.stop)
+                self._thread.join(timeout=5)
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._loop = None
+            self._session.close()
+    
+    def rate_limiter(self, url):
+        """Get the rate limiter for a URL's host (created on first use)"""
+        host = urlsplit(url).netloc
+        with self._rate_limiters_lock:
+            limiter = self._rate_limiters.get(host)
+            if limiter is None:
+                limiter = self._rate_limiters[host] = HostRateLimiter(host)
+            return limiter
+    
+    def stats(self):
+        """Get request and response parsing stats, and rate limiter stats per host"""
+        with self._rate_limiters_lock:
+            limiters = list(self._rate_limiters.values())
+        return {
+            'max_concurrency': self.max_concurrency,
+            'timeout': self.timeout,
+            'requests': self.requests_sent,
+            'parse': {
+                'decoder': JSON_DECODER,
+                'responses': self.responses_parsed,
+                'wire_bytes': self.wire_bytes,
+                'body_bytes': self.body_bytes,
+                'seconds': round(self.parse_seconds, 4),
+                'avg_ms': round(self.parse_seconds * 1000 / self.responses_parsed, 3) if self.responses_parsed else 0
+            },
+            'hosts': {limiter.host: limiter.stats() for limiter in limiters}
+        }
+    
+    async def get_json(self, url, params=None, timeout=None, parse=None):
+        """
+        GET a URL and decode the JSON response
+        
+        Args:
+            url: http(s) URL
+            params: Optional query parameters
+            timeout: Seconds allowed for connecting, for each read and for the whole
+                body (defaults to FETCH_TIMEOUT)
+            parse: Optional function applied to the decoded document right away, so
+                callers can keep only the fields they need and the rest is freed
+        
+        Raises:
+            ThrottledError: If the host's rate limit would delay the request too long
+                (nothing was sent)
+            FetchError: If the request fails, times out or returns an error status,
+                and (not retryable) if the response has no body or cannot be decoded
+        """
+        limiter = self.rate_limiter(url)
+        try:
+            await limiter.acquire()
+        except RateLimitExceeded as e:
+            raise ThrottledError(str(e))
+        
+        timeout = timeout or self.timeout
+        async with self._semaphore:
+            self.requests_sent += 1
+            try:
+                status, headers, body, wire_size = await asyncio.get_running_loop().run_in_executor(
+                    self._executor, self._get, url, params, timeout
+                )
+            except requests.Timeout:
+                raise FetchError(f'Request timed out after {timeout}s')
+            except (requests.RequestException, OSError, ValueError, zlib.error) as e:
+                raise FetchError(f'Request failed: {e}')
+        self.wire_bytes += wire_size
+        
+        limiter.record_response(status, headers)
+        if status >= 400:
+            raise FetchError(f'HTTP {status} for {url}', status=status, headers=headers)
+        if not body:
+            raise FetchError(f'Empty response (HTTP {status}) for {url}', status=status, headers=headers)
+        started = time.perf_counter()
+        try:
+            data = decode_json(body)
+            if parse is not None:
+                data = parse(data)
+        except (ValueError, TypeError, AttributeError, KeyError) as e:
+            raise FetchError(f'Invalid JSON response: {e}', status=status, headers=headers)
+        finally:
+            self.parse_seconds += time.perf_counter() - started
+            self.responses_parsed += 1
+            self.body_bytes += len(body)
+        return data
+    
+    def _get(self, url, params, timeout):
+        """
+        Perform one GET request on a pool thread
+        
+        Returns:
+            (status, headers, body, bytes received) of the final response
+        """
+        deadline = time.monotonic() + timeout
+        with self._session.get(url, params=params, timeout=timeout, stream=True) as response:
+            body, wire_size = self._read_body(response, deadline)
+            return response.status_code, response.headers, body, wire_size
+    
+    def _read_body(self, response, deadline):
+        """
+        Read and decompress a response body, at most MAX_RESPONSE_BYTES of it
+        
+        The body is read undecoded and inflated here with an output cap, so a small
+        compressed response cannot expand without bound.
+        
+        Returns:
+            (body, bytes received)
+        
+        Raises:
+            ValueError: If the body is too large or uses an unsupported encoding
+            requests.Timeout: If the body is not complete by the deadline
+        """
+        if response.status_code < 200 or response.status_code in self.NO_BODY_STATUSES:
+            return b'', 0
+        encoding = response.headers.get('content-encoding', '').lower()
+        if encoding == 'gzip':
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif encoding == 'deflate':
+            decompressor = zlib.decompressobj()
+        elif encoding in ('', 'identity'):
+            decompressor = None
+        else:
+            raise ValueError(f'Unsupported content encoding {encoding}')
+        
+        chunks = []
+        size = 0
+        wire_size = 0
+        for chunk in response.raw.stream(65536, decode_content=False):
+            wire_size += len(chunk)
+            if decompressor is not None:
+                chunk = decompressor.decompress(chunk, self.MAX_RESPONSE_BYTES - size + 1)
+                if decompressor.unconsumed_tail:
+                    raise ValueError('Response too large')
+            size += len(chunk)
+            if size > self.MAX_RESPONSE_BYTES:
+                raise ValueError('Response too large')
+            if time.monotonic() > deadline:
+                raise requests.Timeout('Response body not complete before the deadline')
+            chunks.append(chunk)
+        if decompressor is not None:
+            chunk = decompressor.flush()
+            size += len(chunk)
+            if size > self.MAX_RESPONSE_BYTES:
+                raise ValueError('Response too large')
+            chunks.append(chunk)
+        return b''.join(chunks), wire_size
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_fetch_engine():
+    """Get the shared fetch engine (created on first use)"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = FetchEngine()
+        return _engine
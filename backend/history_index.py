@@ -0,0 +1,144 @@
+"""
+In-memory secondary indexes and cursor pagination for the activity history
+"""
+import base64
+import bisect
+
+
+def encode_history_cursor(seq):
+    """Encode a history sequence number as an opaque pagination cursor"""
+    return base64.urlsafe_b64encode(f'h:{seq}'.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_history_cursor(cursor):
+    """
+    Decode a pagination cursor back to a history sequence number
+    
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        prefix, seq = base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8').split(':', 1)
+        if prefix != 'h':
+            raise ValueError
+        return int(seq)
+    except Exception:
+        raise ValueError('Invalid history cursor')
+
+
+class HistoryIndex:
+    """
+    Secondary indexes over history entries by app, event type, status and time.
+    
+    Every entry has a sequence number that increases with insertion order.
+    Each indexed field value maps to an ascending list of sequence numbers, so
+    a filtered page is read by walking the smallest matching list backwards
+    from the cursor, and time ranges are resolved by binary search over the
+    running maximum of the timestamps (entries are stamped in seq order, but a
+    wall clock stepped back must not unsort the search list).
+    """
+    
+    INDEXED_FIELDS = ('app_id', 'event_type', 'status')
+    
+    def __init__(self):
+        self._entries = {}  # seq -> entry
+        self._seqs = []  # all sequence numbers, ascending
+        self._timestamps = []  # running maximum of the timestamps, parallel to _seqs
+        self._postings = {field: {} for field in self.INDEXED_FIELDS}
+    
+    def __len__(self):
+        return len(self._seqs)
+    
+    def clear(self):
+        """Remove all entries"""
+        self.__init__()
+    
+    def add(self, seq, entry):
+        """Index an entry (sequence numbers must be added in increasing order)"""
+        self._entries[seq] = entry
+        self._seqs.append(seq)
+        timestamp = entry.get('timestamp', '')
+        if self._timestamps and timestamp < self._timestamps[-1]:
+            timestamp = self._timestamps[-1]
+        self._timestamps.append(timestamp)
+        for field in self.INDEXED_FIELDS:
+            value = entry.get(field)
+            if value is not None:
+                self._postings[field].setdefault(value, []).append(seq)
+    
+    def drop_before(self, min_seq):
+        """Remove all entries with a sequence number lower than min_seq"""
+        cut = bisect.bisect_left(self._seqs, min_seq)
+        if not cut:
+            return
+        for seq in self._seqs[:cut]:
+            del self._entries[seq]
+        del self._seqs[:cut]
+        del self._timestamps[:cut]
+        for postings in self._postings.values():
+            for value in list(postings):
+                seqs = postings[value]
+                value_cut = bisect.bisect_left(seqs, min_seq)
+                if value_cut == len(seqs):
+                    del postings[value]
+                elif value_cut:
+                    del seqs[:value_cut]
+    
+    def query(self, limit, before=None, event_type=None, app_id=None, status=None, start_date=None, end_date=None):
+        """
+        Get a page of matching entries, newest first
+        
+        Args:
+            limit: Maximum number of entries to return
+            before: Only return entries with a sequence number lower than this (cursor)
+            event_type, app_id, status: Exact-match filters
+            start_date, end_date: Inclusive ISO timestamp bounds
+        
+        Returns:
+            (entries, next_seq) where next_seq is the cursor for the following page or None
+        """
+        filters = {'event_type': event_type, 'app_id': app_id, 'status': status}
+        filters = {field: value for field, value in filters.items() if value}
+        
+        # Walk the smallest posting list; the other filters are checked per entry
+        candidates = self._seqs
+        for field, value in filters.items():
+            postings = self._postings[field].get(value, [])
+            if len(postings) < len(candidates) or candidates is self._seqs:
+                candidates = postings
+        
+        # Resolve the time range to sequence bounds (nothing outside them is in
+        # range); entries inside them are still checked, in case the clock stepped back
+        upper = before
+        if end_date:
+            pos = bisect.bisect_right(self._timestamps, end_date)
+            end_seq = self._seqs[pos - 1] + 1 if pos else 0
+            upper = end_seq if upper is None else min(upper, end_seq)
+        lower = None
+        if start_date:
+            pos = bisect.bisect_left(self._timestamps, start_date)
+            if pos == len(self._seqs):
+                return [], None
+            lower = self._seqs[pos]
+        
+        # One match beyond the page tells whether there is a next page
+        index = len(candidates) if upper is None else bisect.bisect_left(candidates, upper)
+        results = []
+        seqs = []
+        while index > 0 and len(results) <= limit:
+            index -= 1
+            seq = candidates[index]
+            if lower is not None and seq < lower:
+                break
+            entry = self._entries[seq]
+            timestamp = entry.get('timestamp', '')
+            if (start_date and timestamp < start_date) or (end_date and timestamp > end_date):
+                continue
+            if all(entry.get(field) == value for field, value in filters.items()):
+                results.append(entry)
+                seqs.append(seq)
+        
+        if len(results) > limit:
+            return results[:limit], seqs[limit - 1]
+        return results, None
@@ -0,0 +1,209 @@
+"""
+On-disk cache for app icons served by /api/apps/<id>/icon
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from pathlib import Path
+
+import requests
+
+from backend.lookup_cache import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Size segment at the end of Apple artwork URLs, e.g. .../AppIcon.png/512x512bb.jpg
+ARTWORK_SIZE_PATTERN = re.compile(r'/(\d+)x(\d+)([a-z]*)\.(jpg|jpeg|png|webp)$', re.IGNORECASE)
+
+
+def sized_icon_url(icon_url, size):
+    """
+    Get the URL of a pre-sized icon
+    
+    Apple's image service renders artwork at the size named in the last path
+    segment, so thumbnails are fetched ready-made. Other URLs are returned as is.
+    """
+    if not size:
+        return icon_url
+    match = ARTWORK_SIZE_PATTERN.search(icon_url)
+    if not match:
+        return icon_url
+    suffix, extension = match.group(3) or 'bb', match.group(4)
+    return f'{icon_url[:match.start()]}/{size}x{size}{suffix}.{extension}'
+
+
+class IconCache:
+    """
+    Content-addressed icon cache in a directory.
+    
+    Each icon URL is stored under sha256(url) as the image bytes plus a small
+    JSON metadata file (content type, upstream ETag/Last-Modified, digest of the
+    bytes). Icons are served from disk; after `revalidate_after` seconds the
+    next request revalidates with a conditional GET, so an unchanged icon costs
+    one 304 response. The digest is the strong ETag sent to clients.
+    """
+    
+    # Thumbnail sizes (pixels) that may be requested
+    SIZES = (32, 64, 128, 256, 512, 1024)
+    
+    # Largest icon accepted from upstream
+    MAX_ICON_BYTES = 5 * 1024 * 1024
+    
+    def __init__(self, cache_dir, revalidate_after=None, max_entries=None, timeout=10):
+        self.cache_dir = Path(cache_dir)
+        self.revalidate_after = revalidate_after if revalidate_after is not None else float(os.getenv('ICON_CACHE_REVALIDATE', '86400'))
+        self.max_entries = max_entries or int(os.getenv('ICON_CACHE_MAX_ENTRIES', '5000'))
+        self.timeout = timeout
+        self._single_flight = SingleFlight()
+        self._lock = threading.Lock()  # Counters and pruning
+        self._entries = None  # Number of cached icons, counted on first write
+        
+        self.hits = 0
+        self.revalidated = 0
+        self.fetched = 0
+        self.errors = 0
+    
+    def _count(self, counter):
+        """Increment one of the hits/revalidated/fetched/errors counters"""
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+    
+    def _paths(self, url):
+        """Image and metadata paths for a URL"""
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return self.cache_dir / f'{key}.img', self.cache_dir / f'{key}.json'
+    
+    def _read_meta(self, meta_path):
+        """Load an entry's metadata, or None if it is missing or unreadable"""
+        try:
+            with open(meta_path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    def _write_meta(self, meta_path, meta):
+        """Write an entry's metadata atomically"""
+        tmp_path = meta_path.with_suffix('.json.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, meta_path)
+    
+    def get(self, url):
+        """
+        Get a cached icon, fetching or revalidating it if needed
+        
+        Returns:
+            (image path, metadata dict with 'content_type' and 'etag')
+        
+        Raises:
+            requests.RequestException or ValueError: If the icon is not cached and
+                cannot be fetched
+        """
+        image_path, meta_path = self._paths(url)
+        meta = self._read_meta(meta_path)
+        if meta and image_path.exists() and time.time() - meta.get('checked_at', 0) < self.revalidate_after:
+            self._count('hits')
+            return image_path, meta
+        # Concurrent requests for the same icon share one upstream request
+        return self._single_flight.do(url, lambda: self._refresh(url, image_path, meta_path))
+    
+    def _refresh(self, url, image_path, meta_path):
+        """Fetch an icon, conditionally if a copy is cached"""
+        meta = self._read_meta(meta_path)
+        if meta and not image_path.exists():
+            meta = None
+        
+        headers = {}
+        if meta:
+            if meta.get('upstream_etag'):
+                headers['If-None-Match'] = meta['upstream_etag']
+            if meta.get('upstream_last_modified'):
+                headers['If-Modified-Since'] = meta['upstream_last_modified']
+        
+        try:
+            resp = requests.get(url, headers=headers, timeout=self.timeout, stream=True)
+            if resp.status_code == 304 and meta:
+                resp.close()
+                self._count('revalidated')
+                meta['checked_at'] = time.time()
+                self._write_meta(meta_path, meta)
+                os.utime(image_path)  # Still in use - keep it out of pruning
+                return image_path, meta
+            resp.raise_for_status()
+            
+            content_type = resp.headers.get('Content-Type', 'image/png').split(';', 1)[0].strip()
+            # Restrict to image types
+            if not content_type.startswith('image/'):
+                content_type = 'image/png'
+            body = bytearray()
+            for chunk in resp.iter_content(chunk_size=65536):
+                body.extend(chunk)
+                if len(body) > self.MAX_ICON_BYTES:
+                    resp.close()
+                    raise ValueError('Icon too large')
+        except (requests.RequestException, ValueError) as e:
+            self._count('errors')
+            if meta:
+                # Keep serving the cached copy while upstream is unavailable
+                logger.warning(f"Could not revalidate icon {url}: {e}")
+                return image_path, meta
+            raise
+        
+        self._count('fetched')
+        new_entry = not image_path.exists()
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = image_path.with_suffix('.img.tmp')
+        with open(tmp_path, 'wb') as f:
+            f.write(body)
+        os.replace(tmp_path, image_path)
+        meta = {
+            'url': url,
+            'content_type': content_type,
+            'etag': hashlib.sha256(body).hexdigest()[:32],
+            'upstream_etag': resp.headers.get('ETag'),
+            'upstream_last_modified': resp.headers.get('Last-Modified'),
+            'size': len(body),
+            'checked_at': time.time()
+        }
+        self._write_meta(meta_path, meta)
+        if new_entry:
+            self._prune()
+        return image_path, meta
+    
+    def _prune(self):
+        """Remove the least recently refreshed icons once there are more than max_entries"""
+        with self._lock:
+            if self._entries is None:
+                self._entries = sum(1 for _ in self.cache_dir.glob('*.img'))
+            else:
+                self._entries += 1
+            if self._entries <= self.max_entries:
+                return
+            
+            images = sorted(self.cache_dir.glob('*.img'), key=lambda path: path.stat().st_mtime)
+            # Drop a tenth at a time so pruning does not run on every new icon
+            excess = len(images) - self.max_entries + self.max_entries // 10
+            for image_path in images[:max(excess, 0)]:
+                for path in (image_path, image_path.with_suffix('.json')):
+                    try:
+                        path.unlink()
+                    except FileNotFoundError:
+                        pass
+            self._entries = len(images) - max(excess, 0)
+            logger.info(f"Pruned {max(excess, 0)} cached icons")
+    
+    def stats(self):
+        """Get cache counters"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'revalidated': self.revalidated,
+                'fetched': self.fetched,
+                'errors': self.errors,
+                'revalidate_after': self.revalidate_after,
+                'max_entries': self.max_entries
+            }
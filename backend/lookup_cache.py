@@ -0,0 +1,182 @@
+"""
+Bounded TTL cache and request coalescing for App Store lookup results
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class LookupCache:
+    """
+    LRU cache with a freshness TTL and stale-while-revalidate.
+    
+    An entry is fresh for `ttl` seconds and served directly. For `stale_ttl`
+    seconds after that it is still served, while one background refresh per
+    key loads a new value. Older entries count as misses and are loaded
+    synchronously. The least recently used entry is evicted when the cache is full.
+    """
+    
+    def __init__(self, max_entries=None, ttl=None, stale_ttl=None):
+        self.max_entries = max_entries or int(os.getenv('LOOKUP_CACHE_SIZE', '5000'))
+        self.ttl = ttl if ttl is not None else float(os.getenv('LOOKUP_CACHE_TTL', '300'))
+        self.stale_ttl = stale_ttl if stale_ttl is not None else float(os.getenv('LOOKUP_CACHE_STALE_TTL', '3600'))
+        self._entries = OrderedDict()  # key -> (value, stored_at)
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key, loader):
+        """
+        Get a value, loading it with loader() on a miss
+        
+        Raises:
+            Whatever loader raises on a miss (failed loads are not cached)
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, stored_at = entry
+                age = now - stored_at
+                if age < self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                if age < self.ttl + self.stale_ttl:
+                    self._entries.move_to_end(key)
+                    self.stale_hits += 1
+                    if key not in self._refreshing:
+                        self._refreshing.add(key)
+                        threading.Thread(target=self._refresh, args=(key, loader), daemon=True).start()
+                    return value
+            self.misses += 1
+        
+        value = loader()
+        self.put(key, value)
+        return value
+    
+    def get_if_fresh(self, key):
+        """Get a fresh value without loading it: (found, value), counted as a hit or miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[1] >= self.ttl:
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[0]
+    
+    def put(self, key, value):
+        """Store a value, evicting the least recently used entries beyond max_entries"""
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def _refresh(self, key, loader):
+        """Reload a stale entry in the background"""
+        try:
+            self.put(key, loader())
+        except Exception as e:
+            logger.warning(f"Background refresh failed for {key}: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+    
+    def clear(self):
+        """Remove all entries"""
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self):
+        """Get cache counters"""
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'stale_ttl': self.stale_ttl,
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key.
+    
+    The first caller for a key runs the call; callers arriving while it is in
+    flight wait for it and share its result or exception instead of making
+    their own request.
+    """
+    
+    def __init__(self):
+        self._calls = {}  # key -> _Call
+        self._lock = threading.Lock()
+        
+        self.calls = 0
+        self.shared = 0
+    
+    def do(self, key, fn):
+        """
+        Run fn() for a key, or wait for the call already in flight for it
+        
+        Raises:
+            Whatever fn raises (shared with every waiting caller)
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self.calls += 1
+            else:
+                self.shared += 1
+        
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+    
+    def stats(self):
+        """Get coalescing counters"""
+        with self._lock:
+            return {
+                'in_flight': len(self._calls),
+                'calls': self.calls,
+                'shared': self.shared
+            }
+
+
+class _Call:
+    """One in-flight SingleFlight call"""
+    
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
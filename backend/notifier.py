@@ -15,13 +15,18 @@ logger = logging.getLogger(__name__)
 class NotificationHandler:
     """Handle notifications to multiple platforms"""
     
+    # Seconds to wait for the SMTP server (connecting and each command)
+    SMTP_TIMEOUT = 30
+    
     def __init__(self, settings: Optional[Dict] = None):
         self.settings = settings or {}
     
-    def send_notification(self, destination: Dict, app_name: str, version: str, release_notes: str, formatted_content: str) -> Tuple[bool, Optional[str]]:
+    def send_notification(self, destination: Dict, app_name: str, version: str, release_notes: str, formatted_content: str, subject: Optional[str] = None) -> Tuple[bool, Optional[str]]:
         """
         Send notification to a destination
         
+        subject replaces the release title used by Teams and email (for alerts that are not releases).
+        
         Returns: (success: bool, error_message: Optional[str])
         """
         dest_type = destination.get('type', '').lower()
@@ -34,9 +39,9 @@ class NotificationHandler:
             elif dest_type == 'telegram':
                 return self._send_telegram(destination, app_name, version, release_notes, formatted_content)
             elif dest_type == 'teams':
-                return self._send_teams(destination, app_name, version, release_notes, formatted_content)
+                return self._send_teams(destination, app_name, version, release_notes, formatted_content, subject)
             elif dest_type == 'email':
-                return self._send_email(destination, app_name, version, release_notes, formatted_content)
+                return self._send_email(destination, app_name, version, release_notes, formatted_content, subject)
             elif dest_type == 'generic':
                 return self._send_generic(destination, app_name, version, release_notes, formatted_content)
             else:
@@ -121,7 +126,7 @@ class NotificationHandler:
             logger.error(f"Error posting to Telegram: {e}")
             return False, f'Failed to post to Telegram: {str(e)}'
     
-    def _send_teams(self, destination: Dict, app_name: str, version: str, release_notes: str, formatted_content: str) -> Tuple[bool, Optional[str]]:
+    def _send_teams(self, destination: Dict, app_name: str, version: str, release_notes: str, formatted_content: str, subject: Optional[str] = None) -> Tuple[bool, Optional[str]]:
         """Send notification to Microsoft Teams webhook"""
         webhook_url = destination.get('webhook_url', '').strip()
         if not webhook_url:
@@ -133,13 +138,14 @@ class NotificationHandler:
         try:
             # Format as Teams message card
             teams_text = self._convert_to_teams_format(app_name, version, release_notes, formatted_content)
+            title = subject or f'{app_name} v{version}'
             
             payload = {
                 '@type': 'MessageCard',
                 '@context': 'https://schema.org/extensions',
-                'summary': f'{app_name} v{version}',
+                'summary': title,
                 'themeColor': '0078D4',
-                'title': f'{app_name} v{version}',
+                'title': title,
                 'text': teams_text
             }
             
@@ -150,7 +156,7 @@ class NotificationHandler:
             logger.error(f"Error posting to Teams webhook: {e}")
             return False, f'Failed to post to Teams: {str(e)}'
     
-    def _send_email(self, destination: Dict, app_name: str, version: str, release_notes: str, formatted_content: str) -> Tuple[bool, Optional[str]]:
+    def _send_email(self, destination: Dict, app_name: str, version: str, release_notes: str, formatted_content: str, subject: Optional[str] = None) -> Tuple[bool, Optional[str]]:
         """Send notification via email (SMTP)"""
         to_email = destination.get('email', '').strip()
         if not to_email:
@@ -170,7 +176,7 @@ class NotificationHandler:
         try:
             # Create email message
             msg = MIMEMultipart('alternative')
-            msg['Subject'] = f'{app_name} v{version} - New Release'
+            msg['Subject'] = subject or f'{app_name} v{version} - New Release'
             msg['From'] = smtp_from
             msg['To'] = to_email
             
@@ -185,7 +191,7 @@ class NotificationHandler:
             msg.attach(html_part)
             
             # Send email
-            smtp = smtplib.SMTP(smtp_host, int(smtp_port))
+            smtp = smtplib.SMTP(smtp_host, int(smtp_port), timeout=self.SMTP_TIMEOUT)
             if smtp_use_tls:
                 smtp.starttls()
             
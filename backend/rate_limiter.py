@@ -0,0 +1,162 @@
+"""
+Per-host outbound rate limiting and retry budgets for the fetch engine
+"""
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+logger = logging.getLogger(__name__)
+
+
+def parse_retry_after(value):
+    """Parse a Retry-After header (seconds or an HTTP date) into seconds from now, or None"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class HostRateLimiter:
+    """
+    Token bucket for one upstream host with an adaptive rate and a retry budget.
+    
+    Requests take a token before they are sent. The rate is halved whenever the
+    host answers 429 or 503 and creeps back up towards the configured maximum
+    with every successful response (AIMD). A Retry-After header pauses all
+    requests to the host until it has passed.
+    
+    Retries draw from a budget shared by all callers: every first attempt adds
+    `retry_ratio` to it and every retry takes one, so when the host is failing
+    retries stay a fraction of the traffic instead of multiplying it.
+    
+    All methods except stats() must be called on the fetch engine loop.
+    """
+    
+    # Statuses that mean the host wants us to slow down
+    THROTTLE_STATUSES = (429, 503)
+    
+    # Longest Retry-After honored (a broken header must not stall lookups for hours)
+    MAX_RETRY_AFTER = 600
+    
+    def __init__(self, host, rate_per_minute=None, burst=None, retry_ratio=None, retry_budget=None, max_wait=None):
+        self.host = host
+        self.max_rate = (rate_per_minute or float(os.getenv('FETCH_RATE_LIMIT', '20'))) / 60.0
+        self.burst = burst or int(os.getenv('FETCH_RATE_BURST', '20'))
+        self.retry_ratio = retry_ratio if retry_ratio is not None else float(os.getenv('FETCH_RETRY_RATIO', '0.2'))
+        self.retry_capacity = retry_budget if retry_budget is not None else float(os.getenv('FETCH_RETRY_BUDGET', '10'))
+        self.max_wait = max_wait if max_wait is not None else float(os.getenv('FETCH_RATE_MAX_WAIT', '60'))
+        
+        # Current rate (requests per second), lowered on throttling and never below min_rate
+        self.rate = self.max_rate
+        self.min_rate = self.max_rate / 20
+        self.tokens = float(self.burst)
+        self._refilled_at = time.monotonic()
+        self.paused_until = 0.0
+        self.retry_balance = self.retry_capacity
+        
+        self.requests = 0
+        self.throttled = 0
+        self.retries = 0
+        self.retries_denied = 0
+    
+    def _refill(self, now):
+        """Add the tokens accrued since the last refill"""
+        self.tokens = min(self.burst, self.tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+    
+    def _wait_time(self, now):
+        """Seconds until a token is available"""
+        self._refill(now)
+        wait = max(0.0, self.paused_until - now)
+        if self.tokens < 1:
+            wait = max(wait, (1 - self.tokens) / self.rate)
+        return wait
+    
+    async def acquire(self):
+        """
+        Wait for a token to send one request
+        
+        Raises:
+            RateLimitExceeded: If the wait would exceed max_wait
+        """
+        while True:
+            now = time.monotonic()
+            wait = self._wait_time(now)
+            if wait <= 0:
+                self.tokens -= 1
+                self.requests += 1
+                return
+            if wait > self.max_wait:
+                raise RateLimitExceeded(self.host, wait)
+            await asyncio.sleep(wait)
+    
+    def record_response(self, status, headers=None):
+        """Adapt the rate to a response status (and its Retry-After header)"""
+        if status in self.THROTTLE_STATUSES:
+            self.throttled += 1
+            previous = self.rate
+            self.rate = max(self.min_rate, self.rate / 2)
+            retry_after = parse_retry_after((headers or {}).get('retry-after'))
+            if retry_after:
+                retry_after = min(retry_after, self.MAX_RETRY_AFTER)
+                self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+            logger.warning(
+                f"{self.host} answered {status}; rate lowered from {previous * 60:.1f} to {self.rate * 60:.1f}/min"
+                + (f", paused for {retry_after:.0f}s" if retry_after else "")
+            )
+        elif status < 400 and self.rate < self.max_rate:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+    
+    def record_attempt(self):
+        """Credit the retry budget for a first attempt"""
+        self.retry_balance = min(self.retry_capacity, self.retry_balance + self.retry_ratio)
+    
+    def try_retry(self):
+        """Take one retry from the budget; False if it is exhausted"""
+        if self.retry_balance < 1:
+            self.retries_denied += 1
+            return False
+        self.retry_balance -= 1
+        self.retries += 1
+        return True
+    
+    def stats(self):
+        """Get the current rate and retry budget usage"""
+        now = time.monotonic()
+        return {
+            'rate_per_minute': round(self.rate * 60, 2),
+            'max_rate_per_minute': round(self.max_rate * 60, 2),
+            'tokens': round(min(self.burst, self.tokens + (now - self._refilled_at) * self.rate), 2),
+            'burst': self.burst,
+            'paused_for': round(max(0.0, self.paused_until - now), 1),
+            'requests': self.requests,
+            'throttled': self.throttled,
+            'retry_budget': {
+                'available': round(self.retry_balance, 2),
+                'capacity': self.retry_capacity,
+                'used': self.retries,
+                'denied': self.retries_denied
+            }
+        }
+
+
+class RateLimitExceeded(Exception):
+    """A request would have to wait longer than allowed for the host's rate limit"""
+    
+    def __init__(self, host, wait):
+        super().__init__(f'Rate limit for {host} would delay the request by {wait:.0f}s')
+        self.host = host
+        self.wait = wait
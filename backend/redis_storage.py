@@ -0,0 +1,533 @@
+"""
+Redis storage engine, so several App Watch instances can share one store
+"""
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from urllib.parse import urlparse, unquote
+
+from backend.storage_backend import StorageBackend, DEFAULT_SETTINGS, build_app_record, build_history_entry
+from backend.history_index import encode_history_cursor, decode_history_cursor
+
+logger = logging.getLogger(__name__)
+
+
+class RedisError(Exception):
+    """Error reply from the Redis server or a broken connection"""
+
+
+class RedisClient:
+    """
+    Minimal Redis client speaking RESP2 over a plain socket.
+    
+    Each thread gets its own connection. Commands can be pipelined (sent in one
+    write, replies read in order), and bulk replies are decoded as UTF-8 text.
+    """
+    
+    def __init__(self, url, timeout=10):
+        parsed = urlparse(url)
+        if parsed.scheme != 'redis':
+            raise ValueError(f"Unsupported Redis URL scheme: {parsed.scheme}. Use redis://")
+        self.host = parsed.hostname or 'localhost'
+        self.port = parsed.port or 6379
+        self.username = unquote(parsed.username) if parsed.username else None
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.db = int(parsed.path.lstrip('/') or 0)
+        self.timeout = timeout
+        self._local = threading.local()
+    
+    def _connect(self):
+        """Open a connection for the current thread (authenticated, with the database selected)"""
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._local.sock = sock
+        self._local.reader = sock.makefile('rb')
+        
+        setup = []
+        if self.password:
+            setup.append(('AUTH', self.username, self.password) if self.username else ('AUTH', self.password))
+        if self.db:
+            setup.append(('SELECT', self.db))
+        if setup:
+            self.pipeline(setup)
+    
+    def _close(self):
+        """Drop the connection of the current thread (it is reopened on the next command)"""
+        sock = getattr(self._local, 'sock', None)
+        self._local.sock = None
+        self._local.reader = None
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+    
+    @staticmethod
+    def _encode(args):
+        """Encode one command as a RESP array of bulk strings"""
+        parts = [f'*{len(args)}\r\n'.encode('ascii')]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode('utf-8')
+            parts.append(f'${len(data)}\r\n'.encode('ascii'))
+            parts.append(data)
+            parts.append(b'\r\n')
+        return b''.join(parts)
+    
+    def _read_reply(self):
+        """Read one reply; error replies are returned (not raised) so the stream stays in sync"""
+        line = self._local.reader.readline()
+        if not line.endswith(b'\r\n'):
+            raise RedisError('Connection closed by Redis server')
+        kind, payload = line[:1], line[1:-2]
+        if kind == b'+':
+            return payload.decode('utf-8')
+        if kind == b'-':
+            return RedisError(payload.decode('utf-8'))
+        if kind == b':':
+            return int(payload)
+        if kind == b'$':
+            length = int(payload)
+            if length < 0:
+                return None
+            data = self._local.reader.read(length + 2)
+            if len(data) != length + 2:
+                raise RedisError('Connection closed by Redis server')
+            return data[:-2].decode('utf-8')
+        if kind == b'*':
+            length = int(payload)
+            if length < 0:
+                return None
+            return [self._read_reply() for _ in range(length)]
+        raise RedisError(f'Unexpected reply from Redis server: {line[:40]!r}')
+    
+    def pipeline(self, commands):
+        """
+        Send several commands at once and return their replies in order
+        
+        Raises:
+            RedisError: If any command failed or the connection broke
+        """
+        try:
+            if getattr(self._local, 'sock', None) is None:
+                self._connect()
+            self._local.sock.sendall(b''.join(self._encode(args) for args in commands))
+            replies = [self._read_reply() for _ in commands]
+        except (OSError, RedisError) as e:
+            # The connection state is unknown - start over on the next command
+            self._close()
+            if isinstance(e, RedisError):
+                raise
+            raise RedisError(f'Redis connection error: {e}') from e
+        
+        for reply in replies:
+            if isinstance(reply, RedisError):
+                raise reply
+            if isinstance(reply, list):
+                # EXEC returns the results of the queued commands
+                for item in reply:
+                    if isinstance(item, RedisError):
+                        raise item
+        return replies
+    
+    def execute(self, *args):
+        """Run one command and return its reply"""
+        return self.pipeline([args])[0]
+
+
+class RedisStorageManager(StorageBackend):
+    """
+    Manage app data and version storage in Redis (or any server speaking the Redis protocol).
+    
+    Keys (all under KEY_PREFIX):
+        apps                    hash of app ID -> app record (JSON)
+        apps:order              sorted set of app IDs in creation order
+        apps:revision           counter bumped on every app change (seen by all instances)
+        state:<field>           hash of app ID -> status value, one per status field
+        settings, auth          JSON documents
+        session:<id>            login session (JSON), expiring with the session
+        history                 sorted set of history entries (JSON) scored by sequence number
+        history:seq             history sequence counter
+        history:app:<id>,       sorted sets of the sequence numbers of the entries with an
+        history:type:<type>,    app ID, event type or status (secondary indexes for filtered
+        history:status:<status> history pages)
+        history:indexes         set of the secondary index keys
+        history:indexed         set once history written before the indexes existed is indexed
+    """
+    
+    KEY_PREFIX = os.getenv('REDIS_KEY_PREFIX', 'appwatch:')
+    
+    # History entries read per round trip while filtering
+    HISTORY_SCAN_BATCH = 500
+    
+    # Secondary history indexes: entry field -> key name part
+    HISTORY_INDEXES = {'app_id': 'app', 'event_type': 'type', 'status': 'status'}
+    
+    # Seconds history timestamps may run out of sequence order (entries are stamped
+    # before they get their sequence number, by instances whose clocks may differ)
+    HISTORY_CLOCK_SKEW = 60
+    
+    # Minimum seconds between checks for auth settings changed by other instances
+    AUTH_RECHECK_INTERVAL = 1.0
+    
+    def __init__(self, url, client=None):
+        super().__init__()
+        self.client = client or RedisClient(url)
+        self._auth_source = None
+        self._auth_checked_at = 0.0
+        
+        # Create settings and auth only if no other instance did
+        self.client.pipeline([
+            ('SET', self._key('settings'), json.dumps(DEFAULT_SETTINGS), 'NX'),
+            ('SET', self._key('auth'), json.dumps(self._default_auth()), 'NX')
+        ])
+        self._index_existing_history()
+    
+    def _key(self, name):
+        """Get the full Redis key for a name"""
+        return f'{self.KEY_PREFIX}{name}'
+    
+    # Settings and auth primitives
+    def _settings_source_token(self):
+        """Raw stored settings value - changes when any instance saves settings"""
+        return self.client.execute('GET', self._key('settings'))
+    
+    def _load_settings(self):
+        """Load settings from Redis"""
+        try:
+            raw = self.client.execute('GET', self._key('settings'))
+            return json.loads(raw) if raw else {}
+        except Exception as e:
+            logger.error(f"Error loading settings: {e}")
+            return {}
+    
+    def _save_settings(self, settings_dict):
+        """Save settings to Redis"""
+        try:
+            self.client.execute('SET', self._key('settings'), json.dumps(settings_dict))
+        except Exception as e:
+            logger.error(f"Error saving settings: {e}")
+            raise
+    
+    def _load_auth(self):
+        """Load authentication settings from Redis"""
+        try:
+            raw = self.client.execute('GET', self._key('auth'))
+            self._auth_source = raw
+            self._auth_checked_at = time.monotonic()
+            return json.loads(raw) if raw else {}
+        except Exception as e:
+            logger.error(f"Error loading auth: {e}")
+            return {}
+    
+    def _auth_changed_elsewhere(self):
+        """Check (at most once per AUTH_RECHECK_INTERVAL) whether the stored auth settings changed"""
+        now = time.monotonic()
+        if now - self._auth_checked_at < self.AUTH_RECHECK_INTERVAL:
+            return False
+        self._auth_checked_at = now
+        return self.client.execute('GET', self._key('auth')) != self._auth_source
+    
+    def _save_auth(self, auth_dict):
+        """Save authentication settings to Redis"""
+        try:
+            self.client.execute('SET', self._key('auth'), json.dumps(auth_dict))
+        except Exception as e:
+            logger.error(f"Error saving auth: {e}")
+            raise
+    
+    # Login sessions
+    def get_session(self, session_id):
+        """Get a login session, or None if missing or expired"""
+        raw = self.client.execute('GET', self._key(f'session:{session_id}'))
+        session = json.loads(raw) if raw else None
+        if session is None or session.get('expires_at', 0) < time.time():
+            return None
+        return session
+    
+    def save_session(self, session_id, session):
+        """Store a login session; Redis drops it when it expires"""
+        ttl = max(1, int(session['expires_at'] - time.time()) + 1)
+        self.client.execute('SET', self._key(f'session:{session_id}'), json.dumps(session), 'EX', ttl)
+    
+    def delete_session(self, session_id):
+        """Delete a login session"""
+        self.client.execute('DEL', self._key(f'session:{session_id}'))
+    
+    # Apps
+    def get_apps_revision(self):
+        """Get the apps revision shared by all instances"""
+        return self.client.execute('GET', self._key('apps:revision'))
+    
+    def _state_commands(self, command, app_id=None, fields=None):
+        """Build one command per status field hash (all status fields by default)"""
+        return [
+            (command, self._key(f'state:{field}')) + ((app_id,) if app_id is not None else ())
+            for field in fields or self.STATE_FIELDS
+        ]
+    
+    def get_all_apps(self):
+        """Get all apps as a list"""
+        order, records, *states = self.client.pipeline([
+            ('ZRANGE', self._key('apps:order'), 0, -1),
+            ('HGETALL', self._key('apps'))
+        ] + self._state_commands('HGETALL', fields=self.APP_STATE_FIELDS))
+        
+        records = dict(zip(records[::2], records[1::2]))
+        states = [dict(zip(values[::2], values[1::2])) for values in states]
+        apps = []
+        for app_id in order:
+            if app_id not in records:
+                continue
+            app = {'id': app_id, **json.loads(records[app_id])}
+            for field, values in zip(self.APP_STATE_FIELDS, states):
+                app[field] = values.get(app_id)
+            app['storefront_versions'] = self._decode_json_state(app['storefront_versions'])
+            app['lookup_failures'] = self._decode_json_state(app['lookup_failures'])
+            apps.append(app)
+        return apps
+    
+    def get_app(self, app_id):
+        """Get a specific app"""
+        record, *state = self.client.pipeline(
+            [('HGET', self._key('apps'), app_id)] + self._state_commands('HGET', app_id, self.APP_STATE_FIELDS)
+        )
+        if record is None:
+            return None
+        app = {'id': app_id, **json.loads(record), **dict(zip(self.APP_STATE_FIELDS, state))}
+        app['storefront_versions'] = self._decode_json_state(app['storefront_versions'])
+        app['lookup_failures'] = self._decode_json_state(app['lookup_failures'])
+        return app
+    
+    def save_apps(self, apps_data):
+        """Save or update many apps in a single transaction"""
+        if not apps_data:
+            return []
+        
+        existing = self.client.pipeline([
+            ('HEXISTS', self._key('apps'), app_data['id']) if app_data.get('id') else ('ECHO', '0')
+            for app_data in apps_data
+        ])
+        # New apps are ordered by the revision that created them, one revision per app so
+        # apps saved together keep their order; the revision is bumped again once the
+        # change is written so other instances reload the final state
+        revision = self.client.execute('INCRBY', self._key('apps:revision'), len(apps_data))
+        
+        app_ids = []
+        records = []
+        for app_data, exists in zip(apps_data, existing):
+            # Generate ID if new
+            app_id = app_data['id'] if exists == 1 else str(uuid.uuid4())
+            app_ids.append(app_id)
+            records.extend([app_id, json.dumps(build_app_record(app_data))])
+        
+        order = []
+        for position, app_id in enumerate(app_ids):
+            order.extend([revision - len(app_ids) + 1 + position, app_id])
+        
+        self.client.pipeline([
+            ('MULTI',),
+            ('HSET', self._key('apps'), *records),
+            ('ZADD', self._key('apps:order'), 'NX', *order),
+            ('INCR', self._key('apps:revision')),
+            ('EXEC',)
+        ])
+        return app_ids
+    
+    def save_app(self, app_data):
+        """Save or update an app"""
+        return self.save_apps([app_data])[0]
+    
+    def delete_app(self, app_id):
+        """Delete an app"""
+        replies = self.client.pipeline([
+            ('MULTI',),
+            ('HDEL', self._key('apps'), app_id),
+            ('ZREM', self._key('apps:order'), app_id),
+            ('INCR', self._key('apps:revision'))
+        ] + self._state_commands('HDEL', app_id) + [('EXEC',)])
+        return replies[-1][0] > 0
+    
+    # Per-app status
+    def _get_state(self, app_id, field):
+        """Get a status field for an app"""
+        return self.client.execute('HGET', self._key(f'state:{field}'), app_id)
+    
+    def _set_state(self, app_id, field, value):
+        """Set a status field for an app"""
+        if value is None:
+            self.client.execute('HDEL', self._key(f'state:{field}'), app_id)
+        else:
+            self.client.execute('HSET', self._key(f'state:{field}'), app_id, value)
+    
+    # History/Activity log methods
+    def _history_index_keys(self, entry):
+        """Secondary index keys an entry belongs to"""
+        return [
+            self._key(f'history:{name}:{entry[field]}')
+            for field, name in self.HISTORY_INDEXES.items() if entry.get(field)
+        ]
+    
+    def _index_existing_history(self):
+        """Add history written before the secondary indexes existed to the indexes (once)"""
+        if self.client.execute('GET', self._key('history:indexed')):
+            return
+        lower = '-inf'
+        while True:
+            batch = self.client.execute(
+                'ZRANGEBYSCORE', self._key('history'), lower, '+inf',
+                'WITHSCORES', 'LIMIT', 0, self.HISTORY_SCAN_BATCH
+            )
+            commands = []
+            keys = set()
+            for index in range(0, len(batch), 2):
+                seq = batch[index + 1]
+                for key in self._history_index_keys(json.loads(batch[index])):
+                    commands.append(('ZADD', key, seq, seq))
+                    keys.add(key)
+            if keys:
+                self.client.pipeline(commands + [('SADD', self._key('history:indexes'), *keys)])
+            if len(batch) < self.HISTORY_SCAN_BATCH * 2:
+                break
+            lower = f'({batch[-1]}'
+        self.client.execute('SET', self._key('history:indexed'), '1')
+    
+    def add_history_entry(self, event_type, app_id=None, app_name=None, status='info', message='', details=None):
+        """Add an entry to the activity history"""
+        entry = build_history_entry(event_type, app_id, app_name, status, message, details)
+        
+        seq = self.client.execute('INCR', self._key('history:seq'))
+        # Keep the same retention as the other engines
+        oldest_kept = seq - self.HISTORY_MAX_ENTRIES
+        commands = [
+            ('MULTI',),
+            ('ZADD', self._key('history'), seq, json.dumps(entry, separators=(',', ':'))),
+            ('ZREMRANGEBYSCORE', self._key('history'), '-inf', oldest_kept)
+        ]
+        index_keys = self._history_index_keys(entry)
+        for key in index_keys:
+            commands.append(('ZADD', key, seq, seq))
+            commands.append(('ZREMRANGEBYSCORE', key, '-inf', oldest_kept))
+        if index_keys:
+            commands.append(('SADD', self._key('history:indexes'), *index_keys))
+        self.client.pipeline(commands + [('EXEC',)])
+        return entry
+    
+    def _read_history_batch(self, source, upper, count):
+        """
+        Read up to `count` history entries below a sequence bound, newest first
+        
+        Args:
+            source: Key to page through - the history itself or a secondary index
+        
+        Returns:
+            ([(seq, entry JSON)], bound for the next batch or None at the end);
+            entries trimmed from the history but still in an index are left out
+        """
+        if source == self._key('history'):
+            batch = self.client.execute('ZREVRANGEBYSCORE', source, upper, '-inf', 'WITHSCORES', 'LIMIT', 0, count)
+            found = [(int(float(batch[index + 1])), batch[index]) for index in range(0, len(batch), 2)]
+            seqs = [seq for seq, _ in found]
+        else:
+            seqs = [int(float(seq)) for seq in self.client.execute('ZREVRANGEBYSCORE', source, upper, '-inf', 'LIMIT', 0, count)]
+            members = self.client.pipeline([('ZRANGEBYSCORE', self._key('history'), seq, seq) for seq in seqs]) if seqs else []
+            found = [(seq, entry[0]) for seq, entry in zip(seqs, members) if entry]
+        return found, (f'({seqs[-1]}' if len(seqs) == count else None)
+    
+    def get_history_page(self, limit=100, cursor=None, event_type=None, app_id=None, status=None, start_date=None, end_date=None):
+        """
+        Get one page of activity history (newest first, paged by sequence number)
+        
+        Field filters page through the smallest matching secondary index instead of
+        the whole history; the other filters are checked per entry.
+        
+        Returns:
+            (entries, next_cursor) - next_cursor is None when there are no more pages
+        
+        Raises:
+            ValueError: If the cursor is invalid
+        """
+        upper = f'({decode_history_cursor(cursor)}' if cursor else '+inf'
+        filters = {'event_type': event_type, 'app_id': app_id, 'status': status}
+        filters = {field: value for field, value in filters.items() if value}
+        
+        source = self._key('history')
+        if filters:
+            index_keys = self._history_index_keys(filters)
+            sizes = self.client.pipeline([('ZCARD', key) for key in index_keys])
+            if not min(sizes):
+                return [], None
+            source = index_keys[sizes.index(min(sizes))]
+        # Entries are only checked one by one when the source does not match all filters
+        filtered = len(filters) > 1 or bool(start_date or end_date)
+        batch_size = max(limit, self.HISTORY_SCAN_BATCH) if filtered else limit
+        
+        # Entries older than this cannot be newer than start_date, even out of order
+        stop_before = None
+        if start_date:
+            try:
+                stop_before = (datetime.fromisoformat(start_date) - timedelta(seconds=self.HISTORY_CLOCK_SKEW)).isoformat()
+            except ValueError:
+                pass
+        
+        # One match beyond the page tells whether there is a next page
+        entries = []
+        seqs = []
+        while len(entries) <= limit:
+            batch, upper = self._read_history_batch(source, upper, batch_size + 1)
+            for seq, raw in batch:
+                entry = json.loads(raw)
+                timestamp = entry.get('timestamp', '')
+                if stop_before and timestamp < stop_before:
+                    upper = None
+                    break
+                if (start_date and timestamp < start_date) or (end_date and timestamp > end_date):
+                    continue
+                if all(entry.get(field) == value for field, value in filters.items()):
+                    entries.append(entry)
+                    seqs.append(seq)
+                    if len(entries) > limit:
+                        break
+            if upper is None:
+                break
+        
+        if len(entries) > limit:
+            return entries[:limit], encode_history_cursor(seqs[limit - 1])
+        return entries, None
+    
+    def clear_history(self, older_than_days=None):
+        """
+        Clear history entries
+        
+        Args:
+            older_than_days: If provided, only clear entries older than this many days
+        """
+        index_keys = self.client.execute('SMEMBERS', self._key('history:indexes'))
+        if not older_than_days:
+            self.client.execute('DEL', self._key('history'), self._key('history:indexes'), *index_keys)
+            return
+        
+        cutoff_date = (datetime.now() - timedelta(days=older_than_days)).isoformat()
+        # Find the first entry to keep, scanning oldest first
+        lower = '-inf'
+        while True:
+            batch = self.client.execute(
+                'ZRANGEBYSCORE', self._key('history'), lower, '+inf',
+                'WITHSCORES', 'LIMIT', 0, self.HISTORY_SCAN_BATCH
+            )
+            for index in range(0, len(batch), 2):
+                if json.loads(batch[index]).get('timestamp', '') >= cutoff_date:
+                    self.client.pipeline([
+                        ('ZREMRANGEBYSCORE', key, '-inf', f'({batch[index + 1]}')
+                        for key in [self._key('history')] + index_keys
+                    ])
+                    return
+            if len(batch) < self.HISTORY_SCAN_BATCH * 2:
+                # Every entry is older than the cutoff
+                self.client.execute('DEL', self._key('history'), self._key('history:indexes'), *index_keys)
+                return
+            lower = f'({batch[-1]}'
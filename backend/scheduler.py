@@ -0,0 +1,291 @@
+"""
+Interval scheduler for app checks (min-heap of deadlines, run from one thread)
+"""
+import heapq
+import itertools
+import logging
+import os
+import random
+import threading
+import time
+import zlib
+
+logger = logging.getLogger(__name__)
+
+
+class Job:
+    """A function run every `interval` seconds"""
+    
+    def __init__(self, key, interval, func, due, next_run):
+        self.key = key
+        self.interval = interval
+        self.func = func
+        self.due = due  # Slot on the job's cadence (time.monotonic())
+        self.next_run = next_run  # When it runs: the slot plus jitter
+        self.last_run = None
+        self._entry = None  # Current heap entry
+    
+    def __repr__(self):
+        return f'Job({self.key!r}, every {self.interval}s)'
+
+
+class Scheduler:
+    """
+    Keyed interval jobs in a min-heap ordered by next due time.
+    
+    Adding, replacing and removing a job costs O(log n): replaced and removed
+    jobs leave their heap entry behind marked as removed, and it is discarded when
+    it reaches the top (the heap is rebuilt if removed entries pile up). The
+    thread running the jobs sleeps until the earliest deadline with wait(), and
+    any change to the jobs wakes it so a new earlier deadline is not missed.
+    
+    Jobs keep their cadence: the next run is one interval after the previous
+    slot, not after the job finished. Runs missed while the process was busy
+    are skipped rather than run back to back.
+    
+    New jobs start in a slot given by a hash of their key (see phase_delay), so
+    jobs sharing an interval are spread across it instead of all firing together,
+    and each run is delayed by a random jitter of up to `jitter` times the
+    interval. The jitter does not accumulate: slots stay on the cadence.
+    """
+    
+    def __init__(self, jitter=None):
+        self.jitter = jitter if jitter is not None else float(os.getenv('SCHEDULE_JITTER', '0.01'))
+        self._heap = []  # [next run, sequence, job or None when removed]
+        self._jobs = {}
+        self._removed = 0
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._changed = False
+    
+    def __len__(self):
+        with self._condition:
+            return len(self._jobs)
+    
+    def __contains__(self, key):
+        with self._condition:
+            return key in self._jobs
+    
+    @property
+    def jobs(self):
+        """Snapshot of the scheduled jobs"""
+        with self._condition:
+            return list(self._jobs.values())
+    
+    def get(self, key):
+        """Get the job for a key, or None"""
+        with self._condition:
+            return self._jobs.get(key)
+    
+    def _push(self, job):
+        """Add a heap entry for a job at its next_run (lock held)"""
+        entry = [job.next_run, next(self._sequence), job]
+        job._entry = entry
+        heapq.heappush(self._heap, entry)
+    
+    def _discard(self, job):
+        """Mark a job's heap entry as removed (lock held)"""
+        if job._entry is not None:
+            job._entry[2] = None
+            job._entry = None
+            self._removed += 1
+            # Rebuild once removed entries outnumber live ones
+            if self._removed > 64 and self._removed > len(self._jobs):
+                self._heap = [entry for entry in self._heap if entry[2] is not None]
+                heapq.heapify(self._heap)
+                self._removed = 0
+    
+    def _notify(self):
+        """Wake the thread waiting in wait() (lock held)"""
+        self._changed = True
+        self._condition.notify_all()
+    
+    @staticmethod
+    def phase_delay(key, interval, now=None):
+        """
+        Seconds until the key's next slot in an interval
+        
+        Each key has a fixed offset within the interval (from a CRC32 of the key),
+        counted from the Unix epoch, so keys spread evenly across the interval and
+        keep their slot across restarts and on every instance.
+        """
+        offset = zlib.crc32(f'phase:{key}'.encode('utf-8')) / 2 ** 32 * interval
+        return (offset - (time.time() if now is None else now)) % interval
+    
+    def _jitter(self, interval):
+        """Random delay added to a run"""
+        return random.uniform(0, self.jitter * interval) if self.jitter > 0 else 0.0
+    
+    def add(self, key, interval, func, delay=None):
+        """
+        Schedule func to run every interval seconds, replacing any job with the same key
+        
+        Args:
+            key: Job key (the app ID)
+            interval: Seconds between runs
+            func: Function called without arguments
+            delay: Seconds until the first run (defaults to the key's slot, see phase_delay)
+        
+        Returns:
+            The Job
+        """
+        with self._condition:
+            previous = self._jobs.pop(key, None)
+            if previous is not None:
+                self._discard(previous)
+            due = time.monotonic() + (self.phase_delay(key, interval) if delay is None else delay)
+            job = Job(key, interval, func, due, due + self._jitter(interval))
+            self._jobs[key] = job
+            self._push(job)
+            self._notify()
+            return job
+    
+    def update(self, key, interval, func=None):
+        """
+        Change a job's interval (and optionally its function), keeping its phase
+        
+        The next slot becomes one new interval after the previous slot, or now if
+        that moment has passed.
+        
+        Returns:
+            The Job, or None if there is no job for the key
+        """
+        with self._condition:
+            job = self._jobs.get(key)
+            if job is None:
+                return None
+            self._discard(job)
+            job.due = max(time.monotonic(), job.due - job.interval + interval)
+            job.next_run = job.due + self._jitter(interval)
+            job.interval = interval
+            if func is not None:
+                job.func = func
+            self._push(job)
+            self._notify()
+            return job
+    
+    def remove(self, key):
+        """Cancel a job; returns whether it existed"""
+        with self._condition:
+            job = self._jobs.pop(key, None)
+            if job is None:
+                return False
+            self._discard(job)
+            self._notify()
+            return True
+    
+    def clear(self):
+        """Cancel all jobs"""
+        with self._condition:
+            for job in self._jobs.values():
+                job._entry = None
+            self._jobs.clear()
+            self._heap = []
+            self._removed = 0
+            self._notify()
+    
+    def _peek(self):
+        """Earliest live heap entry, dropping removed ones on top (lock held)"""
+        while self._heap and self._heap[0][2] is None:
+            heapq.heappop(self._heap)
+            self._removed -= 1
+        return self._heap[0] if self._heap else None
+    
+    def next_run_in(self):
+        """Seconds until the earliest job is due (0 if overdue), or None without jobs"""
+        with self._condition:
+            entry = self._peek()
+            return max(0.0, entry[0] - time.monotonic()) if entry else None
+    
+    def wait(self, timeout=None):
+        """
+        Sleep until a job is due, the jobs change, wake() is called or timeout passes
+        
+        Returns:
+            True if a job is due
+        """
+        with self._condition:
+            self._changed = False
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while True:
+                now = time.monotonic()
+                entry = self._peek()
+                if entry is not None and entry[0] <= now:
+                    return True
+                if self._changed or (deadline is not None and now >= deadline):
+                    return False
+                waits = [moment - now for moment in (entry[0] if entry else None, deadline) if moment is not None]
+                self._condition.wait(min(waits) if waits else None)
+    
+    def wake(self):
+        """Interrupt wait() (e.g. to stop the scheduler thread)"""
+        with self._condition:
+            self._notify()
+    
+    def due_jobs(self, until=None):
+        """
+        Jobs due by `until` (a time.monotonic() value, default now), earliest first
+        
+        Walks only the due part of the heap.
+        """
+        now = time.monotonic() if until is None else until
+        with self._condition:
+            due = []
+            stack = [0] if self._heap else []
+            while stack:
+                index = stack.pop()
+                entry = self._heap[index]
+                if entry[0] > now:
+                    continue  # Children are due even later
+                if entry[2] is not None:
+                    due.append(entry)
+                stack.extend(child for child in (2 * index + 1, 2 * index + 2) if child < len(self._heap))
+            return [entry[2] for entry in sorted(due)]
+    
+    def run_pending(self, until=None):
+        """
+        Run every job that is due and schedule its next run
+        
+        Each job runs at most once per call: the due jobs are taken off the heap
+        and rescheduled before any of them runs, so a job whose interval is shorter
+        than the window is not run again for a slot that falls inside it.
+        
+        Args:
+            until: Also run jobs due by this time.monotonic() value (to run jobs
+                that are due shortly together with the ones due now)
+        
+        Returns:
+            Number of jobs run
+        """
+        now = time.monotonic()
+        until = now if until is None else max(now, until)
+        due = []
+        with self._condition:
+            while True:
+                entry = self._peek()
+                if entry is None or entry[0] > until:
+                    break
+                heapq.heappop(self._heap)
+                job = entry[2]
+                job._entry = None
+                due.append(job)
+            for job in due:
+                # Next slot on the job's cadence, skipping runs that were missed
+                job.due += job.interval
+                if job.due <= now:
+                    job.due += ((now - job.due) // job.interval + 1) * job.interval
+                job.next_run = job.due + self._jitter(job.interval)
+                self._push(job)
+        
+        ran = 0
+        for job in due:
+            with self._condition:
+                if self._jobs.get(job.key) is not job:
+                    continue  # Removed or replaced by an earlier job in this pass
+            job.last_run = time.time()
+            try:
+                job.func()
+            except Exception as e:
+                logger.error(f"Error running scheduled job {job.key}: {e}", exc_info=True)
+            ran += 1
+        return ran
@@ -0,0 +1,474 @@
+"""
+SQLite storage engine for app data and version tracking
+"""
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from backend.storage import StorageManager
+from backend.storage_backend import StorageBackend, DEFAULT_SETTINGS, build_app_record, build_history_entry
+from backend.history_index import encode_history_cursor, decode_history_cursor
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS apps (
+    id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS app_state (
+    app_id TEXT PRIMARY KEY,
+    current_version TEXT,
+    last_posted_version TEXT,
+    last_check TEXT,
+    storefront_versions TEXT,
+    lookup_failures TEXT,
+    content_hash TEXT
+);
+CREATE TABLE IF NOT EXISTS kv (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS history (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    event_type TEXT,
+    app_id TEXT,
+    app_name TEXT,
+    status TEXT,
+    message TEXT,
+    details TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_history_timestamp ON history (timestamp);
+CREATE INDEX IF NOT EXISTS idx_history_app_id ON history (app_id, seq);
+CREATE INDEX IF NOT EXISTS idx_history_event_type ON history (event_type, seq);
+CREATE INDEX IF NOT EXISTS idx_history_status ON history (status, seq);
+"""
+
+
+class SQLiteStorageManager(StorageBackend):
+    """Manage app data and version storage in a single SQLite database (WAL mode)"""
+    
+    DB_FILENAME = 'app_watch.db'
+    
+    def __init__(self, data_dir, db_path=None):
+        super().__init__()
+        self.data_dir = Path(data_dir)
+        self.data_dir.mkdir(parents=True, exist_ok=True)
+        self.db_path = Path(db_path) if db_path else self.data_dir / self.DB_FILENAME
+        self._local = threading.local()
+        
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+            # Databases created before all current status fields existed
+            columns = {row['name'] for row in conn.execute('PRAGMA table_info(app_state)')}
+            for column in self.STATE_FIELDS:
+                if column not in columns:
+                    conn.execute(f'ALTER TABLE app_state ADD COLUMN {column} TEXT')
+        
+        self.migrate_from_json()
+        
+        if self._get_kv('settings') is None:
+            self._save_settings(dict(DEFAULT_SETTINGS))
+        if self._get_kv('auth') is None:
+            self._save_auth(self._default_auth())
+    
+    def _connect(self):
+        """Get the SQLite connection for the current thread"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # timeout is the busy timeout: writers wait for each other instead of failing
+            conn = sqlite3.connect(str(self.db_path), timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+    
+    def _get_kv(self, key):
+        """Get a JSON value from the key/value table"""
+        row = self._connect().execute('SELECT value FROM kv WHERE key = ?', (key,)).fetchone()
+        return json.loads(row['value']) if row else None
+    
+    def _set_kv(self, key, value):
+        """Store a JSON value in the key/value table"""
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT INTO kv (key, value) VALUES (?, ?) '
+                'ON CONFLICT(key) DO UPDATE SET value = excluded.value',
+                (key, json.dumps(value))
+            )
+    
+    def migrate_from_json(self):
+        """
+        One-shot migration from the JSON file layout in the data directory.
+        
+        Imports apps.json, settings.json, auth.json, the unexpired login sessions
+        from sessions.json, the history log (or legacy history.json) and the
+        per-app status from state.json (or the legacy apps/<id>/*.txt status files).
+        The JSON files are left in place as a backup.
+        
+        Returns:
+            True if data was migrated, False if there was nothing to migrate
+        """
+        if self._get_kv('migrated_from_json') is not None:
+            return False
+        
+        apps_file = self.data_dir / 'apps.json'
+        if not apps_file.exists():
+            self._set_kv('migrated_from_json', {'migrated_at': datetime.now().isoformat(), 'apps': 0})
+            return False
+        
+        def read_json(path, default):
+            try:
+                if path.exists():
+                    with open(path, 'r') as f:
+                        return json.load(f)
+            except Exception as e:
+                logger.error(f"Error reading {path} during migration: {e}")
+            return default
+        
+        def read_history_log(history_dir):
+            entries = []
+            for path in sorted(history_dir.glob('segment-*.ndjson')):
+                with open(path, 'r') as f:
+                    for line in f:
+                        try:
+                            entries.append(json.loads(line))
+                        except json.JSONDecodeError:
+                            continue
+            return entries
+        
+        def read_text(path):
+            try:
+                if path.exists():
+                    return path.read_text().strip() or None
+            except Exception as e:
+                logger.error(f"Error reading {path} during migration: {e}")
+            return None
+        
+        apps_dict = read_json(apps_file, {})
+        state = read_json(self.data_dir / 'state.json', None)
+        settings = read_json(self.data_dir / 'settings.json', None)
+        auth = read_json(self.data_dir / 'auth.json', None)
+        sessions = read_json(self.data_dir / 'sessions.json', {})
+        # Oldest first, from the append-only log or the legacy newest-first history.json
+        history_dir = self.data_dir / 'history'
+        if history_dir.is_dir():
+            history = read_history_log(history_dir)
+        else:
+            history = list(reversed(read_json(self.data_dir / 'history.json', [])))
+        
+        with self._connect() as conn:
+            for app_id, app_data in apps_dict.items():
+                conn.execute(
+                    'INSERT OR REPLACE INTO apps (id, data) VALUES (?, ?)',
+                    (app_id, json.dumps(app_data))
+                )
+                if state is not None:
+                    app_state = state.get(app_id, {})
+                else:
+                    # Legacy layout without the state.json index
+                    app_dir = self.data_dir / 'apps' / app_id
+                    app_state = {
+                        field: read_text(app_dir / filename)
+                        for field, filename in StorageManager.LEGACY_STATE_FILES.items()
+                    }
+                conn.execute(
+                    f"INSERT OR REPLACE INTO app_state (app_id, {', '.join(self.STATE_FIELDS)}) "
+                    f"VALUES (?{', ?' * len(self.STATE_FIELDS)})",
+                    (app_id, *(app_state.get(field) for field in self.STATE_FIELDS))
+                )
+            
+            # Insert oldest first so seq order matches
+            for entry in history:
+                conn.execute(
+                    'INSERT INTO history (id, timestamp, event_type, app_id, app_name, status, message, details) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    (
+                        entry.get('id') or str(uuid.uuid4()),
+                        entry.get('timestamp', ''),
+                        entry.get('event_type'),
+                        entry.get('app_id'),
+                        entry.get('app_name'),
+                        entry.get('status'),
+                        entry.get('message', ''),
+                        json.dumps(entry.get('details') or {})
+                    )
+                )
+            
+            # Login sessions still valid, so nobody is logged out by the switch
+            for session_id, session in sessions.items():
+                if session.get('expires_at', 0) >= time.time():
+                    conn.execute(
+                        'INSERT OR REPLACE INTO sessions (id, data, expires_at) VALUES (?, ?, ?)',
+                        (session_id, json.dumps(session), session['expires_at'])
+                    )
+            
+            if settings is not None:
+                conn.execute('INSERT OR REPLACE INTO kv (key, value) VALUES (?, ?)', ('settings', json.dumps(settings)))
+            if auth is not None:
+                conn.execute('INSERT OR REPLACE INTO kv (key, value) VALUES (?, ?)', ('auth', json.dumps(auth)))
+            conn.execute(
+                'INSERT OR REPLACE INTO kv (key, value) VALUES (?, ?)',
+                ('migrated_from_json', json.dumps({
+                    'migrated_at': datetime.now().isoformat(),
+                    'apps': len(apps_dict),
+                    'history': len(history)
+                }))
+            )
+        
+        logger.info(f"Migrated {len(apps_dict)} apps and {len(history)} history entries from JSON storage to SQLite")
+        return True
+    
+    # Settings and auth primitives (every change is its own cheap WAL commit, nothing is buffered)
+    def _settings_source_token(self):
+        """Raw stored settings value - changes when another process saves settings"""
+        row = self._connect().execute("SELECT value FROM kv WHERE key = 'settings'").fetchone()
+        return row['value'] if row else None
+    
+    def _load_settings(self):
+        """Load settings from the database"""
+        try:
+            return self._get_kv('settings') or {}
+        except Exception as e:
+            logger.error(f"Error loading settings: {e}")
+            return {}
+    
+    def _save_settings(self, settings_dict):
+        """Save settings to the database"""
+        try:
+            self._set_kv('settings', settings_dict)
+        except Exception as e:
+            logger.error(f"Error saving settings: {e}")
+            raise
+    
+    def _load_auth(self):
+        """Load authentication settings from the database"""
+        try:
+            return self._get_kv('auth') or {}
+        except Exception as e:
+            logger.error(f"Error loading auth: {e}")
+            return {}
+    
+    def _save_auth(self, auth_dict):
+        """Save authentication settings to the database"""
+        try:
+            self._set_kv('auth', auth_dict)
+        except Exception as e:
+            logger.error(f"Error saving auth: {e}")
+            raise
+    
+    # Login sessions
+    def get_session(self, session_id):
+        """Get a login session, or None if missing or expired"""
+        row = self._connect().execute(
+            'SELECT data FROM sessions WHERE id = ? AND expires_at >= ?', (session_id, time.time())
+        ).fetchone()
+        return json.loads(row['data']) if row else None
+    
+    def save_session(self, session_id, session):
+        """Store a login session (expired sessions are dropped at the same time)"""
+        with self._connect() as conn:
+            conn.execute('DELETE FROM sessions WHERE expires_at < ?', (time.time(),))
+            conn.execute(
+                'INSERT OR REPLACE INTO sessions (id, data, expires_at) VALUES (?, ?, ?)',
+                (session_id, json.dumps(session), session['expires_at'])
+            )
+    
+    def delete_session(self, session_id):
+        """Delete a login session"""
+        with self._connect() as conn:
+            conn.execute('DELETE FROM sessions WHERE id = ?', (session_id,))
+    
+    # Apps
+    def _row_to_app(self, row):
+        """Convert an apps/app_state row to an app dict"""
+        return {
+            'id': row['id'],
+            **json.loads(row['data']),
+            'current_version': row['current_version'],
+            'last_posted_version': row['last_posted_version'],
+            'last_check': row['last_check'],
+            'storefront_versions': self._decode_json_state(row['storefront_versions']),
+            'lookup_failures': self._decode_json_state(row['lookup_failures'])
+        }
+    
+    def get_all_apps(self):
+        """Get all apps as a list"""
+        rows = self._connect().execute(
+            'SELECT apps.id, apps.data, s.current_version, s.last_posted_version, s.last_check, s.storefront_versions, s.lookup_failures '
+            'FROM apps LEFT JOIN app_state s ON s.app_id = apps.id ORDER BY apps.rowid'
+        ).fetchall()
+        return [self._row_to_app(row) for row in rows]
+    
+    def get_app(self, app_id):
+        """Get a specific app"""
+        row = self._connect().execute(
+            'SELECT apps.id, apps.data, s.current_version, s.last_posted_version, s.last_check, s.storefront_versions, s.lookup_failures '
+            'FROM apps LEFT JOIN app_state s ON s.app_id = apps.id WHERE apps.id = ?',
+            (app_id,)
+        ).fetchone()
+        return self._row_to_app(row) if row else None
+    
+    def save_app(self, app_data):
+        """Save or update an app"""
+        conn = self._connect()
+        with conn:
+            app_id = app_data.get('id')
+            exists = app_id and conn.execute('SELECT 1 FROM apps WHERE id = ?', (app_id,)).fetchone()
+            
+            # Generate ID if new
+            if not exists:
+                app_id = str(uuid.uuid4())
+            
+            conn.execute(
+                'INSERT INTO apps (id, data) VALUES (?, ?) '
+                'ON CONFLICT(id) DO UPDATE SET data = excluded.data',
+                (app_id, json.dumps(build_app_record(app_data)))
+            )
+        
+        return app_id
+    
+    def save_apps(self, apps_data):
+        """Save or update many apps in a single transaction"""
+        app_ids = []
+        rows = []
+        conn = self._connect()
+        with conn:
+            existing = {row['id'] for row in conn.execute('SELECT id FROM apps')}
+            for app_data in apps_data:
+                app_id = app_data.get('id')
+                if app_id not in existing:
+                    app_id = str(uuid.uuid4())
+                rows.append((app_id, json.dumps(build_app_record(app_data))))
+                app_ids.append(app_id)
+            
+            conn.executemany(
+                'INSERT INTO apps (id, data) VALUES (?, ?) '
+                'ON CONFLICT(id) DO UPDATE SET data = excluded.data',
+                rows
+            )
+        
+        return app_ids
+    
+    def delete_app(self, app_id):
+        """Delete an app"""
+        with self._connect() as conn:
+            deleted = conn.execute('DELETE FROM apps WHERE id = ?', (app_id,)).rowcount
+            conn.execute('DELETE FROM app_state WHERE app_id = ?', (app_id,))
+        return deleted > 0
+    
+    # Per-app status
+    def _get_state(self, app_id, column):
+        """Get a status column for an app"""
+        row = self._connect().execute(
+            f'SELECT {column} FROM app_state WHERE app_id = ?', (app_id,)
+        ).fetchone()
+        return row[column] if row else None
+    
+    def _set_state(self, app_id, column, value):
+        """Set a status column for an app"""
+        with self._connect() as conn:
+            conn.execute(
+                f'INSERT INTO app_state (app_id, {column}) VALUES (?, ?) '
+                f'ON CONFLICT(app_id) DO UPDATE SET {column} = excluded.{column}',
+                (app_id, value)
+            )
+    
+    # History/Activity log methods
+    def _row_to_history_entry(self, row):
+        """Convert a history row to an entry dict"""
+        return {
+            'id': row['id'],
+            'timestamp': row['timestamp'],
+            'event_type': row['event_type'],
+            'app_id': row['app_id'],
+            'app_name': row['app_name'],
+            'status': row['status'],
+            'message': row['message'],
+            'details': json.loads(row['details']) if row['details'] else {}
+        }
+    
+    def add_history_entry(self, event_type, app_id=None, app_name=None, status='info', message='', details=None):
+        """Add an entry to the activity history"""
+        entry = build_history_entry(event_type, app_id, app_name, status, message, details)
+        
+        with self._connect() as conn:
+            cursor = conn.execute(
+                'INSERT INTO history (id, timestamp, event_type, app_id, app_name, status, message, details) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (
+                    entry['id'], entry['timestamp'], event_type, app_id, app_name,
+                    status, message, json.dumps(entry['details'])
+                )
+            )
+            # Keep the same retention as the JSON engine
+            conn.execute('DELETE FROM history WHERE seq <= ?', (cursor.lastrowid - self.HISTORY_MAX_ENTRIES,))
+        
+        return entry
+    
+    def get_history_page(self, limit=100, cursor=None, event_type=None, app_id=None, status=None, start_date=None, end_date=None):
+        """
+        Get one page of activity history (keyset pagination on seq)
+        
+        Returns:
+            (entries, next_cursor) - next_cursor is None when there are no more pages
+        
+        Raises:
+            ValueError: If the cursor is invalid
+        """
+        clauses = []
+        params = []
+        if cursor:
+            clauses.append('seq < ?')
+            params.append(decode_history_cursor(cursor))
+        if event_type:
+            clauses.append('event_type = ?')
+            params.append(event_type)
+        if app_id:
+            clauses.append('app_id = ?')
+            params.append(app_id)
+        if status:
+            clauses.append('status = ?')
+            params.append(status)
+        if start_date:
+            clauses.append('timestamp >= ?')
+            params.append(start_date)
+        if end_date:
+            clauses.append('timestamp <= ?')
+            params.append(end_date)
+        
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        # One row beyond the page tells whether there is a next page
+        rows = self._connect().execute(
+            f'SELECT * FROM history {where} ORDER BY seq DESC LIMIT ?',
+            (*params, limit + 1)
+        ).fetchall()
+        next_cursor = encode_history_cursor(rows[limit - 1]['seq']) if len(rows) > limit else None
+        return [self._row_to_history_entry(row) for row in rows[:limit]], next_cursor
+    
+    def clear_history(self, older_than_days=None):
+        """
+        Clear history entries
+        
+        Args:
+            older_than_days: If provided, only clear entries older than this many days
+        """
+        with self._connect() as conn:
+            if older_than_days:
+                cutoff_date = (datetime.now() - timedelta(days=older_than_days)).isoformat()
+                conn.execute('DELETE FROM history WHERE timestamp < ?', (cutoff_date,))
+            else:
+                conn.execute('DELETE FROM history')
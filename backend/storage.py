@@ -3,77 +3,146 @@ Storage management for app data and version tracking
 """
 import json
 import logging
-import hashlib
-import base64
-import secrets
+import os
+import threading
+import time
 from pathlib import Path
 from datetime import datetime
 import uuid
 
+from backend.history_index import HistoryIndex, encode_history_cursor, decode_history_cursor
+from backend.storage_backend import StorageBackend, DEFAULT_SETTINGS, build_app_record, build_history_entry
+
 logger = logging.getLogger(__name__)
 
 
-class StorageManager:
-    """Manage app data and version storage"""
+def create_storage_manager(data_dir, engine=None):
+    """
+    Create the storage manager for the configured storage engine
+    
+    Args:
+        data_dir: Directory holding the application data (json and sqlite engines)
+        engine: 'json', 'sqlite' or 'redis' (defaults to the STORAGE_ENGINE environment variable)
+    """
+    engine = (engine or os.getenv('STORAGE_ENGINE', 'json')).lower().strip()
+    if engine == 'sqlite':
+        from backend.sqlite_storage import SQLiteStorageManager
+        return SQLiteStorageManager(data_dir)
+    if engine == 'redis':
+        from backend.redis_storage import RedisStorageManager
+        return RedisStorageManager(os.getenv('REDIS_URL', 'redis://localhost:6379/0'))
+    if engine != 'json':
+        raise ValueError(f"Unknown storage engine: {engine}. Use 'json', 'sqlite' or 'redis'")
+    return StorageManager(data_dir)
+
+
+def atomic_write_json(path, data, **dump_kwargs):
+    """
+    Write JSON to a file atomically and durably.
+    
+    The data is written to a temporary file in the same directory, fsynced and
+    renamed over the target, so readers and crashes only ever see the old or the
+    new complete file.
+    """
+    path = Path(path)
+    tmp_path = path.with_name(f'.{path.name}.{uuid.uuid4().hex}.tmp')
+    try:
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, **dump_kwargs)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            tmp_path.unlink()
+        except FileNotFoundError:
+            pass
+        raise
+    
+    # Persist the rename itself (not supported on all platforms)
+    try:
+        dir_fd = os.open(path.parent, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(dir_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(dir_fd)
+
+
+class StorageManager(StorageBackend):
+    """Manage app data and version storage in JSON files in the data directory"""
+    
+    # Legacy per-app status files (apps/<id>/<file>) migrated into state.json
+    LEGACY_STATE_FILES = {
+        'current_version': 'current_version.txt',
+        'last_posted_version': 'version.txt',
+        'last_check': 'check.txt'
+    }
+    
+    # History log: entries per segment (whole segments are dropped beyond HISTORY_MAX_ENTRIES)
+    HISTORY_SEGMENT_SIZE = 250
+    
+    # Write-behind: apps, per-app status and history changes are kept in memory and
+    # flushed together this many seconds after the first change (0 = write immediately)
+    WRITE_BEHIND_DELAY = float(os.getenv('WRITE_BEHIND_DELAY', '0.5'))
     
     def __init__(self, data_dir):
+        super().__init__()
         self.data_dir = Path(data_dir)
         self.data_dir.mkdir(parents=True, exist_ok=True)
         
         self.apps_file = self.data_dir / 'apps.json'
         self.settings_file = self.data_dir / 'settings.json'
         self.auth_file = self.data_dir / 'auth.json'
-        self.history_file = self.data_dir / 'history.json'
+        self.history_file = self.data_dir / 'history.json'  # Legacy, migrated to history/
+        self.history_dir = self.data_dir / 'history'
+        self.state_file = self.data_dir / 'state.json'
+        self.sessions_file = self.data_dir / 'sessions.json'
+        
+        # One lock per resource so unrelated writes don't serialize on each other
+        self._apps_lock = threading.RLock()
+        self._state_lock = threading.RLock()
+        self._history_lock = threading.RLock()
+        self._sessions_lock = threading.Lock()
+        
+        # Write-behind buffer: dirty resources and history lines not yet on disk
+        # (lock order: _flush_lock, then _history_lock, then _write_behind_lock)
+        self._write_behind_lock = threading.Lock()
+        self._flush_lock = threading.RLock()
+        self._flush_timer = None
+        self._dirty = set()
+        self._pending_history = []  # (segment, line)
+        
         self._ensure_apps_file()
         self._ensure_settings_file()
         self._ensure_auth_file()
-        self._ensure_history_file()
+        self._init_history()
+        
+        # All apps, loaded once; replaced (never mutated) on every change
+        self._apps = self._read_apps_file()
+        
+        # Per-app status (current_version, last_posted_version, last_check) for all apps,
+        # loaded once and updated in place
+        self._state = self._load_state()
     
     def _ensure_apps_file(self):
         """Ensure apps.json exists"""
         if not self.apps_file.exists():
-            self._save_apps({})
+            atomic_write_json(self.apps_file, {}, indent=2)
     
     def _ensure_settings_file(self):
         """Ensure settings.json exists"""
         if not self.settings_file.exists():
-            default_settings = {
-                'default_interval': '12h',
-                'monitoring_enabled_by_default': True,
-                'auto_post_on_update': False,
-                'telegram_bot_token': '',
-                'smtp_host': '',
-                'smtp_port': '587',
-                'smtp_user': '',
-                'smtp_password': '',
-                'smtp_from': '',
-                'smtp_use_tls': True,
-                'message_format_version_header': '# v{version}',
-                'message_format_section_header': '## {section}',
-                'message_format_bullet': '- ',
-                'message_format_empty_line_between_sections': True,
-                'message_format_no_release_notes': 'No release notes available.',
-                'message_format_include_version_header': True
-            }
+            default_settings = dict(DEFAULT_SETTINGS)
             self._save_settings(default_settings)
     
     def _ensure_auth_file(self):
         """Ensure auth.json exists"""
         if not self.auth_file.exists():
-            default_auth = {
-                'enabled': False,
-                'auth_type': 'forms',  # 'basic' or 'forms'
-                'username': '',
-                'password_hash': '',
-                'bypass_local_networks': False,
-                'api_key': self._generate_api_key()
-            }
-            self._save_auth(default_auth)
-    
-    def _ensure_history_file(self):
-        """Ensure history.json exists"""
-        if not self.history_file.exists():
-            self._save_history([])
+            self._save_auth(self._default_auth())
     
     def _load_settings(self):
         """Load settings from JSON file"""
@@ -89,43 +158,21 @@ class StorageManager:
     def _save_settings(self, settings_dict):
         """Save settings to JSON file"""
         try:
-            with open(self.settings_file, 'w') as f:
-                json.dump(settings_dict, f, indent=2)
+            with self._settings_lock:
+                atomic_write_json(self.settings_file, settings_dict, indent=2)
         except Exception as e:
             logger.error(f"Error saving settings: {e}")
             raise
     
-    def get_settings(self):
-        """Get all settings with defaults"""
-        settings = self._load_settings()
-        # Ensure defaults are always present
-        defaults = {
-            'default_interval': '12h',
-            'monitoring_enabled_by_default': True,
-            'auto_post_on_update': False,
-            'telegram_bot_token': '',
-            'smtp_host': '',
-            'smtp_port': '587',
-            'smtp_user': '',
-            'smtp_password': '',
-            'smtp_from': '',
-            'smtp_use_tls': True,
-            'message_format_version_header': '# v{version}',
-            'message_format_section_header': '## {section}',
-            'message_format_bullet': '- ',
-            'message_format_empty_line_between_sections': True,
-            'message_format_no_release_notes': 'No release notes available.',
-            'message_format_include_version_header': True
-        }
-        # Merge defaults with loaded settings (loaded settings take precedence)
-        return {**defaults, **settings}
-    
-    def save_settings(self, settings_data):
-        """Save settings"""
-        self._save_settings(settings_data)
-        return True
+    def _settings_source_token(self):
+        """Cheap token that changes when the stored settings change (file mtime and size)"""
+        try:
+            stat = self.settings_file.stat()
+            return (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            return None
     
-    def _load_apps(self):
+    def _read_apps_file(self):
         """Load apps from JSON file"""
         try:
             if self.apps_file.exists():
@@ -136,34 +183,41 @@ class StorageManager:
             logger.error(f"Error loading apps: {e}")
             return {}
     
+    def _load_apps(self):
+        """Get the in-memory apps snapshot (copy it before changing it)"""
+        return self._apps
+    
     def _save_apps(self, apps_dict):
+        """Replace the apps snapshot and schedule it to be written"""
+        with self._apps_lock:
+            self._apps = apps_dict
+        self._mark_dirty('apps')
+    
+    def _write_apps(self):
         """Save apps to JSON file"""
         try:
-            with open(self.apps_file, 'w') as f:
-                json.dump(apps_dict, f, indent=2)
+            atomic_write_json(self.apps_file, self._apps, indent=2)
         except Exception as e:
             logger.error(f"Error saving apps: {e}")
             raise
     
+    def _app_with_state(self, app_id, app_data):
+        """Combine a stored app record with its status information"""
+        state = self._state.get(app_id, {})
+        return {
+            'id': app_id,
+            **app_data,
+            'current_version': state.get('current_version'),
+            'last_posted_version': state.get('last_posted_version'),
+            'last_check': state.get('last_check'),
+            'storefront_versions': self._decode_json_state(state.get('storefront_versions')),
+            'lookup_failures': self._decode_json_state(state.get('lookup_failures'))
+        }
+    
     def get_all_apps(self):
         """Get all apps as a list"""
         apps_dict = self._load_apps()
-        apps = []
-        
-        for app_id, app_data in apps_dict.items():
-            app = {
-                'id': app_id,
-                **app_data
-            }
-            
-            # Add status information
-            app['current_version'] = self.get_current_version(app_id)
-            app['last_posted_version'] = self.get_last_version(app_id)
-            app['last_check'] = self.get_last_check(app_id)
-            
-            apps.append(app)
-        
-        return apps
+        return [self._app_with_state(app_id, app_data) for app_id, app_data in apps_dict.items()]
     
     def get_app(self, app_id):
         """Get a specific app"""
@@ -172,169 +226,198 @@ class StorageManager:
         if app_id not in apps_dict:
             return None
         
-        app_data = apps_dict[app_id]
-        app = {
-            'id': app_id,
-            **app_data
-        }
-        
-        # Add status information
-        app['current_version'] = self.get_current_version(app_id)
-        app['last_posted_version'] = self.get_last_version(app_id)
-        app['last_check'] = self.get_last_check(app_id)
-        
-        return app
+        return self._app_with_state(app_id, apps_dict[app_id])
     
     def save_app(self, app_data):
         """Save or update an app"""
-        apps_dict = self._load_apps()
+        with self._apps_lock:
+            apps_dict = dict(self._load_apps())
+            
+            # Generate ID if new
+            if 'id' not in app_data or app_data['id'] not in apps_dict:
+                app_id = str(uuid.uuid4())
+            else:
+                app_id = app_data['id']
+            
+            apps_dict[app_id] = build_app_record(app_data)
+            self._save_apps(apps_dict)
         
-        # Generate ID if new
-        if 'id' not in app_data or app_data['id'] not in apps_dict:
-            app_id = str(uuid.uuid4())
-        else:
-            app_id = app_data['id']
-        
-        # Remove status fields before saving
-        save_data = {
-            'name': app_data['name'],
-            'app_store_id': app_data['app_store_id'],
-            'interval_override': app_data.get('interval_override'),
-            'enabled': app_data.get('enabled', True)
-        }
+        return app_id
+    
+    def save_apps(self, apps_data):
+        """
+        Save or update many apps with a single write
         
-        # Save icon URL if provided
-        if 'icon_url' in app_data:
-            save_data['icon_url'] = app_data['icon_url']
-        
-        # Handle notification destinations - support both new format and legacy webhook_url
-        if 'notification_destinations' in app_data and app_data['notification_destinations']:
-            save_data['notification_destinations'] = app_data['notification_destinations']
-        elif 'webhook_url' in app_data and app_data['webhook_url']:
-            # Legacy support - convert old webhook_url to new format
-            save_data['notification_destinations'] = [{
-                'type': 'discord',
-                'webhook_url': app_data['webhook_url']
-            }]
-        else:
-            save_data['notification_destinations'] = []
+        Args:
+            apps_data: List of app data dicts (an existing 'id' updates that app)
         
-        apps_dict[app_id] = save_data
-        self._save_apps(apps_dict)
+        Returns:
+            List of app IDs in the same order
+        """
+        app_ids = []
+        with self._apps_lock:
+            apps_dict = dict(self._load_apps())
+            
+            for app_data in apps_data:
+                app_id = app_data.get('id')
+                if app_id not in apps_dict:
+                    app_id = str(uuid.uuid4())
+                apps_dict[app_id] = build_app_record(app_data)
+                app_ids.append(app_id)
+            
+            self._save_apps(apps_dict)
         
-        return app_id
+        return app_ids
     
     def delete_app(self, app_id):
         """Delete an app"""
-        apps_dict = self._load_apps()
-        
-        if app_id not in apps_dict:
-            return False
-        
-        del apps_dict[app_id]
-        self._save_apps(apps_dict)
-        
-        # Also delete version files
-        version_file = self._get_version_file(app_id)
-        if version_file.exists():
-            version_file.unlink()
-        
-        current_version_file = self._get_current_version_file(app_id)
-        if current_version_file.exists():
-            current_version_file.unlink()
+        with self._apps_lock:
+            apps_dict = dict(self._load_apps())
+            
+            if app_id not in apps_dict:
+                return False
+            
+            del apps_dict[app_id]
+            self._save_apps(apps_dict)
         
-        # Delete check time file
-        check_file = self._get_check_file(app_id)
-        if check_file.exists():
-            check_file.unlink()
+        # Also delete status information
+        with self._state_lock:
+            removed = self._state.pop(app_id, None) is not None
+        if removed:
+            self._mark_dirty('state')
         
         return True
     
-    def _get_version_file(self, app_id):
-        """Get path to version file for an app"""
-        app_dir = self.data_dir / 'apps' / app_id
-        app_dir.mkdir(parents=True, exist_ok=True)
-        return app_dir / 'version.txt'
-    
-    def _get_check_file(self, app_id):
-        """Get path to last check time file"""
-        app_dir = self.data_dir / 'apps' / app_id
-        app_dir.mkdir(parents=True, exist_ok=True)
-        return app_dir / 'check.txt'
-    
-    def _get_current_version_file(self, app_id):
-        """Get path to current version file (last checked version from App Store)"""
-        app_dir = self.data_dir / 'apps' / app_id
-        app_dir.mkdir(parents=True, exist_ok=True)
-        return app_dir / 'current_version.txt'
-    
-    def get_last_version(self, app_id):
-        """Get last posted version for an app"""
-        version_file = self._get_version_file(app_id)
-        
-        if version_file.exists():
+    # Per-app status index
+    def _load_state(self):
+        """Load the per-app status index, migrating legacy apps/<id>/*.txt files on first run"""
+        if self.state_file.exists():
             try:
-                return version_file.read_text().strip()
+                with open(self.state_file, 'r') as f:
+                    return json.load(f)
             except Exception as e:
-                logger.error(f"Error reading version file: {e}")
-                return None
-        
-        return None
-    
-    def save_last_version(self, app_id, version):
-        """Save last posted version for an app"""
-        version_file = self._get_version_file(app_id)
-        
+                logger.error(f"Error loading app state: {e}")
+                return {}
+        
+        state = self._migrate_legacy_state()
+        self._state = state
+        self._write_state()
+        return state
+    
+    def _migrate_legacy_state(self):
+        """Read the legacy apps/<id>/{current_version,version,check}.txt status files"""
+        state = {}
+        legacy_dir = self.data_dir / 'apps'
+        if not legacy_dir.is_dir():
+            return state
+        
+        for app_dir in legacy_dir.iterdir():
+            if not app_dir.is_dir():
+                continue
+            app_state = {}
+            for field, filename in self.LEGACY_STATE_FILES.items():
+                status_file = app_dir / filename
+                try:
+                    if status_file.exists():
+                        value = status_file.read_text().strip()
+                        if value:
+                            app_state[field] = value
+                except Exception as e:
+                    logger.error(f"Error reading legacy status file {status_file}: {e}")
+            if app_state:
+                state[app_dir.name] = app_state
+        
+        if state:
+            logger.info(f"Migrated status files for {len(state)} apps to {self.state_file.name}")
+        return state
+    
+    def _write_state(self):
+        """Save the per-app status index"""
         try:
-            version_file.write_text(version)
+            with self._state_lock:
+                snapshot = {app_id: dict(app_state) for app_id, app_state in self._state.items()}
+            atomic_write_json(self.state_file, snapshot, separators=(',', ':'))
         except Exception as e:
-            logger.error(f"Error saving version: {e}")
+            logger.error(f"Error saving app state: {e}")
             raise
     
-    def get_last_check(self, app_id):
-        """Get last check time for an app"""
-        check_file = self._get_check_file(app_id)
-        
-        if check_file.exists():
-            try:
-                return check_file.read_text().strip()
-            except Exception as e:
-                logger.error(f"Error reading check file: {e}")
-                return None
-        
-        return None
-    
-    def update_last_check(self, app_id, timestamp):
-        """Update last check time for an app"""
-        check_file = self._get_check_file(app_id)
-        
+    def _get_state(self, app_id, field):
+        """Get one status field for an app"""
+        return self._state.get(app_id, {}).get(field)
+    
+    def _set_state(self, app_id, field, value):
+        """Update one status field for an app in place and schedule the index to be written"""
+        with self._state_lock:
+            self._state.setdefault(app_id, {})[field] = value
+        self._mark_dirty('state')
+    
+    # Write-behind buffer
+    def _mark_dirty(self, resource):
+        """Record a change and make sure a flush is scheduled"""
+        with self._write_behind_lock:
+            self._dirty.add(resource)
+            if self.WRITE_BEHIND_DELAY > 0 and self._flush_timer is None:
+                self._flush_timer = threading.Timer(self.WRITE_BEHIND_DELAY, self._flush_from_timer)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+        
+        if self.WRITE_BEHIND_DELAY <= 0:
+            self.flush()
+    
+    def _flush_from_timer(self):
+        """Flush on the write-behind deadline"""
         try:
-            check_file.write_text(timestamp)
+            self.flush()
         except Exception as e:
-            logger.error(f"Error saving check time: {e}")
-    
-    def get_current_version(self, app_id):
-        """Get current version (last checked from App Store)"""
-        version_file = self._get_current_version_file(app_id)
-        
-        if version_file.exists():
+            logger.error(f"Error flushing storage changes: {e}", exc_info=True)
+    
+    def _append_history_lines(self, pending):
+        """Append buffered history lines, one write per segment"""
+        # Held while writing so retention or clear_history cannot delete a
+        # segment between the check and the append (which would recreate it)
+        with self._history_lock:
+            by_segment = {}
+            for segment, line in pending:
+                # Skip segments dropped by retention since the lines were buffered
+                if segment >= self._history_first_segment:
+                    by_segment.setdefault(segment, []).append(line)
+            
+            for segment, lines in by_segment.items():
+                with open(self._segment_path(segment), 'a') as f:
+                    f.write(''.join(lines))
+                    f.flush()
+                    os.fsync(f.fileno())
+    
+    def flush(self):
+        """Write all buffered apps, status and history changes to disk in one batch"""
+        with self._flush_lock:
+            with self._write_behind_lock:
+                dirty, self._dirty = self._dirty, set()
+                pending_history, self._pending_history = self._pending_history, []
+                if self._flush_timer is not None:
+                    self._flush_timer.cancel()
+                    self._flush_timer = None
+            
+            if not dirty and not pending_history:
+                return
+            
             try:
-                return version_file.read_text().strip()
-            except Exception as e:
-                logger.error(f"Error reading current version file: {e}")
-                return None
-        
-        return None
-    
-    def save_current_version(self, app_id, version):
-        """Save current version (from App Store check)"""
-        version_file = self._get_current_version_file(app_id)
-        
-        try:
-            version_file.write_text(version)
-        except Exception as e:
-            logger.error(f"Error saving current version: {e}")
-            raise
+                if 'apps' in dirty:
+                    self._write_apps()
+                if 'state' in dirty:
+                    self._write_state()
+                if pending_history:
+                    self._append_history_lines(pending_history)
+            except Exception:
+                # Keep the changes buffered and retry on the next deadline
+                with self._write_behind_lock:
+                    self._dirty |= dirty
+                    self._pending_history[:0] = pending_history
+                    if self.WRITE_BEHIND_DELAY > 0 and self._flush_timer is None:
+                        self._flush_timer = threading.Timer(self.WRITE_BEHIND_DELAY, self._flush_from_timer)
+                        self._flush_timer.daemon = True
+                        self._flush_timer.start()
+                raise
     
     # Authentication methods
     def _load_auth(self):
@@ -351,102 +434,173 @@ class StorageManager:
     def _save_auth(self, auth_dict):
         """Save authentication settings to JSON file"""
         try:
-            with open(self.auth_file, 'w') as f:
-                json.dump(auth_dict, f, indent=2)
+            with self._auth_lock:
+                atomic_write_json(self.auth_file, auth_dict, indent=2)
         except Exception as e:
             logger.error(f"Error saving auth: {e}")
             raise
     
-    def get_auth(self):
-        """Get authentication settings"""
-        auth = self._load_auth()
-        defaults = {
-            'enabled': False,
-            'auth_type': 'forms',
-            'username': '',
-            'password_hash': '',
-            'bypass_local_networks': False,
-            'api_key': self._generate_api_key() if not auth.get('api_key') else auth.get('api_key')
-        }
-        result = {**defaults, **auth}
-        # Ensure API key exists
-        if not result.get('api_key'):
-            result['api_key'] = self._generate_api_key()
-            self._save_auth(result)
-        return result
-    
-    def save_auth(self, auth_data):
-        """Save authentication settings"""
-        # Hash password if provided
-        if 'password' in auth_data and auth_data['password']:
-            auth_data['password_hash'] = self._hash_password(auth_data['password'])
-            del auth_data['password']
-        # Don't save password_hash if it's empty
-        if 'password_hash' in auth_data and not auth_data['password_hash']:
-            del auth_data['password_hash']
-        
-        self._save_auth(auth_data)
-        return True
+    # Login sessions (sessions.json, only written on login and logout)
+    def _read_sessions(self):
+        """Load all stored login sessions"""
+        try:
+            with open(self.sessions_file, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logger.error(f"Error loading sessions: {e}")
+            return {}
     
-    def _hash_password(self, password):
-        """Hash a password using SHA256"""
-        return hashlib.sha256(password.encode('utf-8')).hexdigest()
-    
-    def verify_password(self, password):
-        """Verify a password against stored hash"""
-        auth = self.get_auth()
-        if not auth.get('password_hash'):
-            return False
-        password_hash = self._hash_password(password)
-        return password_hash == auth.get('password_hash')
-    
-    def is_auth_enabled(self):
-        """Check if authentication is enabled"""
-        auth = self.get_auth()
-        return auth.get('enabled', False)
-    
-    def is_auth_configured(self):
-        """Check if authentication is configured (has username and password)"""
-        auth = self.get_auth()
-        return bool(auth.get('username') and auth.get('password_hash'))
-    
-    def _generate_api_key(self):
-        """Generate a secure random API key"""
-        return secrets.token_urlsafe(32)
-    
-    def regenerate_api_key(self):
-        """Regenerate the API key"""
-        auth = self.get_auth()
-        auth['api_key'] = self._generate_api_key()
-        self._save_auth(auth)
-        return auth['api_key']
-    
-    def verify_api_key(self, api_key):
-        """Verify an API key"""
-        auth = self.get_auth()
-        stored_key = auth.get('api_key', '')
-        return bool(stored_key and api_key == stored_key)
+    def get_session(self, session_id):
+        """Get a login session, or None if missing or expired"""
+        session = self._read_sessions().get(session_id)
+        if session is None or session.get('expires_at', 0) < time.time():
+            return None
+        return session
+    
+    def save_session(self, session_id, session):
+        """Store a login session (expired sessions are dropped at the same time)"""
+        with self._sessions_lock:
+            now = time.time()
+            sessions = {
+                key: value for key, value in self._read_sessions().items()
+                if value.get('expires_at', 0) >= now
+            }
+            sessions[session_id] = session
+            atomic_write_json(self.sessions_file, sessions, indent=2)
+    
+    def delete_session(self, session_id):
+        """Delete a login session"""
+        with self._sessions_lock:
+            sessions = self._read_sessions()
+            if sessions.pop(session_id, None) is not None:
+                atomic_write_json(self.sessions_file, sessions, indent=2)
     
     # History/Activity log methods
-    def _load_history(self):
-        """Load history from JSON file"""
-        try:
-            if self.history_file.exists():
-                with open(self.history_file, 'r') as f:
-                    return json.load(f)
-            return []
-        except Exception as e:
-            logger.error(f"Error loading history: {e}")
-            return []
+    #
+    # History is an append-only NDJSON log split into numbered segments
+    # (history/segment-<n>.ndjson, oldest entry first). Appending never rewrites
+    # existing data; retention drops whole segments once there are too many.
+    # Entry <i> of segment <n> has sequence number n * HISTORY_SEGMENT_SIZE + i,
+    # which keys the in-memory HistoryIndex and the pagination cursors.
+    def _init_history(self):
+        """Open the history log, migrating a legacy history.json on first run"""
+        self.history_dir.mkdir(parents=True, exist_ok=True)
+        self._history_max_segments = -(-self.HISTORY_MAX_ENTRIES // self.HISTORY_SEGMENT_SIZE) + 1
+        self._history_index = HistoryIndex()
+        segments = self._history_segments()
+        
+        if not segments and self.history_file.exists():
+            self._migrate_legacy_history()
+            segments = self._history_segments()
+        
+        if segments:
+            self._history_segment = segments[-1]
+        else:
+            self._history_segment = 1
+        self._rebuild_history_index()
+    
+    def _rebuild_history_index(self):
+        """Load all retained history segments into the in-memory index"""
+        self._history_index.clear()
+        self._history_segment_count = 0
+        segments = [
+            segment for segment in self._history_segments()
+            if segment > self._history_segment - self._history_max_segments
+        ]
+        # Oldest retained segment, tracked in memory from here on because buffered
+        # history lines (write-behind) are not on disk yet
+        self._history_first_segment = segments[0] if segments else self._history_segment
+        for segment in segments:
+            entries = self._read_segment(segment)
+            for position, entry in enumerate(entries):
+                self._history_index.add(segment * self.HISTORY_SEGMENT_SIZE + position, entry)
+            if segment == self._history_segment:
+                self._history_segment_count = len(entries)
+    
+    def _segment_path(self, segment):
+        """Get path to a history segment file"""
+        return self.history_dir / f'segment-{segment:08d}.ndjson'
+    
+    def _history_segments(self):
+        """Get the numbers of all history segments, oldest first"""
+        segments = []
+        for path in self.history_dir.glob('segment-*.ndjson'):
+            try:
+                segments.append(int(path.stem.split('-', 1)[1]))
+            except ValueError:
+                continue
+        return sorted(segments)
     
-    def _save_history(self, history_list):
-        """Save history to JSON file"""
+    def _read_segment(self, segment):
+        """Read the entries of a history segment, oldest first"""
+        entries = []
         try:
-            with open(self.history_file, 'w') as f:
-                json.dump(history_list, f, indent=2)
+            with open(self._segment_path(segment), 'r') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        entries.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        # A torn final line after a crash only loses that entry
+                        logger.warning(f"Skipping unreadable history line in segment {segment}")
+        except FileNotFoundError:
+            pass
+        return entries
+    
+    def _write_segment(self, segment, entries):
+        """Write a complete history segment atomically (used for migration and clearing only)"""
+        path = self._segment_path(segment)
+        tmp_path = path.with_name(f'.{path.name}.tmp')
+        with open(tmp_path, 'w') as f:
+            for entry in entries:
+                f.write(json.dumps(entry, separators=(',', ':')) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    
+    def _migrate_legacy_history(self):
+        """Convert the legacy newest-first history.json into log segments"""
+        try:
+            with open(self.history_file, 'r') as f:
+                history = json.load(f)
         except Exception as e:
-            logger.error(f"Error saving history: {e}")
-            raise
+            logger.error(f"Error loading legacy history: {e}")
+            history = []
+        
+        oldest_first = list(reversed(history))
+        for index in range(0, len(oldest_first), self.HISTORY_SEGMENT_SIZE):
+            segment = index // self.HISTORY_SEGMENT_SIZE + 1
+            self._write_segment(segment, oldest_first[index:index + self.HISTORY_SEGMENT_SIZE])
+        
+        self.history_file.rename(self.history_file.with_name('history.json.migrated'))
+        logger.info(f"Migrated {len(history)} history entries to the append-only history log")
+    
+    def _rotate_history(self):
+        """Start a new history segment and drop the oldest segments beyond retention"""
+        self._history_segment += 1
+        self._history_segment_count = 0
+        
+        first_segment = max(self._history_first_segment, self._history_segment - self._history_max_segments + 1)
+        if first_segment == self._history_first_segment:
+            return
+        self._history_first_segment = first_segment
+        
+        # Dropped segments may still have lines waiting in the write-behind buffer
+        with self._write_behind_lock:
+            self._pending_history = [(segment, line) for segment, line in self._pending_history if segment >= first_segment]
+        for segment in self._history_segments():
+            if segment >= first_segment:
+                break
+            try:
+                self._segment_path(segment).unlink()
+            except FileNotFoundError:
+                pass
+        
+        self._history_index.drop_before(first_segment * self.HISTORY_SEGMENT_SIZE)
     
     def add_history_entry(self, event_type, app_id=None, app_name=None, status='info', message='', details=None):
         """
@@ -460,72 +614,45 @@ class StorageManager:
             message: Human-readable message
             details: Additional details (dict)
         """
-        entry = {
-            'id': str(uuid.uuid4()),
-            'timestamp': datetime.now().isoformat(),
-            'event_type': event_type,
-            'app_id': app_id,
-            'app_name': app_name,
-            'status': status,
-            'message': message,
-            'details': details or {}
-        }
-        
-        history = self._load_history()
-        history.insert(0, entry)  # Add to beginning (newest first)
+        with self._history_lock:
+            # Stamped under the lock so timestamps grow with the sequence number
+            entry = build_history_entry(event_type, app_id, app_name, status, message, details)
+            line = json.dumps(entry, separators=(',', ':')) + '\n'
+            if self._history_segment_count >= self.HISTORY_SEGMENT_SIZE:
+                self._rotate_history()
+            
+            seq = self._history_segment * self.HISTORY_SEGMENT_SIZE + self._history_segment_count
+            self._history_index.add(seq, entry)
+            self._history_segment_count += 1
+            with self._write_behind_lock:
+                self._pending_history.append((self._history_segment, line))
         
-        # Limit history to last 1000 entries to prevent file from growing too large
-        MAX_HISTORY_ENTRIES = 1000
-        if len(history) > MAX_HISTORY_ENTRIES:
-            history = history[:MAX_HISTORY_ENTRIES]
+        self._mark_dirty('history')
         
-        self._save_history(history)
         return entry
     
-    def get_history(self, limit=100, event_type=None, app_id=None, status=None, start_date=None, end_date=None):
+    def get_history_page(self, limit=100, cursor=None, event_type=None, app_id=None, status=None, start_date=None, end_date=None):
         """
-        Get activity history with optional filtering
+        Get one page of activity history using the secondary indexes
         
         Args:
             limit: Maximum number of entries to return
-            event_type: Filter by event type
-            app_id: Filter by app ID
-            status: Filter by status (success, error, warning, info)
-            start_date: Filter entries after this date (ISO format)
-            end_date: Filter entries before this date (ISO format)
+            cursor: Opaque cursor from a previous page (None for the first page)
+            event_type, app_id, status, start_date, end_date: Same filters as get_history
         
         Returns:
-            List of history entries
-        """
-        history = self._load_history()
-        
-        # Apply filters
-        filtered = []
-        for entry in history:
-            # Event type filter
-            if event_type and entry.get('event_type') != event_type:
-                continue
-            
-            # App ID filter
-            if app_id and entry.get('app_id') != app_id:
-                continue
-            
-            # Status filter
-            if status and entry.get('status') != status:
-                continue
-            
-            # Date filters
-            if start_date:
-                if entry.get('timestamp', '') < start_date:
-                    continue
-            if end_date:
-                if entry.get('timestamp', '') > end_date:
-                    continue
-            
-            filtered.append(entry)
+            (entries, next_cursor) - next_cursor is None when there are no more pages
         
-        # Apply limit
-        return filtered[:limit]
+        Raises:
+            ValueError: If the cursor is invalid
+        """
+        before = decode_history_cursor(cursor) if cursor else None
+        with self._history_lock:
+            entries, next_seq = self._history_index.query(
+                limit, before=before, event_type=event_type, app_id=app_id, status=status,
+                start_date=start_date, end_date=end_date
+            )
+        return entries, encode_history_cursor(next_seq) if next_seq is not None else None
     
     def clear_history(self, older_than_days=None):
         """
@@ -534,12 +661,28 @@ class StorageManager:
         Args:
             older_than_days: If provided, only clear entries older than this many days
         """
-        if older_than_days:
-            from datetime import timedelta
-            cutoff_date = (datetime.now() - timedelta(days=older_than_days)).isoformat()
-            history = self._load_history()
-            filtered = [e for e in history if e.get('timestamp', '') >= cutoff_date]
-            self._save_history(filtered)
-        else:
-            self._save_history([])
-
+        # Flushed under the history lock so no entry added meanwhile stays buffered
+        # for a segment that is about to be rewritten or deleted
+        with self._flush_lock, self._history_lock:
+            self.flush()
+            segments = self._history_segments()
+            
+            if older_than_days:
+                from datetime import timedelta
+                cutoff_date = (datetime.now() - timedelta(days=older_than_days)).isoformat()
+                for segment in segments:
+                    entries = self._read_segment(segment)
+                    kept = [e for e in entries if e.get('timestamp', '') >= cutoff_date]
+                    if not kept and segment != self._history_segment:
+                        self._segment_path(segment).unlink()
+                    elif len(kept) != len(entries):
+                        self._write_segment(segment, kept)
+                    else:
+                        # Segments are in time order - everything after this one is newer
+                        break
+            else:
+                for segment in segments:
+                    self._segment_path(segment).unlink()
+                self._history_segment += 1
+            
+            self._rebuild_history_index()
@@ -0,0 +1,460 @@
+"""
+Storage backend interface shared by all storage engines
+"""
+import hashlib
+import hmac
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+import uuid
+from types import MappingProxyType
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Default global settings (loaded settings take precedence)
+DEFAULT_SETTINGS = {
+    'default_interval': '12h',
+    'monitoring_enabled_by_default': True,
+    'auto_post_on_update': False,
+    'telegram_bot_token': '',
+    'smtp_host': '',
+    'smtp_port': '587',
+    'smtp_user': '',
+    'smtp_password': '',
+    'smtp_from': '',
+    'smtp_use_tls': True,
+    'message_format_version_header': '# v{version}',
+    'message_format_section_header': '## {section}',
+    'message_format_bullet': '- ',
+    'message_format_empty_line_between_sections': True,
+    'message_format_no_release_notes': 'No release notes available.',
+    'message_format_include_version_header': True
+}
+
+
+def build_app_record(app_data):
+    """Build the persisted app record from app data (status fields are stripped)"""
+    save_data = {
+        'name': app_data['name'],
+        'app_store_id': app_data['app_store_id'],
+        'interval_override': app_data.get('interval_override'),
+        'enabled': app_data.get('enabled', True)
+    }
+    
+    # Save icon URL if provided
+    if 'icon_url' in app_data:
+        save_data['icon_url'] = app_data['icon_url']
+    
+    # Storefront country codes to watch (apps without the field watch the US store)
+    if app_data.get('storefronts'):
+        save_data['storefronts'] = list(app_data['storefronts'])
+    
+    # Handle notification destinations - support both new format and legacy webhook_url
+    if 'notification_destinations' in app_data and app_data['notification_destinations']:
+        save_data['notification_destinations'] = app_data['notification_destinations']
+    elif 'webhook_url' in app_data and app_data['webhook_url']:
+        # Legacy support - convert old webhook_url to new format
+        save_data['notification_destinations'] = [{
+            'type': 'discord',
+            'webhook_url': app_data['webhook_url']
+        }]
+    else:
+        save_data['notification_destinations'] = []
+    
+    return save_data
+
+
+def build_history_entry(event_type, app_id=None, app_name=None, status='info', message='', details=None):
+    """Build a new activity history entry"""
+    return {
+        'id': str(uuid.uuid4()),
+        'timestamp': datetime.now().isoformat(),
+        'event_type': event_type,
+        'app_id': app_id,
+        'app_name': app_name,
+        'status': status,
+        'message': message,
+        'details': details or {}
+    }
+
+
+class StorageBackend:
+    """
+    Base class for storage engines (apps, per-app status, settings, auth and history).
+    
+    Engines implement the storage primitives below; the settings snapshot, auth
+    caching, password and API key handling and the per-app status accessors are
+    shared by all engines.
+    """
+    
+    # Per-app status fields (current version in the App Store, last notified version, last check,
+    # the version last seen in each storefront and consecutive lookup failures, both as JSON text)
+    APP_STATE_FIELDS = ('current_version', 'last_posted_version', 'last_check', 'storefront_versions', 'lookup_failures')
+    
+    # All persisted status fields, including internal ones not returned with the app
+    # (hash of the lookup fields last processed by a check)
+    STATE_FIELDS = APP_STATE_FIELDS + ('content_hash',)
+    
+    # History entries retained
+    HISTORY_MAX_ENTRIES = int(os.getenv('HISTORY_MAX_ENTRIES', '10000'))
+    
+    # Minimum seconds between checks for settings changed outside this process
+    SETTINGS_RECHECK_INTERVAL = 1.0
+    
+    def __init__(self):
+        self._settings_lock = threading.RLock()
+        self._auth_lock = threading.RLock()
+        
+        # Immutable settings snapshot, bumped to a new revision whenever it changes
+        self._settings = None
+        self._settings_revision = 0
+        self._settings_source = None
+        self._settings_checked_at = 0.0
+        
+        # Cached auth configuration, dropped whenever it is saved
+        self._auth_cache = None
+    
+    def _default_auth(self):
+        """Initial authentication settings (disabled, with a fresh API key)"""
+        return {
+            'enabled': False,
+            'auth_type': 'forms',  # 'basic' or 'forms'
+            'username': '',
+            'password_hash': '',
+            'bypass_local_networks': False,
+            'api_key': self._generate_api_key()
+        }
+    
+    # Storage primitives implemented by each engine
+    def _load_settings(self):
+        """Load the stored settings dict"""
+        raise NotImplementedError
+    
+    def _save_settings(self, settings_dict):
+        """Store the settings dict"""
+        raise NotImplementedError
+    
+    def _settings_source_token(self):
+        """Cheap token that changes when the stored settings change"""
+        raise NotImplementedError
+    
+    def _load_auth(self):
+        """Load the stored authentication settings dict"""
+        raise NotImplementedError
+    
+    def _save_auth(self, auth_dict):
+        """Store the authentication settings dict"""
+        raise NotImplementedError
+    
+    def _get_state(self, app_id, field):
+        """Get one status field for an app"""
+        raise NotImplementedError
+    
+    def _set_state(self, app_id, field, value):
+        """Set one status field for an app"""
+        raise NotImplementedError
+    
+    def get_all_apps(self):
+        """Get all apps as a list (including status fields)"""
+        raise NotImplementedError
+    
+    def get_app(self, app_id):
+        """Get a specific app (including status fields) or None"""
+        raise NotImplementedError
+    
+    def save_app(self, app_data):
+        """Save or update an app and return its ID"""
+        raise NotImplementedError
+    
+    def delete_app(self, app_id):
+        """Delete an app and its status; returns False if it did not exist"""
+        raise NotImplementedError
+    
+    def add_history_entry(self, event_type, app_id=None, app_name=None, status='info', message='', details=None):
+        """Add an entry to the activity history and return it"""
+        raise NotImplementedError
+    
+    def get_history_page(self, limit=100, cursor=None, event_type=None, app_id=None, status=None, start_date=None, end_date=None):
+        """
+        Get one page of activity history, newest first
+        
+        Returns:
+            (entries, next_cursor) - next_cursor is None when there are no more pages
+        
+        Raises:
+            ValueError: If the cursor is invalid
+        """
+        raise NotImplementedError
+    
+    def clear_history(self, older_than_days=None):
+        """Clear all history entries, or only those older than this many days"""
+        raise NotImplementedError
+    
+    def get_session(self, session_id):
+        """Get a login session (dict with username, password_hash and expires_at), or None if missing or expired"""
+        raise NotImplementedError
+    
+    def save_session(self, session_id, session):
+        """Store a login session until its expires_at (Unix time)"""
+        raise NotImplementedError
+    
+    def delete_session(self, session_id):
+        """Delete a login session"""
+        raise NotImplementedError
+    
+    # Optional hooks with defaults for single-instance engines
+    def save_apps(self, apps_data):
+        """Save or update many apps; returns their IDs in the same order"""
+        return [self.save_app(app_data) for app_data in apps_data]
+    
+    def flush(self):
+        """Write any buffered changes (engines without buffering do nothing)"""
+    
+    def _auth_changed_elsewhere(self):
+        """Whether another instance changed the stored auth settings since they were cached"""
+        return False
+    
+    def get_apps_revision(self):
+        """
+        Token that changes whenever any instance changes the apps, or None if the
+        storage is not shared (this process makes every change itself)
+        """
+        return None
+    
+    # Settings
+    def _set_settings_snapshot(self, settings):
+        """Install a new settings snapshot, bumping the revision if it differs"""
+        # Merge defaults with loaded settings (loaded settings take precedence)
+        merged = {**DEFAULT_SETTINGS, **settings}
+        if self._settings is None or dict(self._settings) != merged:
+            self._settings = MappingProxyType(merged)
+            self._settings_revision += 1
+    
+    def _refresh_settings(self):
+        """Reload settings only if they were never loaded or changed in storage"""
+        with self._settings_lock:
+            now = time.monotonic()
+            if self._settings is not None and now - self._settings_checked_at < self.SETTINGS_RECHECK_INTERVAL:
+                return
+            self._settings_checked_at = now
+            
+            token = self._settings_source_token()
+            if self._settings is None or token != self._settings_source:
+                self._settings_source = token
+                self._set_settings_snapshot(self._load_settings())
+    
+    def get_settings_snapshot(self):
+        """
+        Get the current settings snapshot
+        
+        Returns:
+            (revision, settings) - settings is a read-only mapping; the revision
+            increases monotonically whenever the settings change
+        """
+        self._refresh_settings()
+        with self._settings_lock:
+            return self._settings_revision, self._settings
+    
+    def get_settings_revision(self):
+        """Get the revision number of the current settings"""
+        return self.get_settings_snapshot()[0]
+    
+    def get_settings(self):
+        """Get all settings with defaults (a copy that may be modified)"""
+        return dict(self.get_settings_snapshot()[1])
+    
+    def save_settings(self, settings_data):
+        """Save settings"""
+        with self._settings_lock:
+            self._save_settings(settings_data)
+            self._settings_source = self._settings_source_token()
+            self._settings_checked_at = time.monotonic()
+            self._set_settings_snapshot(settings_data)
+        return True
+    
+    # Per-app status
+    def get_last_version(self, app_id):
+        """Get last posted version for an app"""
+        return self._get_state(app_id, 'last_posted_version')
+    
+    def save_last_version(self, app_id, version):
+        """Save last posted version for an app"""
+        try:
+            self._set_state(app_id, 'last_posted_version', version)
+        except Exception as e:
+            logger.error(f"Error saving version: {e}")
+            raise
+    
+    def get_last_check(self, app_id):
+        """Get last check time for an app"""
+        return self._get_state(app_id, 'last_check')
+    
+    def update_last_check(self, app_id, timestamp):
+        """Update last check time for an app"""
+        try:
+            self._set_state(app_id, 'last_check', timestamp)
+        except Exception as e:
+            logger.error(f"Error saving check time: {e}")
+    
+    def get_current_version(self, app_id):
+        """Get current version (last checked from App Store)"""
+        return self._get_state(app_id, 'current_version')
+    
+    def save_current_version(self, app_id, version):
+        """Save current version (from App Store check)"""
+        try:
+            self._set_state(app_id, 'current_version', version)
+        except Exception as e:
+            logger.error(f"Error saving current version: {e}")
+            raise
+    
+    def get_content_hash(self, app_id):
+        """Get the hash of the App Store data last processed by a check"""
+        return self._get_state(app_id, 'content_hash')
+    
+    def save_content_hash(self, app_id, content_hash):
+        """Save the hash of the App Store data processed by a check"""
+        try:
+            self._set_state(app_id, 'content_hash', content_hash)
+        except Exception as e:
+            logger.error(f"Error saving content hash: {e}")
+            raise
+    
+    def get_storefront_versions(self, app_id):
+        """Get the version last seen in each storefront: {country: version}"""
+        return self._decode_json_state(self._get_state(app_id, 'storefront_versions'))
+    
+    def save_storefront_versions(self, app_id, versions):
+        """Save the version last seen in each storefront"""
+        try:
+            self._set_state(app_id, 'storefront_versions', json.dumps(versions, sort_keys=True) if versions else None)
+        except Exception as e:
+            logger.error(f"Error saving storefront versions: {e}")
+            raise
+    
+    def get_lookup_failures(self, app_id):
+        """Get the app's consecutive lookup failures (count, backoff and parking; {} when healthy)"""
+        return self._decode_json_state(self._get_state(app_id, 'lookup_failures'))
+    
+    def save_lookup_failures(self, app_id, failures):
+        """Save the app's consecutive lookup failures (empty or None clears them)"""
+        try:
+            self._set_state(app_id, 'lookup_failures', json.dumps(failures, sort_keys=True) if failures else None)
+        except Exception as e:
+            logger.error(f"Error saving lookup failures: {e}")
+            raise
+    
+    @staticmethod
+    def _decode_json_state(value):
+        """Decode a status field stored as JSON text (storefront_versions, lookup_failures) into a dict"""
+        if not value:
+            return {}
+        try:
+            versions = json.loads(value)
+        except (TypeError, ValueError):
+            return {}
+        return versions if isinstance(versions, dict) else {}
+    
+    # Authentication methods
+    def get_auth(self):
+        """Get authentication settings (served from memory after the first load)"""
+        with self._auth_lock:
+            if self._auth_cache is None or self._auth_changed_elsewhere():
+                auth = self._load_auth()
+                defaults = {
+                    'enabled': False,
+                    'auth_type': 'forms',
+                    'username': '',
+                    'password_hash': '',
+                    'bypass_local_networks': False,
+                    'api_key': self._generate_api_key() if not auth.get('api_key') else auth.get('api_key')
+                }
+                result = {**defaults, **auth}
+                # Ensure API key exists
+                if not result.get('api_key'):
+                    result['api_key'] = self._generate_api_key()
+                    self._save_auth(result)
+                self._auth_cache = MappingProxyType(result)
+            return dict(self._auth_cache)
+    
+    def save_auth(self, auth_data):
+        """Save authentication settings"""
+        # Hash password if provided
+        if 'password' in auth_data and auth_data['password']:
+            auth_data['password_hash'] = self._hash_password(auth_data['password'])
+            del auth_data['password']
+        # Don't save password_hash if it's empty
+        if 'password_hash' in auth_data and not auth_data['password_hash']:
+            del auth_data['password_hash']
+        
+        with self._auth_lock:
+            self._save_auth(auth_data)
+            self._auth_cache = None
+        return True
+    
+    def _hash_password(self, password):
+        """Hash a password using SHA256"""
+        return hashlib.sha256(password.encode('utf-8')).hexdigest()
+    
+    def verify_password(self, password):
+        """Verify a password against stored hash"""
+        auth = self.get_auth()
+        if not auth.get('password_hash'):
+            return False
+        password_hash = self._hash_password(password)
+        return hmac.compare_digest(password_hash, auth.get('password_hash'))
+    
+    def is_auth_enabled(self):
+        """Check if authentication is enabled"""
+        auth = self.get_auth()
+        return auth.get('enabled', False)
+    
+    def is_auth_configured(self):
+        """Check if authentication is configured (has username and password)"""
+        auth = self.get_auth()
+        return bool(auth.get('username') and auth.get('password_hash'))
+    
+    def _generate_api_key(self):
+        """Generate a secure random API key"""
+        return secrets.token_urlsafe(32)
+    
+    def regenerate_api_key(self):
+        """Regenerate the API key"""
+        with self._auth_lock:
+            auth = self.get_auth()
+            auth['api_key'] = self._generate_api_key()
+            self._save_auth(auth)
+            self._auth_cache = None
+        return auth['api_key']
+    
+    def verify_api_key(self, api_key):
+        """Verify an API key"""
+        auth = self.get_auth()
+        stored_key = auth.get('api_key', '')
+        return bool(stored_key and api_key and hmac.compare_digest(api_key.encode('utf-8'), stored_key.encode('utf-8')))
+    
+    # History
+    def get_history(self, limit=100, event_type=None, app_id=None, status=None, start_date=None, end_date=None):
+        """
+        Get activity history with optional filtering
+        
+        Args:
+            limit: Maximum number of entries to return
+            event_type: Filter by event type
+            app_id: Filter by app ID
+            status: Filter by status (success, error, warning, info)
+            start_date: Filter entries after this date (ISO format)
+            end_date: Filter entries before this date (ISO format)
+        
+        Returns:
+            List of history entries (newest first)
+        """
+        entries, _ = self.get_history_page(
+            limit=limit, event_type=event_type, app_id=app_id, status=status,
+            start_date=start_date, end_date=end_date
+        )
+        return entries
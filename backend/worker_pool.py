@@ -0,0 +1,168 @@
+"""
+Bounded worker pool for scheduled checks
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerPool:
+    """
+    Run keyed tasks (one per app) on a fixed number of worker threads.
+    
+    At most max_workers tasks are in flight; more are queued in submission order.
+    A key that is queued or running is not accepted again until its task has
+    returned, and work done outside the pool (manual checks) reserves its key
+    with try_acquire(), so the same app is never checked twice at once. Tasks running
+    longer than the timeout are reported once through on_timeout (threads cannot
+    be interrupted, so the worker stays busy and the key reserved until the task
+    returns; the blocking calls in a check all have their own timeouts).
+    """
+    
+    def __init__(self, max_workers=None, timeout=None, on_timeout=None):
+        self.max_workers = max_workers or int(os.getenv('CHECK_CONCURRENCY', '8'))
+        self.timeout = timeout or float(os.getenv('CHECK_TIMEOUT', '300'))
+        self.on_timeout = on_timeout
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='check-worker')
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)  # notified whenever a task or reservation ends
+        self._pending = {}  # key -> monotonic start time while running, None while queued
+        self._reserved = set()  # keys held by try_acquire()
+        self._timed_out = set()
+        
+        self.completed = 0
+        self.failed = 0
+        self.skipped_busy = 0
+        self.timeouts = 0
+    
+    def submit(self, key, func):
+        """
+        Queue func for a key unless a task for that key is queued or running
+        
+        Returns:
+            True if the task was queued
+        """
+        self.reap()
+        with self._lock:
+            if key in self._pending or key in self._reserved:
+                self.skipped_busy += 1
+                return False
+            self._pending[key] = None
+        try:
+            self._executor.submit(self._run, key, func)
+        except RuntimeError:
+            # Shut down
+            with self._lock:
+                self._pending.pop(key, None)
+            return False
+        return True
+    
+    def _run(self, key, func):
+        """Run one task on a worker thread"""
+        with self._lock:
+            self._pending[key] = time.monotonic()
+        try:
+            func()
+            with self._lock:
+                self.completed += 1
+        except Exception as e:
+            with self._lock:
+                self.failed += 1
+            logger.error(f"Error running task {key}: {e}", exc_info=True)
+        finally:
+            with self._lock:
+                started = self._pending.pop(key, None)
+                self._timed_out.discard(key)
+                self._idle.notify_all()
+            if started is not None and time.monotonic() - started > self.timeout:
+                logger.info(f"Task {key} finished after {time.monotonic() - started:.0f}s")
+    
+    @contextmanager
+    def try_acquire(self, key):
+        """
+        Reserve a key for work done outside the pool (e.g. a manual check)
+        
+        Yields:
+            True while the key is reserved, or False if a task for it is queued,
+            running or holds the reservation (nothing is reserved then)
+        """
+        with self._lock:
+            acquired = key not in self._pending and key not in self._reserved
+            if acquired:
+                self._reserved.add(key)
+            else:
+                self.skipped_busy += 1
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                with self._lock:
+                    self._reserved.discard(key)
+                    self._idle.notify_all()
+    
+    def is_busy(self, key):
+        """Whether a task for the key is queued or running, or the key is reserved"""
+        with self._lock:
+            return key in self._pending or key in self._reserved
+    
+    def reap(self):
+        """Report tasks that have been running longer than the timeout (once each)"""
+        now = time.monotonic()
+        with self._lock:
+            overdue = [
+                (key, now - started) for key, started in self._pending.items()
+                if started is not None and now - started > self.timeout and key not in self._timed_out
+            ]
+            self._timed_out.update(key for key, _ in overdue)
+            self.timeouts += len(overdue)
+        for key, elapsed in overdue:
+            logger.warning(f"Task {key} still running after {elapsed:.0f}s (timeout {self.timeout:g}s)")
+            if self.on_timeout is not None:
+                try:
+                    self.on_timeout(key, elapsed)
+                except Exception as e:
+                    logger.error(f"Error reporting timed out task {key}: {e}", exc_info=True)
+        return len(overdue)
+    
+    def shutdown(self, wait=0):
+        """
+        Drop queued tasks and stop accepting new ones
+        
+        Args:
+            wait: Seconds to wait for running tasks and reservations to end (tasks
+                still running afterwards finish in the background)
+        
+        Returns:
+            True if nothing is running any more
+        """
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        deadline = time.monotonic() + wait
+        with self._lock:
+            self._pending = {key: started for key, started in self._pending.items() if started is not None}
+            while self._pending or self._reserved:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+            return True
+    
+    def stats(self):
+        """Get pool usage counters"""
+        with self._lock:
+            running = sum(1 for started in self._pending.values() if started is not None)
+            return {
+                'max_workers': self.max_workers,
+                'timeout': self.timeout,
+                'running': running,
+                'queued': len(self._pending) - running,
+                'reserved': len(self._reserved),
+                'completed': self.completed,
+                'failed': self.failed,
+                'skipped_busy': self.skipped_busy,
+                'timeouts': self.timeouts
+            }
@@ -6,6 +6,9 @@ const API_BASE = window.location.origin;
 // Favicon path - use this constant so favicon can be changed in one place
 const FAVICON_PATH = '/icon-192.png';
 
+// Comma-separated two-letter App Store country codes, e.g. "us, gb, de"
+const STOREFRONTS_PATTERN = /^[a-z]{2}(\s*,\s*[a-z]{2})*$/i;
+
 // Helper function to get auth headers
 const getAuthHeaders = () => {
   const token = localStorage.getItem('auth_token');
@@ -452,6 +455,8 @@ function App() {
   };
 
   const handleLogout = () => {
+    // End the server-side session (best effort)
+    fetch(`${API_BASE}/api/auth/logout`, { method: 'POST', headers: getAuthHeaders() }).catch(() => {});
     localStorage.removeItem('auth_token');
     setAuthToken(null);
     setIsAuthenticated(false);
@@ -1044,6 +1049,28 @@ function AppCard({ app, onEdit, onDelete, onCheck, onPost, checking, posting })
             <span className="app-info-label">Check Interval</span>
             <span className="app-info-value">{app.interval_override || 'Default (12h)'}</span>
           </div>
+          {app.storefronts && app.storefronts.length > 1 && (
+            <div className="app-info-item" style={{ gridColumn: '1 / -1' }}>
+              <span className="app-info-label">Storefronts</span>
+              <span className="app-info-value">
+                {app.storefronts
+                  .map(country => `${country.toUpperCase()} ${(app.storefront_versions || {})[country] || '-'}`)
+                  .join(' · ')}
+              </span>
+            </div>
+          )}
+          {app.lookup_failures && app.lookup_failures.count > 0 && (
+            <div className="app-info-item" style={{ gridColumn: '1 / -1' }}>
+              <span className="app-info-label">
+                {app.lookup_failures.parked_at ? 'Paused' : 'Lookup Failures'}
+              </span>
+              <span className="app-info-value">
+                {app.lookup_failures.parked_at
+                  ? `Scheduled checks paused after ${app.lookup_failures.count} failed lookups (${app.lookup_failures.last_error || 'unknown error'}). Check or edit the app to resume.`
+                  : `${app.lookup_failures.count} in a row; next scheduled check after ${new Date(app.lookup_failures.retry_at).toLocaleString()}`}
+              </span>
+            </div>
+          )}
           <div className="app-info-item" style={{ gridColumn: '1 / -1' }}>
             <span className="app-info-label">Notifications</span>
             <span className="app-info-value destinations">{getDestinationSummary()}</span>
@@ -1118,6 +1145,7 @@ function AddAppPage({ onSave, onCancel, message, showMessage, editingApp }) {
     name: editingApp?.name || '',
     app_store_id: editingApp?.app_store_id || '',
     interval_override: editingApp?.interval_override || '',
+    storefronts: (editingApp?.storefronts || []).join(', '),
     enabled: editingApp?.enabled !== false,
     icon_url: editingApp?.icon_url || ''
   });
@@ -1234,6 +1262,10 @@ function AddAppPage({ onSave, onCancel, message, showMessage, editingApp }) {
       }
     }
     
+    if (formData.storefronts.trim() && !STOREFRONTS_PATTERN.test(formData.storefronts.trim())) {
+      newErrors.storefronts = 'Use two-letter country codes separated by commas, e.g. us, gb, de';
+    }
+    
     setErrors(newErrors);
     return Object.keys(newErrors).length === 0;
   };
@@ -1245,6 +1277,9 @@ function AddAppPage({ onSave, onCancel, message, showMessage, editingApp }) {
     if (formData.interval_override.trim() && !/^\d+[hmsd]$/i.test(formData.interval_override.trim())) {
       return false;
     }
+    if (formData.storefronts.trim() && !STOREFRONTS_PATTERN.test(formData.storefronts.trim())) {
+      return false;
+    }
     return true;
   };
 
@@ -1413,6 +1448,20 @@ function AddAppPage({ onSave, onCancel, message, showMessage, editingApp }) {
                   {errors.interval_override && <span className="form-error">{errors.interval_override}</span>}
                 </div>
 
+                <div className="form-group">
+                  <label className="form-label">Storefronts (optional)</label>
+                  <input
+                    type="text"
+                    name="storefronts"
+                    value={formData.storefronts}
+                    onChange={handleChange}
+                    placeholder="e.g., us, gb, de"
+                    className={`form-input ${errors.storefronts ? 'error' : ''}`}
+                  />
+                  <span className="form-hint">App Store countries to watch. You are notified once, when the first of them shows a new version. Leave empty for the US store.</span>
+                  {errors.storefronts && <span className="form-error">{errors.storefronts}</span>}
+                </div>
+
                 <div className="form-group">
                   <div className="form-checkbox-group">
                     <input
@@ -2218,6 +2267,8 @@ function ActivityPage({ onCancel, apps, message, showMessage }) {
       'app_deleted': 'App Deleted',
       'app_enabled': 'App Enabled',
       'app_disabled': 'App Disabled',
+      'app_parked': 'App Paused',
+      'app_unparked': 'App Resumed',
       'settings_updated': 'Settings Updated'
     };
     return labels[eventType] || eventType;
@@ -2266,6 +2317,7 @@ function ActivityPage({ onCancel, apps, message, showMessage }) {
               <option value="app_created">App Created</option>
               <option value="app_updated">App Updated</option>
               <option value="app_deleted">App Deleted</option>
+              <option value="app_parked">App Paused</option>
             </select>
           </div>
 
@@ -2434,7 +2486,7 @@ function SchedulerPage({ onCancel, apps, message, showMessage }) {
       <div className="page-header">
         <div className="page-header-left">
           <h1 className="page-title">Scheduler</h1>
-          <p className="page-subtitle">View scheduled check runs and their status</p>
+          <p className="page-subtitle">Scheduled checks that found changes or failed (unchanged checks only update the last check time)</p>
         </div>
       </div>
 
@@ -0,0 +1,346 @@
+"""
+Shared fixtures: the Flask app module on temporary data, a local iTunes lookup
+server with a monitor using it, and a local stand-in for a Redis server
+"""
+import importlib
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+import pytest
+
+from backend.app_store import AppStoreMonitor
+from backend.fetch_engine import FetchEngine
+from backend.formatter import DiscordFormatter
+from backend.rate_limiter import HostRateLimiter
+from backend.storage import StorageManager
+
+
+class FakeClock:
+    """
+    Manual clock to inject into a module in place of `time` (and of `asyncio`
+    for asyncio.sleep); sleeping advances it
+    """
+    
+    def __init__(self, now=1000.0):
+        self.now = now
+        self.wall = 1_700_000_000.0
+    
+    def monotonic(self):
+        return self.now
+    
+    def time(self):
+        return self.wall + self.now
+    
+    def advance(self, seconds):
+        self.now += seconds
+    
+    async def sleep(self, seconds):
+        self.now += max(0.0, seconds)
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+class LookupHandler(BaseHTTPRequestHandler):
+    """
+    Answers lookups with the server's status (and headers) and the results of the
+    requested IDs found in server.apps ({(country, App Store ID): result}), in
+    reverse order so callers have to match them by trackId
+    """
+    
+    protocol_version = 'HTTP/1.1'
+    
+    def do_GET(self):
+        query = parse_qs(urlsplit(self.path).query)
+        country = query.get('country', ['us'])[0]
+        app_store_ids = query.get('id', [''])[0].split(',')
+        self.server.requests += 1
+        self.server.lookups.append((country, app_store_ids))
+        results = [
+            {'trackId': int(app_store_id), **self.server.apps[(country, app_store_id)]}
+            for app_store_id in reversed(app_store_ids) if (country, app_store_id) in self.server.apps
+        ]
+        body = json.dumps({'resultCount': len(results), 'results': results}).encode('utf-8')
+        self.send_response(self.server.failing.get(country, self.server.status))
+        for name, value in self.server.headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def lookup_server():
+    """
+    A local iTunes lookup server; set .status, .headers, .apps and .failing
+    ({country: status}), and read .requests and .lookups ([(country, IDs)])
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', 0), LookupHandler)
+    server.status = 200
+    server.headers = {}
+    server.apps = {}
+    server.failing = {}
+    server.requests = 0
+    server.lookups = []
+    threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def monitor(tmp_path, lookup_server, monkeypatch):
+    """An AppStoreMonitor on JSON storage looking apps up on lookup_server (notifications recorded, not sent)"""
+    monkeypatch.setattr(StorageManager, 'WRITE_BEHIND_DELAY', 0)
+    monkeypatch.setattr(AppStoreMonitor, 'RETRY_DELAY', 0.01)
+    url = f'http://127.0.0.1:{lookup_server.server_address[1]}/lookup'
+    monkeypatch.setattr(AppStoreMonitor, 'ITUNES_LOOKUP_URL', url)
+    
+    engine = FetchEngine(timeout=5)
+    host = f'127.0.0.1:{lookup_server.server_address[1]}'
+    engine._rate_limiters[host] = HostRateLimiter(host, rate_per_minute=60000, burst=1000, retry_budget=100, max_wait=1)
+    monitor = AppStoreMonitor(StorageManager(tmp_path), DiscordFormatter({}), {}, fetch_engine=engine)
+    monitor.notifications = []
+    monkeypatch.setattr(monitor.notifier, 'send_notification', lambda *args, **kwargs: (monitor.notifications.append(args), (True, None))[1])
+    yield monitor
+    engine.close()
+
+
+class RedisStandIn:
+    """
+    In-memory data for the subset of Redis commands the Redis engine uses.
+    
+    Values are strings, dicts (hashes), sets or dicts of member -> score (sorted
+    sets, kept in `zsets` so a key's type is known).
+    """
+    
+    def __init__(self):
+        self.data = {}
+        self.zsets = set()
+        self.expires = {}
+        self.lock = threading.RLock()
+        self.commands = []
+    
+    def _get(self, key, default=None):
+        """Value of a key, dropping it first if it has expired"""
+        if key in self.expires and self.expires[key] <= time.time():
+            self._delete(key)
+        return self.data.get(key, default)
+    
+    def _delete(self, key):
+        self.expires.pop(key, None)
+        self.zsets.discard(key)
+        return self.data.pop(key, None) is not None
+    
+    def _zset(self, key):
+        self.zsets.add(key)
+        return self.data.setdefault(key, {})
+    
+    @staticmethod
+    def _bound(value):
+        """Parse a score bound: (inclusive limit, exclusive flag)"""
+        if value in ('-inf', '+inf', 'inf'):
+            return float(value), False
+        if value.startswith('('):
+            return float(value[1:]), True
+        return float(value), False
+    
+    @staticmethod
+    def _in_range(score, low, high):
+        (low, low_exclusive), (high, high_exclusive) = low, high
+        above = score > low if low_exclusive else score >= low
+        below = score < high if high_exclusive else score <= high
+        return above and below
+    
+    @staticmethod
+    def _score(score):
+        return str(int(score)) if float(score).is_integer() else repr(score)
+    
+    def _ordered(self, key):
+        return sorted(self._get(key, {}).items(), key=lambda item: (item[1], item[0]))
+    
+    def run(self, command, args):
+        """Run one command and return its reply (an Exception for an error reply)"""
+        name = command.upper()
+        options = [arg.upper() for arg in args]
+        if name in ('AUTH', 'SELECT'):
+            return 'OK'
+        if name == 'ECHO':
+            return args[0]
+        if name == 'GET':
+            return self._get(args[0])
+        if name == 'SET':
+            if 'NX' in options[2:] and self._get(args[0]) is not None:
+                return None
+            self._delete(args[0])
+            self.data[args[0]] = args[1]
+            if 'EX' in options[2:]:
+                self.expires[args[0]] = time.time() + int(args[options.index('EX') + 1])
+            return 'OK'
+        if name == 'DEL':
+            return sum(self._delete(key) for key in args if self._get(key) is not None)
+        if name in ('INCR', 'INCRBY'):
+            value = int(self._get(args[0], '0')) + (int(args[1]) if name == 'INCRBY' else 1)
+            self.data[args[0]] = str(value)
+            return value
+        if name == 'HSET':
+            values = self.data.setdefault(args[0], {})
+            added = sum(field not in values for field in args[1::2])
+            values.update(zip(args[1::2], args[2::2]))
+            return added
+        if name == 'HGET':
+            return self._get(args[0], {}).get(args[1])
+        if name == 'HEXISTS':
+            return int(args[1] in self._get(args[0], {}))
+        if name == 'HDEL':
+            values = self._get(args[0], {})
+            return sum(values.pop(field, None) is not None for field in args[1:])
+        if name == 'HGETALL':
+            return [item for pair in self._get(args[0], {}).items() for item in pair]
+        if name == 'SADD':
+            members = self.data.setdefault(args[0], set())
+            added = len(set(args[1:]) - members)
+            members.update(args[1:])
+            return added
+        if name == 'SMEMBERS':
+            return sorted(self._get(args[0], set()))
+        if name == 'ZADD':
+            zset = self._zset(args[0])
+            rest = args[1:]
+            only_new = rest[0].upper() == 'NX'
+            if only_new:
+                rest = rest[1:]
+            added = 0
+            for score, member in zip(rest[::2], rest[1::2]):
+                if only_new and member in zset:
+                    continue
+                added += member not in zset
+                zset[member] = float(score)
+            return added
+        if name == 'ZREM':
+            zset = self._get(args[0], {})
+            return sum(zset.pop(member, None) is not None for member in args[1:])
+        if name == 'ZCARD':
+            return len(self._get(args[0], {}))
+        if name == 'ZRANGE':
+            items = self._ordered(args[0])
+            start, stop = int(args[1]), int(args[2])
+            items = items[start:len(items) + stop + 1 if stop < 0 else stop + 1]
+            if 'WITHSCORES' in options:
+                return [item for member, score in items for item in (member, self._score(score))]
+            return [member for member, _ in items]
+        if name in ('ZRANGEBYSCORE', 'ZREVRANGEBYSCORE'):
+            reverse = name == 'ZREVRANGEBYSCORE'
+            high, low = (args[1], args[2]) if reverse else (args[2], args[1])
+            items = [
+                item for item in self._ordered(args[0])
+                if self._in_range(item[1], self._bound(low), self._bound(high))
+            ]
+            if reverse:
+                items.reverse()
+            if 'LIMIT' in options:
+                position = options.index('LIMIT')
+                offset, count = int(args[position + 1]), int(args[position + 2])
+                items = items[offset:offset + count]
+            if 'WITHSCORES' in options:
+                return [item for member, score in items for item in (member, self._score(score))]
+            return [member for member, _ in items]
+        if name == 'ZREMRANGEBYSCORE':
+            zset = self._get(args[0], {})
+            removed = [
+                member for member, score in zset.items()
+                if self._in_range(score, self._bound(args[1]), self._bound(args[2]))
+            ]
+            for member in removed:
+                del zset[member]
+            return len(removed)
+        return Exception(f"unknown command '{command}'")
+
+
+class RESPHandler(socketserver.StreamRequestHandler):
+    """Reads RESP commands (with MULTI/EXEC) and writes RESP2 replies"""
+    
+    def setup(self):
+        super().setup()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    
+    def handle(self):
+        queued = None
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            args = []
+            for _ in range(int(line[1:-2])):
+                length = int(self.rfile.readline()[1:-2])
+                args.append(self.rfile.read(length + 2)[:-2].decode('utf-8'))
+            command, rest = args[0].upper(), args[1:]
+            store = self.server.store
+            with store.lock:
+                store.commands.append([command] + rest)
+                if command == 'MULTI':
+                    queued, reply = [], 'OK'
+                elif command == 'EXEC':
+                    reply = [store.run(name, arguments) for name, arguments in queued]
+                    queued = None
+                elif queued is not None:
+                    queued.append((command, rest))
+                    reply = 'QUEUED'
+                else:
+                    reply = store.run(command, rest)
+            self.wfile.write(self.encode(reply))
+    
+    @classmethod
+    def encode(cls, reply):
+        if reply is None:
+            return b'$-1\r\n'
+        if isinstance(reply, Exception):
+            return f'-ERR {reply}\r\n'.encode('utf-8')
+        if isinstance(reply, int):
+            return f':{reply}\r\n'.encode('ascii')
+        if isinstance(reply, list):
+            return f'*{len(reply)}\r\n'.encode('ascii') + b''.join(cls.encode(item) for item in reply)
+        if reply in ('OK', 'QUEUED'):
+            return f'+{reply}\r\n'.encode('ascii')
+        data = reply.encode('utf-8')
+        return f'${len(data)}\r\n'.encode('ascii') + data + b'\r\n'
+
+
+class RESPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+@pytest.fixture
+def redis_server():
+    """A local server speaking the Redis protocol (URL at .url, data and received commands at .store)"""
+    server = RESPServer(('127.0.0.1', 0), RESPHandler)
+    server.store = RedisStandIn()
+    server.url = f'redis://127.0.0.1:{server.server_address[1]}/0'
+    threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(scope='session')
+def app_module(tmp_path_factory):
+    """backend.app with its data in a temporary directory (imported once per test session)"""
+    os.environ['DATA_DIR'] = str(tmp_path_factory.mktemp('data'))
+    os.environ['STORAGE_ENGINE'] = 'json'
+    module = importlib.import_module('backend.app')
+    yield module
+    module.stop_scheduler()
+    module.storage.flush()
@@ -0,0 +1,67 @@
+"""
+Batched iTunes lookups across storefronts, against a local lookup server
+"""
+
+
+def app_result(version, name='App'):
+    return {'version': version, 'trackName': name, 'bundleId': f'com.example.{name.lower()}', 'releaseNotes': 'Fixes'}
+
+
+def test_results_are_matched_by_track_id(monitor, lookup_server):
+    lookup_server.apps = {('us', '1'): app_result('1.0', 'One'), ('us', '3'): app_result('3.0', 'Three')}
+    
+    infos = monitor.fetch_app_infos(['1', '2', 3, '1'])
+    
+    # The server answers in reverse order and leaves out the missing app
+    assert lookup_server.lookups == [('us', ['1', '2', '3'])]
+    assert infos.keys() == {'1', '2', '3'}
+    assert infos['1']['trackName'] == 'One'
+    assert infos['3']['version'] == '3.0'
+    assert infos['2'] is None
+
+
+def test_batches_of_100_ids(monitor, lookup_server):
+    app_store_ids = [str(1000 + i) for i in range(250)]
+    lookup_server.apps = {('us', app_store_id): app_result(app_store_id) for app_store_id in app_store_ids}
+    
+    infos = monitor.fetch_app_infos(app_store_ids)
+    
+    assert sorted(len(ids) for _, ids in lookup_server.lookups) == [50, 100, 100]
+    assert sorted(app_store_id for _, ids in lookup_server.lookups for app_store_id in ids) == app_store_ids
+    assert all(infos[app_store_id]['version'] == app_store_id for app_store_id in app_store_ids)
+
+
+def test_storefronts_are_looked_up_separately(monitor, lookup_server):
+    lookup_server.apps = {('us', '1'): app_result('1.1'), ('de', '1'): app_result('1.0'), ('de', '2'): app_result('2.0')}
+    
+    infos = monitor.fetch_storefront_infos({'us': ['1', '2'], 'de': ['1', '2']})
+    
+    assert sorted(lookup_server.lookups) == [('de', ['1', '2']), ('us', ['1', '2'])]
+    assert infos[('us', '1')]['version'] == '1.1'
+    assert infos[('de', '1')]['version'] == '1.0'
+    assert infos[('us', '2')] is None
+    assert infos[('de', '2')]['version'] == '2.0'
+
+
+def test_failed_batch_is_left_out(monitor, lookup_server):
+    lookup_server.apps = {('us', '1'): app_result('1.0'), ('de', '1'): app_result('1.0')}
+    lookup_server.failing = {'de': 400}
+    
+    infos = monitor.fetch_storefront_infos({'us': ['1'], 'de': ['1']})
+    
+    # Missing from the result (not None), so callers fall back to single lookups
+    assert infos == {('us', '1'): monitor._parse_app_info({'trackId': 1, **app_result('1.0')})}
+
+
+def test_cached_results_are_not_looked_up_again(monitor, lookup_server):
+    lookup_server.apps = {('us', '1'): app_result('1.0')}
+    first = monitor.fetch_app_infos(['1', '2'], use_cache=True)
+    requests = lookup_server.requests
+    
+    assert monitor.fetch_app_infos(['1', '2'], use_cache=True) == first
+    assert lookup_server.requests == requests
+    
+    # Without the cache both are looked up again, in one request
+    monitor.fetch_app_infos(['1', '2'])
+    assert lookup_server.lookups[-1] == ('us', ['1', '2'])
+    assert lookup_server.requests == requests + 1
@@ -0,0 +1,146 @@
+"""
+Fetch engine redirects and proxy support against local HTTP servers
+"""
+import gzip
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+import pytest
+
+from backend.fetch_engine import FetchEngine, FetchError
+
+PROXY_VARIABLES = ('http_proxy', 'https_proxy', 'no_proxy', 'HTTP_PROXY', 'HTTPS_PROXY', 'NO_PROXY', 'all_proxy', 'ALL_PROXY')
+
+
+class Handler(BaseHTTPRequestHandler):
+    """
+    Answers JSON with the request line; /redirect/<n> redirects n times, /gzip/<n>
+    sends a gzipped document of n bytes and /empty answers 204
+    """
+    
+    def do_GET(self):
+        self.server.requests.append(self.requestline)
+        path = urlsplit(self.path).path
+        if path == '/empty':
+            self.send_response(204)
+            self.end_headers()
+            return
+        if path.startswith('/gzip/'):
+            size = int(path.rsplit('/', 1)[1])
+            body = gzip.compress(json.dumps({'padding': ' ' * (size - 15)}).encode('utf-8'))
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Encoding', 'gzip')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        if path.startswith('/redirect/'):
+            remaining = int(path.rsplit('/', 1)[1])
+            self.send_response(302)
+            self.send_header('Location', f'/redirect/{remaining - 1}' if remaining > 1 else '/data')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        body = json.dumps({'path': path, 'proxy_auth': self.headers.get('Proxy-Authorization')}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def make_server():
+    servers = []
+    
+    def start():
+        server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        server.requests = []
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server, f'http://127.0.0.1:{server.server_address[1]}'
+    
+    yield start
+    for server in servers:
+        server.shutdown()
+
+
+@pytest.fixture
+def engine_factory(monkeypatch):
+    for name in PROXY_VARIABLES:
+        monkeypatch.delenv(name, raising=False)
+    engines = []
+    
+    def create():
+        engine = FetchEngine(timeout=5)
+        engines.append(engine)
+        return engine
+    
+    yield create
+    for engine in engines:
+        engine.close()
+
+
+def test_follows_redirects(make_server, engine_factory):
+    server, base_url = make_server()
+    engine = engine_factory()
+    
+    assert engine.run(engine.get_json(f'{base_url}/redirect/3'))['path'] == '/data'
+    assert len(server.requests) == 4
+    
+    with pytest.raises(FetchError):
+        engine.run(engine.get_json(f'{base_url}/redirect/{FetchEngine.MAX_REDIRECTS + 1}'))
+
+
+def test_uses_proxy_from_environment(make_server, engine_factory, monkeypatch):
+    _, target_url = make_server()
+    proxy, proxy_url = make_server()
+    monkeypatch.setenv('http_proxy', proxy_url.replace('http://', 'http://user:secret@'))
+    engine = engine_factory()
+    
+    data = engine.run(engine.get_json(f'{target_url}/data', params={'id': '1'}))
+    assert proxy.requests == [f'GET {target_url}/data?id=1 HTTP/1.1']
+    assert data['proxy_auth'] == 'Basic dXNlcjpzZWNyZXQ='
+
+
+def test_no_proxy_connects_directly(make_server, engine_factory, monkeypatch):
+    target, target_url = make_server()
+    proxy, proxy_url = make_server()
+    monkeypatch.setenv('http_proxy', proxy_url)
+    monkeypatch.setenv('no_proxy', '127.0.0.1')
+    engine = engine_factory()
+    
+    engine.run(engine.get_json(f'{target_url}/data'))
+    assert proxy.requests == []
+    assert target.requests == ['GET /data HTTP/1.1']
+
+
+def test_decompresses_gzip_up_to_the_size_limit(make_server, engine_factory):
+    _, base_url = make_server()
+    engine = engine_factory()
+    engine.MAX_RESPONSE_BYTES = 1024 * 1024
+    
+    data = engine.run(engine.get_json(f'{base_url}/gzip/{512 * 1024}'))
+    assert len(data['padding']) == 512 * 1024 - 15
+    assert engine.stats()['parse']['wire_bytes'] < 10 * 1024
+    assert engine.stats()['parse']['body_bytes'] == 512 * 1024
+    
+    # A small compressed body that inflates past the limit is refused
+    with pytest.raises(FetchError, match='too large'):
+        engine.run(engine.get_json(f'{base_url}/gzip/{8 * 1024 * 1024}'))
+
+
+def test_response_without_body(make_server, engine_factory):
+    _, base_url = make_server()
+    engine = engine_factory()
+    
+    with pytest.raises(FetchError, match='Empty response') as error:
+        engine.run(engine.get_json(f'{base_url}/empty'))
+    assert error.value.status == 204
+    assert not error.value.retryable
@@ -0,0 +1,136 @@
+"""
+Cursor pagination of the activity history, on every engine and through /api/history
+"""
+import pytest
+
+from backend.history_index import HistoryIndex
+from backend.storage import StorageManager, create_storage_manager
+
+
+@pytest.fixture(params=['json', 'sqlite', 'redis'])
+def storage(request, tmp_path, monkeypatch):
+    monkeypatch.setattr(StorageManager, 'WRITE_BEHIND_DELAY', 0)
+    if request.param == 'redis':
+        monkeypatch.setenv('REDIS_URL', request.getfixturevalue('redis_server').url)
+    return create_storage_manager(tmp_path, request.param)
+
+
+def add_entries(storage, count):
+    """Entries over 3 apps, 2 event types and 2 statuses; returned newest first"""
+    entries = [
+        storage.add_history_entry(
+            ('check', 'post')[i % 2], app_id=f'app-{i % 3}', status=('info', 'error')[i % 5 == 0], message=f'entry {i}'
+        )
+        for i in range(count)
+    ]
+    return list(reversed(entries))
+
+
+def read_all_pages(read_page, limit, **filters):
+    """Follow next_cursor to the end; returns the pages"""
+    pages = []
+    cursor = None
+    while True:
+        entries, cursor = read_page(limit=limit, cursor=cursor, **filters)
+        pages.append(entries)
+        if cursor is None:
+            return pages
+        assert len(pages) < 100
+
+
+def matches(entry, filters):
+    timestamp = entry['timestamp']
+    return (
+        all(entry[field] == filters[field] for field in ('event_type', 'app_id', 'status') if field in filters)
+        and ('start_date' not in filters or timestamp >= filters['start_date'])
+        and ('end_date' not in filters or timestamp <= filters['end_date'])
+    )
+
+
+@pytest.mark.parametrize('filters', [
+    {},
+    {'app_id': 'app-1'},
+    {'event_type': 'post', 'status': 'error'},
+    {'app_id': 'app-2', 'event_type': 'check', 'status': 'info'},
+    {'app_id': 'missing'},
+])
+def test_pages_cover_matching_entries_once(storage, filters):
+    entries = add_entries(storage, 45)
+    expected = [entry for entry in entries if matches(entry, filters)]
+    
+    pages = read_all_pages(storage.get_history_page, limit=4, **filters)
+    
+    assert [entry for page in pages for entry in page] == expected
+    assert all(len(page) == 4 for page in pages[:-1])
+
+
+def test_date_range_with_filters(storage):
+    entries = add_entries(storage, 30)
+    filters = {'status': 'info', 'start_date': entries[20]['timestamp'], 'end_date': entries[5]['timestamp']}
+    expected = [entry for entry in entries if matches(entry, filters)]
+    
+    pages = read_all_pages(storage.get_history_page, limit=3, **filters)
+    
+    assert [entry for page in pages for entry in page] == expected
+    assert expected
+
+
+def test_last_full_page_has_no_cursor(storage):
+    add_entries(storage, 8)
+    
+    first, cursor = storage.get_history_page(limit=4)
+    second, last_cursor = storage.get_history_page(limit=4, cursor=cursor)
+    
+    assert [len(first), len(second)] == [4, 4]
+    assert cursor is not None
+    assert last_cursor is None
+    assert storage.get_history_page(limit=8) == (first + second, None)
+
+
+def test_invalid_cursor(storage):
+    with pytest.raises(ValueError):
+        storage.get_history_page(cursor='not a cursor')
+
+
+def test_index_tolerates_clock_stepping_back():
+    index = HistoryIndex()
+    timestamps = ['2024-01-01T10:00', '2024-01-01T12:00', '2024-01-01T11:00', '2024-01-01T13:00']
+    for seq, timestamp in enumerate(timestamps):
+        index.add(seq, {'timestamp': timestamp, 'status': 'info'})
+    
+    entries, _ = index.query(10, start_date='2024-01-01T11:30')
+    assert [entry['timestamp'] for entry in entries] == ['2024-01-01T13:00', '2024-01-01T12:00']
+    entries, _ = index.query(10, start_date='2024-01-01T10:30', end_date='2024-01-01T12:30')
+    assert [entry['timestamp'] for entry in entries] == ['2024-01-01T11:00', '2024-01-01T12:00']
+
+
+@pytest.fixture
+def client(app_module):
+    app_module.storage.clear_history()
+    yield app_module.app.test_client()
+    app_module.storage.clear_history()
+
+
+def test_endpoint_pages_with_filters(app_module, client):
+    entries = add_entries(app_module.storage, 20)
+    expected = [entry for entry in entries if entry['app_id'] == 'app-0' and entry['status'] == 'info']
+    
+    def read_page(limit, cursor, **filters):
+        query = {'limit': limit, **filters, **({'cursor': cursor} if cursor else {})}
+        response = client.get('/api/history', query_string=query)
+        assert response.status_code == 200
+        body = response.get_json()
+        assert body['count'] == len(body['history'])
+        return body['history'], body['next_cursor']
+    
+    pages = read_all_pages(read_page, limit=2, app_id='app-0', status='info')
+    
+    assert [entry for page in pages for entry in page] == expected
+    assert len(pages) == -(-len(expected) // 2)
+
+
+def test_endpoint_rejects_invalid_cursor(client):
+    response = client.get('/api/history', query_string={'cursor': 'bm90LWEtY3Vyc29y'})
+    
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Invalid history cursor'}
@@ -0,0 +1,147 @@
+"""
+On-disk icon cache: conditional revalidation, stale copies, pruning and thumbnails
+"""
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from backend.icon_cache import IconCache, sized_icon_url
+
+
+class IconHandler(BaseHTTPRequestHandler):
+    """Serves server.body for any path with ETag server.etag, or server.status if set"""
+    
+    def do_GET(self):
+        self.server.requests.append((self.path, self.headers.get('If-None-Match')))
+        if self.server.status:
+            self.send_response(self.server.status)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if self.headers.get('If-None-Match') == self.server.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/png')
+        self.send_header('ETag', self.server.etag)
+        self.send_header('Content-Length', str(len(self.server.body)))
+        self.end_headers()
+        self.wfile.write(self.server.body)
+    
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def icon_server():
+    """A local icon host; set .body, .etag and .status, read .requests ([(path, If-None-Match)])"""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), IconHandler)
+    server.body = b'icon v1'
+    server.etag = '"v1"'
+    server.status = None
+    server.requests = []
+    server.url = f'http://127.0.0.1:{server.server_address[1]}'
+    threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.parametrize('url, size, expected', [
+    ('https://is1.mzstatic.com/image/thumb/a/AppIcon.png/512x512bb.jpg', 64, 'https://is1.mzstatic.com/image/thumb/a/AppIcon.png/64x64bb.jpg'),
+    ('https://is1.mzstatic.com/image/thumb/a/AppIcon.png/100x100.PNG', 128, 'https://is1.mzstatic.com/image/thumb/a/AppIcon.png/128x128bb.PNG'),
+    ('https://is1.mzstatic.com/image/thumb/a/AppIcon.png/512x512bb.jpg', None, 'https://is1.mzstatic.com/image/thumb/a/AppIcon.png/512x512bb.jpg'),
+    ('https://example.com/icon.png', 64, 'https://example.com/icon.png'),
+])
+def test_sized_icon_url(url, size, expected):
+    assert sized_icon_url(url, size) == expected
+
+
+def test_fresh_icon_is_served_from_disk(tmp_path, icon_server):
+    cache = IconCache(tmp_path, revalidate_after=3600)
+    url = f'{icon_server.url}/icon.png'
+    
+    image_path, meta = cache.get(url)
+    assert image_path.read_bytes() == b'icon v1'
+    assert meta['content_type'] == 'image/png'
+    assert cache.get(url) == (image_path, meta)
+    
+    assert len(icon_server.requests) == 1
+    assert (cache.stats()['fetched'], cache.stats()['hits']) == (1, 1)
+
+
+def test_revalidation_with_etag(tmp_path, icon_server):
+    cache = IconCache(tmp_path, revalidate_after=0)
+    url = f'{icon_server.url}/icon.png'
+    _, first = cache.get(url)
+    
+    # Unchanged upstream: a 304 keeps the cached bytes and the client ETag
+    image_path, meta = cache.get(url)
+    assert icon_server.requests[-1] == ('/icon.png', '"v1"')
+    assert meta['etag'] == first['etag']
+    assert cache.stats()['revalidated'] == 1
+    
+    # Changed upstream: the new icon replaces the old one
+    icon_server.body, icon_server.etag = b'icon v2', '"v2"'
+    image_path, meta = cache.get(url)
+    assert image_path.read_bytes() == b'icon v2'
+    assert meta['etag'] != first['etag']
+    assert cache.stats()['fetched'] == 2
+
+
+def test_stale_copy_served_when_upstream_fails(tmp_path, icon_server):
+    cache = IconCache(tmp_path, revalidate_after=0)
+    url = f'{icon_server.url}/icon.png'
+    cache.get(url)
+    
+    icon_server.status = 503
+    image_path, meta = cache.get(url)
+    assert image_path.read_bytes() == b'icon v1'
+    assert cache.stats()['errors'] == 1
+    
+    # Nothing to fall back on for an icon that was never cached
+    with pytest.raises(requests.HTTPError):
+        cache.get(f'{icon_server.url}/other.png')
+
+
+def test_least_recently_refreshed_icons_are_pruned(tmp_path, icon_server):
+    cache = IconCache(tmp_path, revalidate_after=3600, max_entries=10)
+    paths = []
+    for i in range(11):
+        image_path, _ = cache.get(f'{icon_server.url}/icon-{i}.png')
+        os.utime(image_path, (i, i))
+        paths.append(image_path)
+    
+    # Over the limit: the oldest entries go, a tenth of the limit beyond it
+    assert [path.exists() for path in paths] == [False, False] + [True] * 9
+    assert not paths[0].with_suffix('.json').exists()
+    assert len(list(tmp_path.glob('*.img'))) == 9
+
+
+@pytest.fixture
+def client(app_module, icon_server):
+    app_id = app_module.storage.save_app({
+        'name': 'Icon app', 'app_store_id': '123',
+        'icon_url': f'{icon_server.url}/image/thumb/AppIcon.png/512x512bb.jpg'
+    })
+    yield app_module.app.test_client(), app_id
+    app_module.storage.delete_app(app_id)
+
+
+def test_icon_endpoint_serves_thumbnails(client, icon_server):
+    client, app_id = client
+    
+    response = client.get(f'/api/apps/{app_id}/icon?size=64')
+    assert response.status_code == 200
+    assert response.data == b'icon v1'
+    assert icon_server.requests[-1][0] == '/image/thumb/AppIcon.png/64x64bb.jpg'
+    
+    cached = client.get(f'/api/apps/{app_id}/icon?size=64', headers={'If-None-Match': response.headers['ETag']})
+    assert cached.status_code == 304
+    assert len(icon_server.requests) == 1
+    
+    assert client.get(f'/api/apps/{app_id}/icon?size=63').status_code == 400
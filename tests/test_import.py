@@ -0,0 +1,53 @@
+"""
+Bulk import parsing and per-row error reporting
+"""
+import csv
+import json
+
+import pytest
+
+
+@pytest.fixture
+def import_rows(app_module, monkeypatch):
+    monkeypatch.setattr(app_module, 'fetch_app_icons', lambda storefront_ids: {})
+    
+    def run(text, import_format):
+        rows = app_module.parse_import_rows(text, import_format)
+        return [json.loads(line) for line in app_module.import_apps_stream(rows, {})]
+    
+    return run
+
+
+def test_oversized_csv_field_does_not_abort_import(app_module, import_rows):
+    text = (
+        'name,app_store_id,icon_url\n'
+        f'Huge,1,{"x" * (csv.field_size_limit() + 1)}\n'
+        'Valid,2,https://example.com/icon.png\n'
+    )
+    
+    lines = import_rows(text, 'csv')
+    
+    assert lines[0]['row'] == 1
+    assert lines[0]['status'] == 'error'
+    assert 'field larger than field limit' in lines[0]['error']
+    assert lines[1]['row'] == 2
+    assert lines[1]['status'] == 'created'
+    assert lines[-1] == {'status': 'done', 'created': 1, 'updated': 0, 'errors': 1}
+    assert app_module.storage.get_app(lines[1]['id'])['name'] == 'Valid'
+
+
+def test_malformed_rows_are_reported_per_row(import_rows):
+    text = '\n'.join([
+        json.dumps({'name': 'Good', 'app_store_id': '3', 'icon_url': 'https://example.com/icon.png'}),
+        'not json',
+        json.dumps(['not', 'an', 'object']),
+        json.dumps({'name': 'Bad icon', 'app_store_id': '4', 'icon_url': {'url': 'x'}}),
+        json.dumps({'name': 'Bad destination', 'app_store_id': '5', 'notification_destinations': [{'type': 5}]})
+    ])
+    
+    lines = import_rows(text, 'ndjson')
+    
+    assert [(line.get('row'), line['status']) for line in lines[:-1]] == [
+        (2, 'error'), (3, 'error'), (4, 'error'), (5, 'error'), (1, 'created')
+    ]
+    assert lines[-1] == {'status': 'done', 'created': 1, 'updated': 0, 'errors': 4}
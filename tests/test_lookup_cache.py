@@ -0,0 +1,169 @@
+"""
+Lookup result cache (TTL, stale-while-revalidate, LRU eviction) and request coalescing
+"""
+import threading
+
+import pytest
+
+from backend import lookup_cache
+from backend.lookup_cache import LookupCache, SingleFlight
+
+
+@pytest.fixture
+def cache(clock, monkeypatch):
+    monkeypatch.setattr(lookup_cache, 'time', clock)
+    return LookupCache(max_entries=3, ttl=60, stale_ttl=600)
+
+
+class Loader:
+    """Counts calls and returns 'value <n>', optionally blocking until released"""
+    
+    def __init__(self, block=False):
+        self.calls = 0
+        self.release = threading.Event()
+        if not block:
+            self.release.set()
+        self.done = threading.Event()
+    
+    def __call__(self):
+        self.calls += 1
+        self.release.wait(5)
+        self.done.set()
+        return f'value {self.calls}'
+
+
+def test_fresh_entries_are_served_until_the_ttl(cache, clock):
+    loader = Loader()
+    assert cache.get('key', loader) == 'value 1'
+    clock.advance(59)
+    assert cache.get('key', loader) == 'value 1'
+    assert loader.calls == 1
+    assert cache.get_if_fresh('key') == (True, 'value 1')
+    
+    clock.advance(2)
+    assert cache.get_if_fresh('key') == (False, None)
+    
+    # Past the stale window the entry is a miss and is loaded synchronously
+    clock.advance(600)
+    assert cache.get('key', loader) == 'value 2'
+    assert cache.stats()['hits'] == 2
+    assert cache.stats()['misses'] == 3
+
+
+def test_stale_entry_is_refreshed_once_in_the_background(cache, clock):
+    cache.put('key', 'old')
+    clock.advance(120)
+    loader = Loader(block=True)
+    
+    assert [cache.get('key', loader) for _ in range(5)] == ['old'] * 5
+    loader.release.set()
+    assert loader.done.wait(5)
+    for _ in range(100):
+        if cache.get_if_fresh('key')[0]:
+            break
+        threading.Event().wait(0.01)
+    
+    assert loader.calls == 1
+    assert cache.get('key', loader) == 'value 1'
+    assert cache.stats()['stale_hits'] == 5
+
+
+def test_least_recently_used_entry_is_evicted(cache):
+    for key in 'abc':
+        cache.put(key, key)
+    cache.get('a', Loader())
+    cache.put('d', 'd')
+    
+    assert cache.get_if_fresh('b') == (False, None)
+    assert [cache.get_if_fresh(key)[0] for key in 'acd'] == [True, True, True]
+    assert cache.stats()['evictions'] == 1
+    assert cache.stats()['size'] == 3
+
+
+def test_failures_are_not_cached(cache, clock):
+    def fail():
+        raise RuntimeError('lookup failed')
+    
+    with pytest.raises(RuntimeError):
+        cache.get('key', fail)
+    assert cache.get('key', Loader()) == 'value 1'
+    
+    # A failed background refresh keeps serving the stale value
+    clock.advance(120)
+    assert cache.get('key', fail) == 'value 1'
+    for _ in range(100):
+        if not cache._refreshing:
+            break
+        threading.Event().wait(0.01)
+    assert cache.get('key', Loader()) == 'value 1'
+
+
+def run_concurrently(single_flight, key, fn, callers):
+    """Call single_flight.do(key, fn) from several threads; returns their results or exceptions"""
+    results = [None] * callers
+    
+    def call(index):
+        try:
+            results[index] = single_flight.do(key, fn)
+        except Exception as e:
+            results[index] = e
+    
+    threads = [threading.Thread(target=call, args=(index,)) for index in range(callers)]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+
+def wait_for_followers(single_flight, count):
+    for _ in range(500):
+        if single_flight.stats()['shared'] >= count:
+            return
+        threading.Event().wait(0.01)
+    raise AssertionError('Callers did not join the call in flight')
+
+
+def test_concurrent_calls_share_one_result():
+    single_flight = SingleFlight()
+    loader = Loader(block=True)
+    
+    threads, results = run_concurrently(single_flight, 'key', loader, 5)
+    wait_for_followers(single_flight, 4)
+    loader.release.set()
+    for thread in threads:
+        thread.join(5)
+    
+    assert loader.calls == 1
+    assert results == ['value 1'] * 5
+    assert single_flight.stats() == {'in_flight': 0, 'calls': 1, 'shared': 4}
+    
+    # Finished calls are not remembered
+    assert single_flight.do('key', loader) == 'value 2'
+
+
+def test_leader_exception_is_shared():
+    single_flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+    
+    def fail():
+        calls.append(1)
+        release.wait(5)
+        raise RuntimeError('lookup failed')
+    
+    threads, results = run_concurrently(single_flight, 'key', fail, 3)
+    wait_for_followers(single_flight, 2)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    
+    assert len(calls) == 1
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert results[0] is results[1] is results[2]
+
+
+def test_different_keys_are_not_coalesced():
+    single_flight = SingleFlight()
+    
+    assert single_flight.do('a', lambda: 1) == 1
+    assert single_flight.do('b', lambda: 2) == 2
+    assert single_flight.stats()['calls'] == 2
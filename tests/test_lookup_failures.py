@@ -0,0 +1,65 @@
+"""
+Backoff and parking of apps whose lookups keep failing, against a local lookup server
+"""
+import pytest
+
+from backend.app_store import AppStoreMonitor
+
+
+@pytest.fixture(autouse=True)
+def park_after_three_failures(monkeypatch):
+    monkeypatch.setattr(AppStoreMonitor, 'PARK_AFTER_FAILURES', 3)
+
+
+def run_checks(monitor, count):
+    """Check an app `count` times the way the check endpoints do; returns the app afterwards"""
+    app_id = monitor.storage.save_app({
+        'name': 'Test app',
+        'app_store_id': '123',
+        'notification_destinations': [{'type': 'discord', 'webhook_url': 'https://discord.com/api/webhooks/1/x'}]
+    })
+    for _ in range(count):
+        app = monitor.storage.get_app(app_id)
+        result = monitor.check_app(app)
+        assert result['lookup_failed']
+        monitor.record_lookup_failure(app, result, 3600)
+    return monitor.storage.get_app(app_id)
+
+
+@pytest.mark.parametrize('retry_after', [None, '3600'])
+def test_repeated_429_never_parks(monitor, lookup_server, retry_after):
+    # A Retry-After beyond FETCH_RATE_MAX_WAIT makes our own limiter hold back later lookups
+    lookup_server.status = 429
+    if retry_after:
+        lookup_server.headers = {'Retry-After': retry_after}
+    
+    app = run_checks(monitor, 8)
+    
+    assert lookup_server.requests > 0
+    assert not app['lookup_failures']
+    assert not monitor.is_backing_off(app)
+    assert monitor.notifications == []
+    assert not monitor.storage.get_history(event_type='app_parked')
+
+
+def test_server_errors_back_off_without_parking(monitor, lookup_server):
+    lookup_server.status = 500
+    
+    app = run_checks(monitor, 8)
+    
+    assert app['lookup_failures']['count'] == 8
+    assert not app['lookup_failures'].get('parked_at')
+    assert monitor.is_backing_off(app)
+    assert monitor.notifications == []
+
+
+@pytest.mark.parametrize('status', [200, 404])
+def test_missing_app_is_parked(monitor, lookup_server, status):
+    # 200 with no results: not found; 404: rejected for good
+    lookup_server.status = status
+    
+    app = run_checks(monitor, 3)
+    
+    assert app['lookup_failures']['parked_at']
+    assert len(monitor.notifications) == 1
+    assert len(monitor.storage.get_history(event_type='app_parked')) == 1
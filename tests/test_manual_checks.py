@@ -0,0 +1,32 @@
+"""
+Manual check and post endpoints while the app is busy in the worker pool
+"""
+import pytest
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+
+@pytest.fixture
+def app_id(app_module):
+    app_id = app_module.storage.save_app({'name': 'Busy app', 'app_store_id': '123'})
+    yield app_id
+    app_module.storage.delete_app(app_id)
+
+
+@pytest.mark.parametrize('action', ['check', 'post'])
+def test_busy_app_is_refused(app_module, client, app_id, action, monkeypatch):
+    calls = []
+    monkeypatch.setattr(app_module, 'check_app', lambda *args, **kwargs: (calls.append(args), ({}, 200))[1])
+    monkeypatch.setattr(app_module, 'post_to_discord', lambda *args: (calls.append(args), ({}, 200))[1])
+    
+    with app_module.check_pool.try_acquire(app_id) as acquired:
+        assert acquired
+        response = client.post(f'/api/apps/{app_id}/{action}')
+        assert response.status_code == 409
+        assert calls == []
+    
+    assert client.post(f'/api/apps/{app_id}/{action}').status_code == 200
+    assert calls == [(app_id,)]
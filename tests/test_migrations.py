@@ -0,0 +1,113 @@
+"""
+One-shot migrations of existing data directories
+"""
+import json
+import time
+
+from backend.sqlite_storage import SQLiteStorageManager
+from backend.storage import StorageManager
+
+
+def write_json(path, data):
+    with open(path, 'w') as f:
+        json.dump(data, f)
+
+
+def test_sqlite_migrates_json_storage(tmp_path, monkeypatch):
+    monkeypatch.setattr(StorageManager, 'WRITE_BEHIND_DELAY', 0)
+    storage = StorageManager(tmp_path)
+    app_id = storage.save_app({'name': 'Example', 'app_store_id': '123', 'interval_minutes': 30})
+    storage.save_current_version(app_id, '2.0')
+    storage.save_last_version(app_id, '1.9')
+    storage.update_last_check(app_id, '2024-01-02T03:04:05')
+    storage.save_storefront_versions(app_id, {'us': '2.0', 'de': '1.9'})
+    storage.save_lookup_failures(app_id, {'count': 2})
+    storage.save_content_hash(app_id, 'abc123')
+    storage.save_settings({'discord_webhook_url': 'https://example.com/hook'})
+    entries = [storage.add_history_entry('check', app_id=app_id, message=f'entry {i}') for i in range(5)]
+    storage.save_session('live', {'username': 'admin', 'password_hash': 'hash', 'expires_at': time.time() + 3600})
+    storage.save_session('expired', {'username': 'admin', 'password_hash': 'hash', 'expires_at': time.time() + 3600})
+    storage.flush()
+    sessions = json.loads((tmp_path / 'sessions.json').read_text())
+    sessions['expired']['expires_at'] = 1
+    write_json(tmp_path / 'sessions.json', sessions)
+    
+    migrated = SQLiteStorageManager(tmp_path)
+    
+    assert migrated.get_app(app_id) == storage.get_app(app_id)
+    assert migrated.get_content_hash(app_id) == 'abc123'
+    assert migrated.get_storefront_versions(app_id) == {'us': '2.0', 'de': '1.9'}
+    assert migrated.get_settings()['discord_webhook_url'] == 'https://example.com/hook'
+    assert migrated.get_auth() == storage.get_auth()
+    assert migrated.get_history(limit=10) == list(reversed(entries))
+    assert migrated.get_session('live')['username'] == 'admin'
+    assert migrated._connect().execute('SELECT COUNT(*) FROM sessions').fetchone()[0] == 1
+    
+    # Only once: later changes to the JSON files are not imported again
+    storage.save_content_hash(app_id, 'changed')
+    storage.flush()
+    assert SQLiteStorageManager(tmp_path).get_content_hash(app_id) == 'abc123'
+
+
+def test_sqlite_migrates_legacy_layout(tmp_path):
+    write_json(tmp_path / 'apps.json', {'legacy': {'name': 'Legacy', 'app_store_id': '456'}})
+    app_dir = tmp_path / 'apps' / 'legacy'
+    app_dir.mkdir(parents=True)
+    (app_dir / 'current_version.txt').write_text('3.1\n')
+    (app_dir / 'version.txt').write_text('3.0\n')
+    write_json(tmp_path / 'history.json', [
+        {'id': 'b', 'timestamp': '2024-01-02T00:00:00', 'event_type': 'post', 'status': 'success', 'message': 'newer'},
+        {'id': 'a', 'timestamp': '2024-01-01T00:00:00', 'event_type': 'check', 'status': 'info', 'message': 'older'}
+    ])
+    
+    migrated = SQLiteStorageManager(tmp_path)
+    
+    app = migrated.get_app('legacy')
+    assert (app['current_version'], app['last_posted_version'], app['last_check']) == ('3.1', '3.0', None)
+    assert migrated.get_content_hash('legacy') is None
+    assert [entry['id'] for entry in migrated.get_history(limit=10)] == ['b', 'a']
+
+
+def test_json_migrates_legacy_status_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(StorageManager, 'WRITE_BEHIND_DELAY', 0)
+    write_json(tmp_path / 'apps.json', {'legacy': {'name': 'Legacy', 'app_store_id': '456'}})
+    app_dir = tmp_path / 'apps' / 'legacy'
+    app_dir.mkdir(parents=True)
+    (app_dir / 'current_version.txt').write_text('3.1\n')
+    (app_dir / 'check.txt').write_text('2024-01-01T00:00:00\n')
+    
+    storage = StorageManager(tmp_path)
+    
+    assert json.loads((tmp_path / 'state.json').read_text()) == {
+        'legacy': {'current_version': '3.1', 'last_check': '2024-01-01T00:00:00'}
+    }
+    assert storage.get_current_version('legacy') == '3.1'
+    assert storage.get_last_version('legacy') is None
+    
+    # state.json is the source of truth from now on
+    (app_dir / 'current_version.txt').write_text('9.9\n')
+    storage.save_current_version('legacy', '3.2')
+    storage.flush()
+    assert StorageManager(tmp_path).get_current_version('legacy') == '3.2'
+
+
+def test_json_migrates_legacy_history(tmp_path, monkeypatch):
+    monkeypatch.setattr(StorageManager, 'WRITE_BEHIND_DELAY', 0)
+    monkeypatch.setattr(StorageManager, 'HISTORY_SEGMENT_SIZE', 4)
+    legacy = [
+        {'id': str(i), 'timestamp': f'2024-01-{i + 1:02d}T00:00:00', 'event_type': 'check', 'status': 'info', 'message': f'entry {i}'}
+        for i in reversed(range(10))
+    ]
+    write_json(tmp_path / 'history.json', legacy)
+    
+    storage = StorageManager(tmp_path)
+    
+    assert not (tmp_path / 'history.json').exists()
+    assert (tmp_path / 'history.json.migrated').exists()
+    assert storage._history_segments() == [1, 2, 3]
+    assert storage.get_history(limit=100) == legacy
+    
+    # New entries go after the migrated ones, and a restart reads them back in order
+    entry = storage.add_history_entry('post', message='new')
+    storage.flush()
+    assert StorageManager(tmp_path).get_history(limit=100) == [entry] + legacy
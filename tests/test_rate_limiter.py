@@ -0,0 +1,127 @@
+"""
+Per-host rate limiter: token bucket, AIMD rate, Retry-After and the retry budget
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+
+from backend import rate_limiter
+from backend.rate_limiter import HostRateLimiter, RateLimitExceeded, parse_retry_after
+
+
+@pytest.fixture
+def make_limiter(clock, monkeypatch):
+    monkeypatch.setattr(rate_limiter, 'time', clock)
+    monkeypatch.setattr(rate_limiter, 'asyncio', clock)
+    
+    def create(**kwargs):
+        options = {'rate_per_minute': 60, 'burst': 3, 'retry_ratio': 0.5, 'retry_budget': 2, 'max_wait': 10}
+        return HostRateLimiter('example.com', **{**options, **kwargs})
+    
+    return create
+
+
+def test_token_bucket(make_limiter, clock):
+    limiter = make_limiter()
+    started = clock.now
+    
+    # The burst goes out at once, then one request per second
+    for _ in range(3):
+        asyncio.run(limiter.acquire())
+    assert clock.now == started
+    asyncio.run(limiter.acquire())
+    assert clock.now == pytest.approx(started + 1)
+    
+    # Idle time refills the bucket up to the burst only
+    clock.advance(60)
+    for _ in range(3):
+        asyncio.run(limiter.acquire())
+    assert clock.now == pytest.approx(started + 61)
+    assert limiter.requests == 7
+
+
+def test_wait_beyond_max_wait_is_refused(make_limiter):
+    limiter = make_limiter(burst=1, rate_per_minute=3)
+    asyncio.run(limiter.acquire())
+    
+    with pytest.raises(RateLimitExceeded) as error:
+        asyncio.run(limiter.acquire())
+    assert error.value.wait == pytest.approx(20)
+    assert limiter.requests == 1
+
+
+def test_rate_is_halved_on_throttling_and_recovers(make_limiter):
+    limiter = make_limiter()
+    
+    limiter.record_response(429)
+    assert limiter.rate * 60 == pytest.approx(30)
+    limiter.record_response(503)
+    assert limiter.rate * 60 == pytest.approx(15)
+    for _ in range(10):
+        limiter.record_response(429)
+    assert limiter.rate * 60 == pytest.approx(3)  # Never below a twentieth of the maximum
+    assert limiter.throttled == 12
+    
+    # Each success adds a twentieth of the maximum back, up to the maximum
+    limiter.record_response(200)
+    assert limiter.rate * 60 == pytest.approx(6)
+    for _ in range(30):
+        limiter.record_response(200)
+    assert limiter.rate * 60 == pytest.approx(60)
+    
+    # Other errors leave the rate alone
+    limiter.record_response(429)
+    limiter.record_response(500)
+    assert limiter.rate * 60 == pytest.approx(30)
+
+
+def test_retry_after_pauses_the_host(make_limiter, clock):
+    limiter = make_limiter(max_wait=100)
+    
+    limiter.record_response(503, {'retry-after': '30'})
+    assert limiter.stats()['paused_for'] == 30
+    asyncio.run(limiter.acquire())
+    assert limiter.stats()['paused_for'] == 0
+    
+    # A pause is capped at ten minutes
+    limiter.record_response(429, {'retry-after': '86400'})
+    assert limiter.paused_until - clock.now == HostRateLimiter.MAX_RETRY_AFTER
+    with pytest.raises(RateLimitExceeded):
+        asyncio.run(limiter.acquire())
+
+
+def test_parse_retry_after():
+    assert parse_retry_after('120') == 120
+    assert parse_retry_after(' 1.5 ') == 1.5
+    assert parse_retry_after('-5') == 0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after('') is None
+    assert parse_retry_after('soon') is None
+    
+    in_two_minutes = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=120), usegmt=True)
+    assert parse_retry_after(in_two_minutes) == pytest.approx(120, abs=2)
+    an_hour_ago = format_datetime(datetime.now(timezone.utc) - timedelta(hours=1), usegmt=True)
+    assert parse_retry_after(an_hour_ago) == 0
+
+
+def test_retry_budget(make_limiter):
+    limiter = make_limiter()
+    
+    # The budget starts full (2 retries) and every first attempt earns half a retry
+    assert limiter.try_retry()
+    assert limiter.try_retry()
+    assert not limiter.try_retry()
+    limiter.record_attempt()
+    assert not limiter.try_retry()
+    limiter.record_attempt()
+    assert limiter.try_retry()
+    
+    # Savings are capped at the budget capacity
+    for _ in range(100):
+        limiter.record_attempt()
+    assert limiter.retry_balance == 2
+    
+    budget = limiter.stats()['retry_budget']
+    assert (budget['used'], budget['denied']) == (3, 2)
@@ -0,0 +1,204 @@
+"""
+Redis storage engine against a local stand-in server
+"""
+import json
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from backend.redis_storage import RedisClient, RedisError, RedisStorageManager
+
+
+@pytest.fixture
+def storage(redis_server):
+    return RedisStorageManager(redis_server.url)
+
+
+def add_entries(storage, count, **fields):
+    return [storage.add_history_entry(fields.get('event_type', 'check'), message=str(i), **{
+        field: value for field, value in fields.items() if field != 'event_type'
+    }) for i in range(count)]
+
+
+def test_client_pipeline_and_errors(redis_server):
+    client = RedisClient(redis_server.url)
+    
+    assert client.pipeline([('SET', 'key', 'välue'), ('GET', 'key'), ('INCR', 'counter')]) == ['OK', 'välue', 1]
+    assert client.execute('GET', 'missing') is None
+    assert client.pipeline([('MULTI',), ('INCR', 'counter'), ('INCR', 'counter'), ('EXEC',)])[-1] == [2, 3]
+    with pytest.raises(RedisError, match='unknown command'):
+        client.execute('NOSUCHCOMMAND')
+    # The connection is still usable after an error reply
+    assert client.execute('GET', 'counter') == '3'
+    with pytest.raises(ValueError):
+        RedisClient('http://127.0.0.1:6379')
+
+
+def test_apps_keep_creation_order(storage):
+    first = storage.save_app({'name': 'First', 'app_store_id': '1'})
+    batch = storage.save_apps([{'name': f'Batch {i}', 'app_store_id': str(10 + i)} for i in range(5)])
+    
+    assert [app['id'] for app in storage.get_all_apps()] == [first] + batch
+    
+    revision = storage.get_apps_revision()
+    storage.save_app({'id': batch[0], 'name': 'Renamed', 'app_store_id': '10'})
+    assert storage.get_apps_revision() != revision
+    assert storage.get_app(batch[0])['name'] == 'Renamed'
+    assert [app['id'] for app in storage.get_all_apps()] == [first] + batch
+    
+    assert storage.delete_app(first)
+    assert not storage.delete_app(first)
+    assert storage.get_app(first) is None
+    assert [app['id'] for app in storage.get_all_apps()] == batch
+
+
+def test_status_fields(storage):
+    app_id = storage.save_app({'name': 'App', 'app_store_id': '1'})
+    
+    storage.save_current_version(app_id, '2.0')
+    storage.save_last_version(app_id, '1.9')
+    storage.update_last_check(app_id, '2026-01-01T00:00:00')
+    storage.save_content_hash(app_id, 'abc')
+    storage.save_storefront_versions(app_id, {'us': '2.0', 'de': '1.9'})
+    storage.save_lookup_failures(app_id, {'count': 2})
+    
+    app = storage.get_app(app_id)
+    assert (app['current_version'], app['last_posted_version'], app['last_check']) == ('2.0', '1.9', '2026-01-01T00:00:00')
+    assert app['storefront_versions'] == {'us': '2.0', 'de': '1.9'}
+    assert app['lookup_failures'] == {'count': 2}
+    assert storage.get_content_hash(app_id) == 'abc'
+    assert storage.get_all_apps()[0]['storefront_versions'] == {'us': '2.0', 'de': '1.9'}
+    
+    storage.save_lookup_failures(app_id, {})
+    assert storage.get_lookup_failures(app_id) == {}
+    
+    # Deleting the app drops its status too
+    storage.delete_app(app_id)
+    assert storage.get_current_version(app_id) is None
+    assert storage.get_content_hash(app_id) is None
+
+
+def test_settings_and_auth_shared_between_instances(storage, redis_server):
+    other = RedisStorageManager(redis_server.url)
+    
+    settings = storage.get_settings()
+    settings['check_interval'] = '2h'
+    storage.save_settings(settings)
+    assert other.get_settings()['check_interval'] == '2h'
+    
+    storage.save_auth({**storage.get_auth(), 'username': 'admin', 'password': 'secret', 'enabled': True})
+    other._auth_checked_at = 0
+    assert other.verify_password('secret')
+    assert not other.verify_password('wrong')
+    assert other.is_auth_configured()
+    
+    # Settings and auth created by the first instance are not reset by later ones
+    assert RedisStorageManager(redis_server.url).get_auth()['username'] == 'admin'
+
+
+def test_sessions_expire(storage, redis_server):
+    session = {'username': 'admin', 'expires_at': time.time() + 60}
+    storage.save_session('abc', session)
+    assert storage.get_session('abc') == session
+    assert 0 < redis_server.store.expires[storage._key('session:abc')] - time.time() <= 62
+    
+    storage.delete_session('abc')
+    assert storage.get_session('abc') is None
+    
+    storage.save_session('old', {'username': 'admin', 'expires_at': time.time() - 1})
+    assert storage.get_session('old') is None
+
+
+def test_history_cursor_paging(storage):
+    entries = add_entries(storage, 7)
+    
+    pages = []
+    cursor = None
+    while True:
+        page, cursor = storage.get_history_page(limit=3, cursor=cursor)
+        pages.append([entry['message'] for entry in page])
+        if cursor is None:
+            break
+    assert pages == [['6', '5', '4'], ['3', '2', '1'], ['0']]
+    assert len(entries) == 7
+    
+    with pytest.raises(ValueError):
+        storage.get_history_page(cursor='not a cursor')
+
+
+def test_filtered_history_pages_through_index(storage, redis_server):
+    add_entries(storage, 50, app_id='busy')
+    add_entries(storage, 3, app_id='quiet', status='error')
+    add_entries(storage, 50, app_id='busy')
+    
+    redis_server.store.commands.clear()
+    page, cursor = storage.get_history_page(limit=2, app_id='quiet')
+    assert [entry['message'] for entry in page] == ['2', '1']
+    page, cursor = storage.get_history_page(limit=2, cursor=cursor, app_id='quiet')
+    assert [entry['message'] for entry in page] == ['0']
+    assert cursor is None
+    
+    # Only the small index was paged, and only matching entries were read (the
+    # first page also reads one entry ahead to know there is a next page)
+    scans = [command for command in redis_server.store.commands if command[0] == 'ZREVRANGEBYSCORE']
+    assert {command[1] for command in scans} == {storage._key('history:app:quiet')}
+    assert sum(command[0] == 'ZRANGEBYSCORE' for command in redis_server.store.commands) == 4
+    
+    # Combined filters check the remaining fields per entry
+    assert len(storage.get_history(app_id='busy', status='error')) == 0
+    assert len(storage.get_history(app_id='quiet', status='error')) == 3
+    assert len(storage.get_history(event_type='check', limit=1000)) == 103
+    assert storage.get_history(app_id='missing') == []
+
+
+def test_history_date_filters(storage):
+    add_entries(storage, 3)
+    now = datetime.now()
+    
+    assert len(storage.get_history(start_date=(now - timedelta(minutes=5)).isoformat())) == 3
+    assert storage.get_history(start_date=(now + timedelta(minutes=5)).isoformat()) == []
+    assert storage.get_history(end_date=(now - timedelta(minutes=5)).isoformat()) == []
+
+
+def test_history_indexes_trimmed_with_retention(storage, monkeypatch):
+    monkeypatch.setattr(RedisStorageManager, 'HISTORY_MAX_ENTRIES', 5)
+    add_entries(storage, 3, app_id='old')
+    add_entries(storage, 5, app_id='new')
+    
+    assert storage.get_history(app_id='old') == []
+    assert len(storage.get_history(app_id='new')) == 5
+
+
+def test_clear_history(storage, redis_server):
+    add_entries(storage, 3, app_id='a')
+    
+    # Entries older than the cutoff are removed from the history and the indexes
+    history_key = storage._key('history')
+    old = {member: score for member, score in redis_server.store.data[history_key].items()}
+    for member, score in old.items():
+        entry = json.loads(member)
+        if entry['message'] == '0':
+            del redis_server.store.data[history_key][member]
+            entry['timestamp'] = (datetime.now() - timedelta(days=10)).isoformat()
+            redis_server.store.data[history_key][json.dumps(entry)] = score
+    storage.clear_history(older_than_days=5)
+    assert [entry['message'] for entry in storage.get_history(app_id='a')] == ['2', '1']
+    assert len(redis_server.store.data[storage._key('history:app:a')]) == 2
+    
+    storage.clear_history()
+    assert storage.get_history() == []
+    assert storage._key('history:app:a') not in redis_server.store.data
+    add_entries(storage, 1, app_id='a')
+    assert len(storage.get_history(app_id='a')) == 1
+
+
+def test_existing_history_is_indexed_once(storage, redis_server):
+    add_entries(storage, 2, app_id='a')
+    # History written before the indexes existed
+    for key in list(redis_server.store.data):
+        if key.startswith(storage._key('history:')) and key != storage._key('history:seq'):
+            del redis_server.store.data[key]
+    
+    restarted = RedisStorageManager(redis_server.url)
+    assert len(restarted.get_history(app_id='a')) == 2
@@ -0,0 +1,118 @@
+"""
+Scheduler passes over a batch window, cadence, phases and jitter
+"""
+import random
+import time
+
+import pytest
+
+from backend import scheduler as scheduler_module
+from backend.scheduler import Scheduler
+
+
+@pytest.fixture
+def make_scheduler(clock, monkeypatch):
+    """Scheduler factory on the fake clock with a seeded jitter RNG"""
+    monkeypatch.setattr(scheduler_module, 'time', clock)
+    monkeypatch.setattr(scheduler_module, 'random', random.Random(7))
+    return lambda jitter=0: Scheduler(jitter=jitter)
+
+
+def test_short_interval_runs_once_per_window():
+    scheduler = Scheduler(jitter=0)
+    runs = []
+    scheduler.add('fast', 0.01, lambda: runs.append('fast'), delay=0)
+    scheduler.add('slow', 60, lambda: runs.append('slow'), delay=0.5)
+    
+    assert scheduler.run_pending(time.monotonic() + 1) == 2
+    assert sorted(runs) == ['fast', 'slow']
+
+
+def test_job_removed_during_pass_does_not_run():
+    scheduler = Scheduler(jitter=0)
+    runs = []
+    
+    def first():
+        runs.append('first')
+        scheduler.remove('second')
+    
+    scheduler.add('first', 60, first, delay=0)
+    scheduler.add('second', 60, lambda: runs.append('second'), delay=0.1)
+    
+    assert scheduler.run_pending(time.monotonic() + 1) == 1
+    assert runs == ['first']
+    assert 'second' not in scheduler
+
+
+def test_missed_runs_are_skipped_in_whole_intervals(make_scheduler, clock):
+    scheduler = make_scheduler()
+    runs = []
+    job = scheduler.add('app', 60, lambda: runs.append(clock.monotonic()), delay=10)
+    first_due = job.due
+    
+    # Busy for over four intervals past the slot: one run, then the next slot on the cadence
+    clock.advance(10 + 250)
+    assert scheduler.run_pending() == 1
+    assert job.due == first_due + 5 * 60
+    assert scheduler.next_run_in() == job.due - clock.monotonic()
+    
+    clock.advance(scheduler.next_run_in())
+    assert scheduler.run_pending() == 1
+    assert job.due == first_due + 6 * 60
+    assert len(runs) == 2
+
+
+def test_update_keeps_phase(make_scheduler, clock):
+    scheduler = make_scheduler()
+    func = lambda: None
+    job = scheduler.add('app', 600, func, delay=500)
+    slot = job.due
+    
+    # Shorter interval: the next slot is one new interval after the previous slot
+    clock.advance(100)
+    assert scheduler.update('app', 300) is job
+    assert job.due == slot - 600 + 300
+    assert (job.due - slot) % 300 == 0
+    assert (job.interval, job.func) == (300, func)
+    
+    # Longer interval: also counted from the previous slot (slot - 600)
+    assert scheduler.update('app', 900).due == slot - 600 + 900
+    
+    # A slot that has already passed moves to now instead of the past
+    clock.advance(2000)
+    assert scheduler.update('app', 60).due == clock.monotonic()
+    assert scheduler.update('missing', 60) is None
+    assert len(scheduler) == 1
+
+
+def test_phase_delay_is_stable(make_scheduler, clock):
+    now = clock.time()
+    delay = Scheduler.phase_delay('app', 600, now)
+    
+    assert 0 <= delay < 600
+    assert Scheduler.phase_delay('app', 600, now) == delay
+    # The same slot an interval later, or on another instance
+    assert Scheduler.phase_delay('app', 600, now + 600) == pytest.approx(delay)
+    assert Scheduler.phase_delay('app', 600, now + 100) == pytest.approx((delay - 100) % 600)
+    assert make_scheduler().add('app', 600, lambda: None).due == clock.monotonic() + delay
+    
+    # Keys spread across the interval
+    slots = {int(Scheduler.phase_delay(f'app-{i}', 600, now) // 60) for i in range(200)}
+    assert slots == set(range(10))
+
+
+def test_jitter_does_not_accumulate(make_scheduler, clock):
+    scheduler = make_scheduler(jitter=0.1)
+    job = scheduler.add('app', 60, lambda: None, delay=0)
+    first_due = job.due
+    offsets = []
+    
+    for run in range(1, 51):
+        clock.advance(scheduler.next_run_in())
+        assert scheduler.run_pending() == 1
+        # Slots stay on the cadence; only the run time is jittered
+        assert job.due == first_due + run * 60
+        offsets.append(job.next_run - job.due)
+    
+    assert all(0 <= offset <= 6 for offset in offsets)
+    assert len(set(offsets)) == len(offsets)
@@ -0,0 +1,52 @@
+"""
+Login sessions stored through the storage backend
+"""
+import pytest
+
+from backend.auth import SessionStore
+from backend.storage import StorageManager, create_storage_manager
+
+
+@pytest.fixture(params=['json', 'sqlite', 'redis'])
+def engine(request, monkeypatch):
+    monkeypatch.setattr(StorageManager, 'WRITE_BEHIND_DELAY', 0)
+    if request.param == 'redis':
+        monkeypatch.setenv('REDIS_URL', request.getfixturevalue('redis_server').url)
+    return request.param
+
+
+@pytest.fixture
+def storage(engine, tmp_path):
+    return create_storage_manager(tmp_path, engine)
+
+
+def test_session_survives_restart(storage, engine, tmp_path):
+    token = SessionStore().create(storage, 'admin', 'hash')
+    
+    # A new process (empty cache) on the same storage accepts the token
+    restarted = SessionStore()
+    reloaded = create_storage_manager(tmp_path, engine)
+    assert restarted.validate(reloaded, token, 'admin', 'hash')
+    assert not restarted.validate(reloaded, token, 'admin', 'other hash')
+    assert not restarted.validate(reloaded, 'unknown token', 'admin', 'hash')
+
+
+def test_revoke_ends_session_on_other_instances(storage, monkeypatch):
+    first, second = SessionStore(), SessionStore()
+    token = first.create(storage, 'admin', 'hash')
+    assert second.validate(storage, token, 'admin', 'hash')
+    
+    first.revoke(storage, token)
+    assert not first.validate(storage, token, 'admin', 'hash')
+    monkeypatch.setattr(SessionStore, 'CACHE_SECONDS', 0)
+    assert not second.validate(storage, token, 'admin', 'hash')
+
+
+def test_expired_session_is_rejected(storage):
+    sessions = SessionStore(ttl_seconds=60)
+    token = sessions.create(storage, 'admin', 'hash')
+    session_id = SessionStore._session_id(token)
+    storage.save_session(session_id, {'username': 'admin', 'password_hash': 'hash', 'expires_at': 1})
+    
+    assert storage.get_session(session_id) is None
+    assert not SessionStore().validate(storage, token, 'admin', 'hash')
@@ -0,0 +1,96 @@
+"""
+Stress test: many threads writing apps, per-app status and history at once
+"""
+import json
+import threading
+
+import pytest
+
+from backend.storage import StorageManager, create_storage_manager
+
+THREADS = 16
+ROUNDS = 50
+
+
+def run_threads(target):
+    errors = []
+    
+    def run(n):
+        try:
+            target(n)
+        except Exception as e:
+            errors.append(e)
+    
+    threads = [threading.Thread(target=run, args=(n,)) for n in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+
+
+@pytest.mark.parametrize('engine', ['json', 'sqlite'])
+@pytest.mark.parametrize('delay', [0, 0.05])
+def test_parallel_writers(tmp_path, monkeypatch, engine, delay):
+    monkeypatch.setattr(StorageManager, 'WRITE_BEHIND_DELAY', delay)
+    storage = create_storage_manager(tmp_path, engine)
+    shared_ids = [storage.save_app({'name': f'shared {i}', 'app_store_id': str(i)}) for i in range(4)]
+    created = {}
+    
+    def writer(n):
+        # Each thread owns one app and also updates the shared ones
+        app_id = storage.save_app({'name': f'app {n}', 'app_store_id': str(1000 + n)})
+        created[n] = app_id
+        for i in range(ROUNDS):
+            storage.save_current_version(app_id, f'{n}.{i}')
+            storage.update_last_check(app_id, f'check {n} {i}')
+            storage.add_history_entry('check', app_id=app_id, app_name=f'app {n}', message=f'{n} {i}')
+            
+            shared = storage.get_app(shared_ids[i % len(shared_ids)])
+            shared['icon_url'] = f'https://example.com/{n}/{i}.png'
+            storage.save_app(shared)
+            storage.save_last_version(shared['id'], f'{n}.{i}')
+            storage.get_history(limit=20, app_id=app_id)
+    
+    run_threads(writer)
+    storage.flush()
+    
+    for current in (storage, create_storage_manager(tmp_path, engine)):
+        apps = {app['id']: app for app in current.get_all_apps()}
+        assert len(apps) == len(shared_ids) + THREADS
+        for n, app_id in created.items():
+            assert apps[app_id]['name'] == f'app {n}'
+            assert apps[app_id]['current_version'] == f'{n}.{ROUNDS - 1}'
+            assert apps[app_id]['last_check'] == f'check {n} {ROUNDS - 1}'
+        for app_id in shared_ids:
+            assert apps[app_id]['icon_url'].startswith('https://example.com/')
+            assert apps[app_id]['last_posted_version'] is not None
+        
+        history = current.get_history(limit=100000)
+        assert len(history) == THREADS * ROUNDS
+        assert len({entry['id'] for entry in history}) == THREADS * ROUNDS
+        for n, app_id in created.items():
+            messages = [entry['message'] for entry in current.get_history(limit=100000, app_id=app_id)]
+            assert messages == [f'{n} {i}' for i in reversed(range(ROUNDS))]
+    
+    if engine == 'json':
+        for name in ('apps.json', 'state.json', 'settings.json'):
+            with open(tmp_path / name) as f:
+                json.load(f)
+        assert not list(tmp_path.glob('.*.tmp'))
+
+
+def test_parallel_app_creation_keeps_every_app(tmp_path, monkeypatch):
+    monkeypatch.setattr(StorageManager, 'WRITE_BEHIND_DELAY', 0)
+    storage = StorageManager(tmp_path)
+    
+    def writer(n):
+        for i in range(ROUNDS):
+            storage.save_app({'name': f'app {n} {i}', 'app_store_id': str(n * ROUNDS + i)})
+    
+    run_threads(writer)
+    
+    with open(tmp_path / 'apps.json') as f:
+        stored = json.load(f)
+    assert len(stored) == THREADS * ROUNDS
+    assert len(StorageManager(tmp_path).get_all_apps()) == THREADS * ROUNDS
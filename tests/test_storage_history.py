@@ -0,0 +1,90 @@
+"""
+History log retention with the write-behind buffer enabled
+"""
+import threading
+
+from backend.storage import StorageManager
+
+
+def make_storage(data_dir, monkeypatch, delay):
+    monkeypatch.setattr(StorageManager, 'WRITE_BEHIND_DELAY', delay)
+    monkeypatch.setattr(StorageManager, 'HISTORY_MAX_ENTRIES', 1000)
+    return StorageManager(data_dir)
+
+
+def add_entries(storage, count):
+    for i in range(count):
+        storage.add_history_entry('check', app_id=f'app-{i % 7}', message=f'entry {i}')
+
+
+def test_retention_with_buffered_segments(tmp_path, monkeypatch):
+    # Far more entries than retained, all added within one write-behind window
+    storage = make_storage(tmp_path, monkeypatch, delay=30)
+    add_entries(storage, 2600)
+    
+    retained = storage.get_history(limit=100000)
+    assert 1000 <= len(retained) <= 1000 + StorageManager.HISTORY_SEGMENT_SIZE
+    assert retained[0]['message'] == 'entry 2599'
+    assert retained[-1]['message'] == f'entry {2600 - len(retained)}'
+    
+    storage.flush()
+    segments = storage._history_segments()
+    assert len(segments) <= storage._history_max_segments
+    
+    reloaded = make_storage(tmp_path, monkeypatch, delay=30)
+    assert reloaded.get_history(limit=100000) == retained
+
+
+def test_retention_across_flushes(tmp_path, monkeypatch):
+    storage = make_storage(tmp_path, monkeypatch, delay=30)
+    for _ in range(8):
+        add_entries(storage, 300)
+        storage.flush()
+    
+    retained = storage.get_history(limit=100000)
+    assert 1000 <= len(retained) <= 1000 + StorageManager.HISTORY_SEGMENT_SIZE
+    assert len(storage._history_segments()) <= storage._history_max_segments
+    
+    reloaded = make_storage(tmp_path, monkeypatch, delay=30)
+    assert reloaded.get_history(limit=100000) == retained
+
+
+def test_retention_without_write_behind(tmp_path, monkeypatch):
+    storage = make_storage(tmp_path, monkeypatch, delay=0)
+    add_entries(storage, 2600)
+    
+    retained = storage.get_history(limit=100000)
+    assert 1000 <= len(retained) <= 1000 + StorageManager.HISTORY_SEGMENT_SIZE
+    assert len(storage._history_segments()) <= storage._history_max_segments
+    
+    reloaded = make_storage(tmp_path, monkeypatch, delay=0)
+    assert reloaded.get_history(limit=100000) == retained
+
+
+def test_clear_while_adding_and_flushing(tmp_path, monkeypatch):
+    storage = make_storage(tmp_path, monkeypatch, delay=30)
+    done = threading.Event()
+    
+    def add():
+        add_entries(storage, 3000)
+        done.set()
+    
+    def flush():
+        while not done.is_set():
+            storage.flush()
+    
+    threads = [threading.Thread(target=add), threading.Thread(target=flush)]
+    for thread in threads:
+        thread.start()
+    while not done.is_set():
+        storage.clear_history()
+    for thread in threads:
+        thread.join()
+    
+    # Nothing cleared comes back, and the log on disk matches the index
+    storage.add_history_entry('check', message='after')
+    storage.flush()
+    retained = storage.get_history(limit=100000)
+    assert retained[0]['message'] == 'after'
+    assert len(retained) <= 1000 + StorageManager.HISTORY_SEGMENT_SIZE
+    assert make_storage(tmp_path, monkeypatch, delay=30).get_history(limit=100000) == retained
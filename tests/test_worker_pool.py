@@ -0,0 +1,105 @@
+"""
+Worker pool key reservations and counters
+"""
+import threading
+
+from backend.worker_pool import WorkerPool
+
+
+def test_reservation_blocks_pool_tasks():
+    pool = WorkerPool(max_workers=2, timeout=60)
+    ran = []
+    try:
+        with pool.try_acquire('app') as acquired:
+            assert acquired
+            assert pool.is_busy('app')
+            assert not pool.submit('app', lambda: ran.append('app'))
+            with pool.try_acquire('app') as again:
+                assert not again
+        assert not pool.is_busy('app')
+        assert pool.submit('app', lambda: ran.append('app'))
+    finally:
+        pool.shutdown()
+
+
+def test_running_task_blocks_reservation():
+    pool = WorkerPool(max_workers=2, timeout=60)
+    started, release = threading.Event(), threading.Event()
+    
+    def task():
+        started.set()
+        release.wait(5)
+    
+    try:
+        assert pool.submit('app', task)
+        assert started.wait(5)
+        with pool.try_acquire('app') as acquired:
+            assert not acquired
+        with pool.try_acquire('other') as acquired:
+            assert acquired
+        release.set()
+    finally:
+        release.set()
+        pool.shutdown()
+
+
+def test_counters_from_many_workers():
+    pool = WorkerPool(max_workers=8, timeout=60)
+    done = threading.Semaphore(0)
+    
+    def succeed():
+        done.release()
+    
+    def fail():
+        done.release()
+        raise RuntimeError('task failed')
+    
+    try:
+        for i in range(2000):
+            assert pool.submit(i, fail if i % 4 == 0 else succeed)
+        for _ in range(2000):
+            assert done.acquire(timeout=10)
+        while pool.stats()['running'] or pool.stats()['queued']:
+            threading.Event().wait(0.01)
+        stats = pool.stats()
+        assert stats['completed'] == 1500
+        assert stats['failed'] == 500
+    finally:
+        pool.shutdown()
+
+
+def test_shutdown_waits_for_running_tasks():
+    pool = WorkerPool(max_workers=1, timeout=60)
+    started, release = threading.Event(), threading.Event()
+    finished = []
+    
+    def task():
+        started.set()
+        release.wait(5)
+        finished.append(True)
+    
+    assert pool.submit('app', task)
+    assert started.wait(5)
+    assert not pool.shutdown(wait=0.05)
+    
+    threading.Timer(0.1, release.set).start()
+    assert pool.shutdown(wait=5)
+    assert finished == [True]
+    assert not pool.submit('other', task)
+
+
+def test_shutdown_waits_for_reservations():
+    pool = WorkerPool(max_workers=1, timeout=60)
+    entered = threading.Event()
+    
+    def manual_check():
+        with pool.try_acquire('app'):
+            entered.set()
+            threading.Event().wait(0.1)
+    
+    thread = threading.Thread(target=manual_check)
+    thread.start()
+    assert entered.wait(5)
+    assert pool.shutdown(wait=5)
+    assert not pool.is_busy('app')
+    thread.join()